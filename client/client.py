@@ -8,6 +8,7 @@ Calls remote server API for speech-to-text transcription
 import enum
 import time
 import threading
+import uuid
 import argparse
 import platform
 import pyaudio
@@ -241,19 +242,42 @@ class SpeechTranscriberClient:
         initial_prompt=None,
         streaming=False,
         replayer=None,
+        polish_mode="sync",
+        polish_wait_budget=0.0,
+        decode_profile=None,
+        live_decode_profile="live-fast",
+        two_pass=False,
+        client_id=None,
+        profile=None,
     ):
         self.callback = callback
         self.server_url = server_url.rstrip("/")
         self.language = language
         self.initial_prompt = initial_prompt
         self.streaming = streaming
-        self.replayer = replayer  # For live streaming output
+        self.replayer = replayer  # For live streaming output and two-pass drafts
+        # "deferred": server returns the raw transcript at once and polishes in the background;
+        # wait up to polish_wait_budget seconds for the polished text (0 = paste raw immediately)
+        self.polish_mode = polish_mode
+        self.polish_wait_budget = polish_wait_budget or 0.0
+        # Server-side decode profiles: live chunks favour latency, the final pass accuracy
+        # (None = the server's default profile)
+        self.decode_profile = decode_profile
+        self.live_decode_profile = live_decode_profile
+        # Two-pass: paste the server's small-model draft at once, replace it if the final text differs
+        self.two_pass = two_pass
         self.session = requests.Session()
 
         # For deduplication of streaming results
         self.last_transcribed_text = ""
         self.cumulative_text = ""
 
+        # Live session: the server keeps live chunks' audio and confirmed text,
+        # so the final pass only uploads and decodes the part after live_audio_until
+        self.live_session_id = None
+        self.live_audio_until = 0
+        self.live_lock = threading.Lock()
+
         # Hallucination patterns to filter out
         self.hallucination_patterns = [
             "字幕",
@@ -281,6 +305,11 @@ class SpeechTranscriberClient:
         # Disable proxy for LAN connections to avoid proxy interference
         # This is especially important when connecting to local servers like 192.168.x.x
         self.session.trust_env = False
+        # Lets the server cache this client's detected language across requests
+        self.session.headers["X-Client-Id"] = client_id or platform.node() or "unknown"
+        # Server-side hotword/prompt profile, used when no initial_prompt is sent
+        if profile:
+            self.session.headers["X-Profile"] = profile
 
         # Test server connection
         self._test_connection()
@@ -302,34 +331,89 @@ class SpeechTranscriberClient:
         except Exception as e:
             print(f"✗ Connection test failed: {e}")
 
+    def start_live_session(self):
+        """Start a new live session for the next recording"""
+        with self.live_lock:
+            self.live_session_id = uuid.uuid4().hex if self.streaming and self.replayer else None
+            self.live_audio_until = 0
+
+    def _update_live_session(self, result):
+        """Remember how much of the recording the server has stored for the session"""
+        session_info = result.get("session")
+        if session_info and session_info.get("session_id") == self.live_session_id:
+            with self.live_lock:
+                self.live_audio_until = max(self.live_audio_until, session_info.get("audio_until", 0))
+
     def transcribe(self, event):
         """Transcribe audio"""
         print("Sending audio to server for transcription...")
         audio = event.kwargs.get("audio", None)
 
+        with self.live_lock:
+            session_id, session_offset = self.live_session_id, self.live_audio_until
+            self.live_session_id = None
+        if audio is not None and session_id and 0 < session_offset <= len(audio):
+            print(
+                f"[Live] Final pass: sending {(len(audio) - session_offset) / 16000:.1f}s "
+                f"of {len(audio) / 16000:.1f}s (rest already on the server)"
+            )
+        else:
+            session_id = None
+
         if audio is not None:
             try:
                 # Prepare request data
                 request_data = {
-                    "audio_data": audio.tolist(),
                     "sample_rate": 16000,
                     "streaming": self.streaming,
                 }
+                if session_id:
+                    request_data["audio_data"] = audio[session_offset:].tolist()
+                    request_data["session_id"] = session_id
+                    request_data["session_offset"] = session_offset
+                    request_data["session_final"] = True
+                else:
+                    request_data["audio_data"] = audio.tolist()
 
                 if self.language:
                     request_data["language"] = self.language
                 if self.initial_prompt:
                     request_data["initial_prompt"] = self.initial_prompt
+                if self.decode_profile:
+                    request_data["decode_profile"] = self.decode_profile
+                two_pass = self.two_pass and not self.streaming and self.replayer is not None
+                if two_pass:
+                    request_data["two_pass"] = True
+                if self.polish_mode == "deferred":
+                    request_data["polish_mode"] = "deferred"
+                else:
+                    # Let the server fit LLM polishing into our request timeout
+                    request_data["deadline_ms"] = 60000
 
                 # Send request to server
                 response = self.session.post(
-                    f"{self.server_url}/api/transcribe", json=request_data, timeout=60
+                    f"{self.server_url}/api/transcribe", json=request_data, timeout=60, stream=two_pass
                 )
+                if response.status_code == 409 and session_id:
+                    # The server no longer has the live audio (expired, or another worker process)
+                    print("[Live] Live session unavailable on the server, sending the whole recording")
+                    for key in ("session_id", "session_offset", "session_final"):
+                        request_data.pop(key)
+                    request_data["audio_data"] = audio.tolist()
+                    response = self.session.post(
+                        f"{self.server_url}/api/transcribe", json=request_data, timeout=60
+                    )
 
                 if response.status_code == 200:
-                    result = response.json()
+                    if response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                        result = self._read_two_pass(response)
+                    else:
+                        result = response.json()
 
                     if result.get("success"):
+                        if result.get("polish_id"):
+                            result = self._await_polished(result)
+
                         # Check if LLM polished text is available
                         llm_used = result.get("llm_used", False)
                         final_text = result.get("text", "").strip()
@@ -412,6 +496,63 @@ class SpeechTranscriberClient:
         else:
             self.callback(segments=[])
 
+    def _read_two_pass(self, response):
+        """
+        Read a two-pass response stream: paste the draft event, return the final result
+
+        The draft is pasted as soon as it arrives; the replayer replaces it once
+        the final result is replayed, and only if the final text differs.
+        """
+        event_name, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event_name = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+            elif not line and event_name:
+                payload = json.loads("\n".join(data)) if data else {}
+                if event_name == "draft" and payload.get("text"):
+                    print(f"[Draft] {payload['text']} ({payload.get('timings', {}).get('draft_ms')}ms)")
+                    self.replayer.paste_draft(payload["text"])
+                elif event_name == "final":
+                    return payload
+                event_name, data = None, []
+        return {"success": False, "error": "Two-pass stream ended without a final result"}
+
+    def _await_polished(self, result):
+        """Wait up to polish_wait_budget seconds for a deferred LLM polish result"""
+        if self.polish_wait_budget <= 0:
+            print("[LLM] Using raw transcript now (polish not awaited)")
+            return result
+
+        try:
+            response = self.session.get(
+                f"{self.server_url}/api/polish/{result['polish_id']}",
+                params={"wait": self.polish_wait_budget},
+                timeout=self.polish_wait_budget + 5,
+            )
+            if response.status_code == 200:
+                polished = response.json()
+                if polished.get("status") == "done" and polished.get("llm_used"):
+                    result["text"] = polished.get("text", result.get("text", ""))
+                    result["llm_used"] = True
+                elif polished.get("status") == "skipped":
+                    # No LLM call was needed; the text may still carry lexicon corrections
+                    result["text"] = polished.get("text", result.get("text", ""))
+                    print(f"[LLM] Polish skipped ({polished.get('llm_gate')}), using transcript")
+                elif polished.get("status") == "pending":
+                    print(
+                        f"[LLM] Polish not ready within {self.polish_wait_budget}s, using raw transcript"
+                    )
+                else:
+                    print(f"[LLM] Polish failed: {polished.get('llm_error')}, using raw transcript")
+            else:
+                print(f"[LLM] Polish lookup failed: {response.status_code}, using raw transcript")
+        except requests.exceptions.RequestException as e:
+            print(f"[LLM] Polish lookup error: {e}, using raw transcript")
+
+        return result
+
     def transcribe_binary(self, audio):
         """Send audio in binary format (more efficient)"""
         try:
@@ -422,6 +563,7 @@ class SpeechTranscriberClient:
             headers = {
                 "Content-Type": "application/octet-stream",
                 "X-Sample-Rate": "16000",
+                "X-Deadline-Ms": "60000",
             }
 
             if self.language:
@@ -447,15 +589,25 @@ class SpeechTranscriberClient:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def transcribe_chunk_live(self, audio):
-        """Transcribe audio chunk during recording (live streaming mode)"""
+    def transcribe_chunk_live(self, audio, offset=None):
+        """
+        Transcribe audio chunk during recording (live streaming mode)
+
+        offset is the chunk's first sample in the recording; with a live session
+        the server decodes everything it has not confirmed yet, not just this chunk.
+        """
         if not self.streaming or not self.replayer:
             return
 
+        session_id = self.live_session_id if offset is not None else None
+
         # Check if audio has sufficient energy (not silence)
         audio_energy = np.abs(audio).mean()
         if audio_energy < 0.01:  # Very low energy, likely silence
             print("[Live] Skipping chunk (silence detected)")
+            if session_id:
+                # Still store it, so the server's copy of the recording has no gaps
+                self._store_live_chunk(audio, session_id, offset)
             return
 
         print("[Live] Transcribing audio chunk...")
@@ -467,25 +619,43 @@ class SpeechTranscriberClient:
                 "sample_rate": 16000,
                 "streaming": False,  # Server doesn't need to know about client streaming
             }
+            if session_id:
+                request_data["session_id"] = session_id
+                request_data["session_offset"] = offset
 
             if self.language:
                 request_data["language"] = self.language
 
-            # Use cumulative text as context for better accuracy
-            if self.cumulative_text:
+            # Use cumulative text as context for better accuracy; with a live
+            # session the server keeps the transcript context itself
+            if self.cumulative_text and not session_id:
                 request_data["initial_prompt"] = self.cumulative_text[
                     -200:
                 ]  # Last 200 chars as context
             elif self.initial_prompt:
                 request_data["initial_prompt"] = self.initial_prompt
+            request_data["deadline_ms"] = 30000
+            # Only the text and session progress are read; skip segments and LLM fields
+            request_data["fields"] = "text,session"
+            if self.live_decode_profile:
+                request_data["decode_profile"] = self.live_decode_profile
 
             # Send request to server
             response = self.session.post(
                 f"{self.server_url}/api/transcribe", json=request_data, timeout=30
             )
+            if response.status_code == 400 and "decode_profiles" in response.json():
+                # The server has no such profile; use its default from now on
+                print(f"[Live] Decode profile '{self.live_decode_profile}' not available on the server")
+                self.live_decode_profile = None
+                request_data.pop("decode_profile")
+                response = self.session.post(
+                    f"{self.server_url}/api/transcribe", json=request_data, timeout=30
+                )
 
             if response.status_code == 200:
                 result = response.json()
+                self._update_live_session(result)
 
                 if result.get("success"):
                     # Get full transcription text
@@ -544,6 +714,26 @@ class SpeechTranscriberClient:
         except Exception as e:
             print(f"[Live] Transcription error: {e}")
 
+    def _store_live_chunk(self, audio, session_id, offset):
+        """Send a live chunk's audio for the session without transcribing it"""
+        try:
+            response = self.session.post(
+                f"{self.server_url}/api/transcribe",
+                json={
+                    "audio_data": audio.tolist(),
+                    "sample_rate": 16000,
+                    "session_id": session_id,
+                    "session_offset": offset,
+                    "store_only": True,
+                    "fields": "session",
+                },
+                timeout=10,
+            )
+            if response.status_code == 200:
+                self._update_live_session(response.json())
+        except requests.exceptions.RequestException as e:
+            print(f"[Live] Could not store silent chunk: {e}")
+
     def _is_hallucination(self, text):
         """Check if text contains common hallucination patterns"""
         if not text or len(text.strip()) < 2:
@@ -693,8 +883,9 @@ class Recorder:
                             )
                             audio_chunk_fp32 = audio_chunk.astype(np.float32) / 32768.0
 
-                            # Send for transcription
-                            self.streaming_callback(audio=audio_chunk_fp32)
+                            # Send for transcription, with the chunk's first sample in the recording
+                            offset = len(frames) * frames_per_buffer - len(audio_chunk)
+                            self.streaming_callback(audio=audio_chunk_fp32, offset=offset)
 
                             # Keep last frames_for_overlap frames for next chunk's context
                             self.previous_chunk_frames = (
@@ -1097,6 +1288,7 @@ class KeyboardReplayer:
         self.callback = callback
         self.kb = keyboard.Controller()
         self.converter = converter
+        self.pasted_draft = None  # Two-pass draft pasted before the final transcription
 
     def _paste_text(self, text=None):
         """Paste text from clipboard using appropriate method
@@ -1139,6 +1331,34 @@ class KeyboardReplayer:
             self.kb.release("v")
         time.sleep(0.15)
 
+    def _convert(self, text):
+        if self.converter is not None and text:
+            try:
+                return self.converter.convert(text)
+            except Exception as e:
+                print(f"Chinese conversion failed: {e}")
+        return text
+
+    def paste_draft(self, text):
+        """Paste a two-pass draft; the next replay replaces it if the final text differs"""
+        text = self._convert(text.strip())
+        if not text:
+            return
+        try:
+            pyperclip.copy(text)
+            time.sleep(0.1)
+            self._paste_text(text=text)
+            self.pasted_draft = text
+        except Exception as e:
+            print(f"Draft paste error: {e}")
+
+    def _erase(self, count):
+        """Delete the last count characters (a pasted draft)"""
+        for _ in range(count):
+            self.kb.press(keyboard.Key.backspace)
+            self.kb.release(keyboard.Key.backspace)
+        time.sleep(0.05)
+
     def replay(self, event):
         segments = event.kwargs.get("segments", [])
         is_streaming = event.kwargs.get("streaming", False)
@@ -1158,19 +1378,23 @@ class KeyboardReplayer:
                 print("Streaming transcription completed.")
                 self.callback()
         else:
-            print("Pasting transcription via clipboard...")
-            full_text = "".join(segment.text for segment in segments).strip()
-
-            if self.converter is not None and full_text:
-                try:
-                    full_text = self.converter.convert(full_text)
-                except Exception as e:
-                    print(f"Chinese conversion failed: {e}")
+            full_text = self._convert("".join(segment.text for segment in segments).strip())
 
+            draft, self.pasted_draft = self.pasted_draft, None
+            if draft is not None and full_text in ("", draft):
+                # The final text matches the draft (or the final pass failed): keep what is pasted
+                print("Final transcription matches the draft, keeping it")
+                self.callback()
+                return
             if not full_text:
                 self.callback()
                 return
 
+            if draft is not None:
+                print("Replacing the draft with the final transcription...")
+                self._erase(len(draft))
+            print("Pasting transcription via clipboard...")
+
             try:
                 pyperclip.copy(full_text)
                 print(f"Copied to clipboard: '{full_text}'")
@@ -1190,13 +1414,7 @@ class KeyboardReplayer:
     def _type_segments(self, segments, streaming=False):
         """Type text segments immediately (streaming mode)"""
         for segment in segments:
-            text = segment.text.strip()
-
-            if self.converter is not None and text:
-                try:
-                    text = self.converter.convert(text)
-                except Exception as e:
-                    print(f"Chinese conversion failed: {e}")
+            text = self._convert(segment.text.strip())
 
             if text:
                 try:
@@ -1305,6 +1523,49 @@ def parse_args():
         default=config.get("streaming", False),
         help="Enable streaming output mode",
     )
+    parser.add_argument(
+        "--polish-mode",
+        type=str,
+        default=config.get("polish_mode", "sync"),
+        choices=["sync", "deferred"],
+        help="LLM polish delivery: sync(wait in the request), deferred(raw transcript first, polished text fetched later)",
+    )
+    parser.add_argument(
+        "--polish-wait",
+        type=float,
+        default=config.get("polish_wait_budget", 2.0),
+        help="Deferred mode: seconds to wait for the polished text before pasting the raw transcript (0 = paste raw immediately)",
+    )
+    parser.add_argument(
+        "--decode-profile",
+        type=str,
+        default=config.get("decode_profile"),
+        help="Server decode profile for the final transcript (default: the server's default profile)",
+    )
+    parser.add_argument(
+        "--live-decode-profile",
+        type=str,
+        default=config.get("live_decode_profile", "live-fast"),
+        help="Server decode profile for live streaming chunks, default: live-fast",
+    )
+    parser.add_argument(
+        "--two-pass",
+        action="store_true",
+        default=config.get("two_pass", False),
+        help="Paste a fast draft transcript first and replace it if the final text differs (needs two_pass on the server; not with --streaming)",
+    )
+    parser.add_argument(
+        "--client-id",
+        type=str,
+        default=config.get("client_id"),
+        help="Client id sent to the server (X-Client-Id) for its per-client language cache, default: host name",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=config.get("profile"),
+        help="Server user profile with hotwords and prompt (user_profiles in server_config.json), sent as X-Profile",
+    )
     parser.add_argument(
         "--zh-convert",
         type=str,
@@ -1434,7 +1695,7 @@ class App:
 
         # Set initial prompt - use strong prompt to reduce hallucinations
         initial_prompt = args.initial_prompt
-        if initial_prompt is None and args.language == "zh":
+        if initial_prompt is None and args.language == "zh" and not args.profile:
             # Use a prompt that discourages common hallucinations
             initial_prompt = "这是一段真实的语音对话内容。"
             print("Using anti-hallucination Chinese initial prompt")
@@ -1467,18 +1728,25 @@ class App:
             args.language,
             initial_prompt,
             streaming,
-            replayer=self.replayer if streaming else None,
+            replayer=self.replayer,
+            polish_mode=args.polish_mode,
+            polish_wait_budget=args.polish_wait,
+            decode_profile=args.decode_profile,
+            live_decode_profile=args.live_decode_profile,
+            two_pass=args.two_pass,
+            client_id=args.client_id,
+            profile=args.profile,
         )
 
         # Initialize recorder with live streaming support
         if streaming:
 
-            def live_transcribe_callback(audio):
+            def live_transcribe_callback(audio, offset=None):
                 """Live transcription callback during recording"""
                 # Run in separate thread to avoid blocking recording
                 thread = threading.Thread(
                     target=self.transcriber.transcribe_chunk_live,
-                    args=(audio,),
+                    args=(audio, offset),
                 )
                 thread.daemon = True
                 thread.start()
@@ -1510,6 +1778,7 @@ class App:
         if self.args.streaming:
             self.transcriber.cumulative_text = ""
             self.transcriber.last_transcribed_text = ""
+            self.transcriber.start_live_session()
         self.recorder.start()
 
     def _on_stop_recording(self, event):
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Suite for the Transcription + LLM Polish Pipeline
+
+Modes:
+    llm  - call LLMService.polish_text directly against the mock LLM server
+           (started in-process unless --mock-url is given)
+    e2e  - send audio to a running transcription server and measure end-to-end
+           transcription + polish latency (configure the server's llm.api_url
+           to point at mock_llm_server.py first)
+    split - load the Whisper model in-process and compare decoding a long clip
+           in one call with splitting it at silence and decoding the chunks in
+           parallel (the server's long_audio mode)
+
+Examples:
+    python benchmark.py llm --requests 200 --concurrency 8 --latency lognormal:-1.2,0.4 --rate-429 0.1
+    python benchmark.py e2e --server-url http://localhost:5000 --audio sample.wav --requests 20
+    python benchmark.py split --audio meeting.wav --parallel 4 --requests 3
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_TEXTS = [
+    "提交代马",
+    "运形测试",
+    "帮我把这个派森脚本改成异步的",
+    "把吉特仓库里的杰森配置文件更新一下然后重启道克容器",
+    "今天的接口文当需要补充瑞迪斯缓存的说明",
+    "请创建一个浦尔瑞奎斯特并通知团队做代码评审",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: List[float], wall_time: float, extra: Optional[Dict] = None) -> Dict:
+    """Build and print a latency summary"""
+    summary = {
+        "name": name,
+        "count": len(latencies),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time > 0 else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+    if extra:
+        summary.update(extra)
+
+    print(f"\n=== {name} ===")
+    for key, value in summary.items():
+        if key != "name":
+            print(f"  {key:<22} {value}")
+    return summary
+
+
+def run_concurrently(task: Callable[[int], Dict], requests_count: int, concurrency: int):
+    """Run task(i) for i in range(requests_count) with a fixed concurrency"""
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for result in pool.map(task, range(requests_count)):
+            results.append(result)
+    return results, time.perf_counter() - start
+
+
+def load_server_config() -> Dict:
+    """config/server_config.json, used as the base for the llm and split benchmarks"""
+    config_path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "server_config.json"
+    )
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def load_server_llm_config() -> Dict:
+    """LLM section of config/server_config.json, used as the base for the llm benchmark"""
+    return load_server_config().get("llm", {})
+
+
+def start_mock_server(args) -> str:
+    """Start mock_llm_server in a background thread and return its base URL"""
+    from werkzeug.serving import make_server
+    from mock_llm_server import MockLLMState, build_arg_parser, create_app
+
+    mock_args = build_arg_parser().parse_args(
+        [
+            "--port", "0",
+            "--latency", args.latency,
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--rate-429", str(args.rate_429),
+            "--rate-5xx", str(args.rate_5xx),
+            "--rpm-limit", str(args.rpm_limit),
+            "--tpm-limit", str(args.tpm_limit),
+        ]
+        + (["--seed", str(args.seed)] if args.seed is not None else [])
+    )
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, create_app(MockLLMState(mock_args)), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="MockLLMServer", daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def bench_llm(args) -> Dict:
+    """Benchmark LLMService.polish_text against the mock endpoint"""
+    from llm_service import LLMService
+
+    base_url = args.mock_url or start_mock_server(args)
+    llm_config = load_server_llm_config()
+    llm_config.update({"enabled": True, "api_url": base_url, "api_key": "mock", "model": "mock-polish"})
+    # Every request must reach the endpoint; SAMPLE_TEXTS repeat
+    llm_config["cache"] = {"enabled": False}
+    llm_config["stream"] = args.stream
+    if args.batching:
+        llm_config["batching"] = dict(llm_config.get("batching", {}), enabled=True)
+    service = LLMService(llm_config)
+
+    def task(i: int) -> Dict:
+        text = SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]
+        start = time.perf_counter()
+        polished, success, error = service.polish_text(text)
+        return {"latency": time.perf_counter() - start, "success": success, "error": error}
+
+    results, wall_time = run_concurrently(task, args.requests, args.concurrency)
+    failures = [r for r in results if not r["success"]]
+    call_stats = service.call_stats()
+    extra = {
+        "success_rate": round(1 - len(failures) / max(1, len(results)), 3),
+        "llm_calls": call_stats["calls"],
+        "ttft_p50_ms": call_stats["ttft_ms"]["p50"],
+        "ttft_p90_ms": call_stats["ttft_ms"]["p90"],
+        "avg_tokens_per_second": call_stats["avg_tokens_per_second"],
+    }
+    if service.batcher is not None:
+        batching = service.batcher.stats()
+        extra["avg_batch_size"] = batching["avg_batch_size"]
+        extra["batch_parse_failures"] = batching["parse_failures"]
+    return summarize(
+        f"LLM polish ({base_url}, stream={args.stream}, batching={service.batcher is not None})",
+        [r["latency"] for r in results],
+        wall_time,
+        extra,
+    )
+
+
+def load_audio_int16(path: Optional[str], seconds: float) -> bytes:
+    """Read a 16kHz mono 16-bit WAV file, or synthesize a tone if none is given"""
+    if path:
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1 or wav.getframerate() != 16000:
+                raise ValueError("Audio must be 16kHz mono 16-bit PCM WAV")
+            return wav.readframes(wav.getnframes())
+
+    import numpy as np
+
+    t = np.arange(int(16000 * seconds), dtype=np.float32) / 16000
+    tone = 0.1 * np.sin(2 * np.pi * 220 * t)
+    return (tone * 32767).astype(np.int16).tobytes()
+
+
+def bench_e2e(args) -> Dict:
+    """Benchmark end-to-end transcription + polish against a running server"""
+    audio_bytes = load_audio_int16(args.audio, args.seconds)
+    session = requests.Session()
+    session.trust_env = False
+    headers = {"Content-Type": "application/octet-stream", "X-Sample-Rate": "16000"}
+    if args.language:
+        headers["X-Language"] = args.language
+    if args.header:
+        for item in args.header:
+            key, _, value = item.partition(":")
+            headers[key.strip()] = value.strip()
+
+    if args.mock_url and args.mock_config:
+        mock_root = args.mock_url.rstrip("/").rsplit("/v1", 1)[0]
+        session.post(f"{mock_root}/mock/config", json=json.loads(args.mock_config), timeout=5)
+
+    def task(i: int) -> Dict:
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                f"{args.server_url.rstrip('/')}/api/transcribe_binary",
+                data=audio_bytes,
+                headers=headers,
+                timeout=args.timeout,
+            )
+            result = response.json()
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        result["latency"] = time.perf_counter() - start
+        return result
+
+    results, wall_time = run_concurrently(task, args.requests, args.concurrency)
+    processing = [r["processing_time"] for r in results if r.get("processing_time") is not None]
+    return summarize(
+        f"End-to-end transcription + polish ({args.server_url})",
+        [r["latency"] for r in results],
+        wall_time,
+        {
+            "audio_seconds": round(len(audio_bytes) / 2 / 16000, 2),
+            "success_rate": round(sum(1 for r in results if r.get("success")) / max(1, len(results)), 3),
+            "llm_used_rate": round(sum(1 for r in results if r.get("llm_used")) / max(1, len(results)), 3),
+            "server_processing_p50_ms": round(percentile(processing, 50) * 1000, 1),
+        },
+    )
+
+
+def bench_split(args) -> Dict:
+    """Benchmark sequential vs. parallel chunked decoding of one long clip"""
+    import numpy as np
+    from faster_whisper import WhisperModel
+    from decode_profiles import DecodeProfiles
+    from speech_trimmer import SpeechTrimmer
+
+    config = load_server_config()
+    audio = np.frombuffer(load_audio_int16(args.audio, args.seconds), dtype=np.int16).astype(np.float32) / 32768.0
+    model = WhisperModel(
+        args.model or config.get("model_size", "large-v3"),
+        device=config.get("device", "auto"),
+        compute_type=config.get("compute_type", "default"),
+        num_workers=args.parallel,
+    )
+    trimmer = SpeechTrimmer(dict(config.get("vad", {}), enabled=True))
+    chunk_seconds = max(args.chunk_seconds, len(audio) / 16000 / args.parallel)
+    profile = DecodeProfiles(config.get("decode_profiles", {})).resolve(args.profile)
+    options = dict(language=args.language, **profile.transcribe_options())
+
+    def decode(chunk_audio) -> int:
+        segments, _ = model.transcribe(chunk_audio, **options)
+        return len(list(segments))
+
+    sequential = []
+    parallel = []
+    chunk_counts = []
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            decode(audio)
+            sequential.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            chunks = trimmer.split(audio, None, chunk_seconds)
+            list(pool.map(lambda chunk: decode(chunk.audio), chunks))
+            parallel.append(time.perf_counter() - start)
+            chunk_counts.append(len(chunks))
+
+    audio_seconds = round(len(audio) / 16000, 2)
+    summarize(f"Sequential decode ({audio_seconds}s audio)", sequential, sum(sequential))
+    sequential_p50 = percentile(sequential, 50)
+    parallel_p50 = percentile(parallel, 50)
+    return summarize(
+        f"Parallel chunked decode ({audio_seconds}s audio, {args.parallel} slots, profile {profile.name})",
+        parallel,
+        sum(parallel),
+        {
+            "audio_seconds": audio_seconds,
+            "chunks": max(chunk_counts),
+            "sequential_p50_ms": round(sequential_p50 * 1000, 1),
+            "speedup_p50": round(sequential_p50 / parallel_p50, 2) if parallel_p50 else 0.0,
+        },
+    )
+
+
+BENCHMARKS = {
+    "llm": bench_llm,
+    "e2e": bench_e2e,
+    "split": bench_split,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Transcription/LLM pipeline benchmark suite")
+    parser.add_argument("mode", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    parser.add_argument("-n", "--requests", type=int, default=50, help="Number of requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--output", help="Write the summary as JSON to this file")
+    parser.add_argument("--stream", action="store_true", help="llm mode: use streaming completions")
+    parser.add_argument("--batching", action="store_true", help="llm mode: batch short texts across requests")
+
+    mock = parser.add_argument_group("mock LLM server")
+    mock.add_argument("--mock-url", help="Use an already running mock server (e.g. http://127.0.0.1:8001/v1)")
+    mock.add_argument("--mock-config", help="JSON posted to the mock's /mock/config before the run")
+    mock.add_argument("--latency", default="lognormal:-1.2,0.4", help="Mock latency distribution")
+    mock.add_argument("--tokens-per-second", type=float, default=80.0)
+    mock.add_argument("--rate-429", type=float, default=0.0)
+    mock.add_argument("--rate-5xx", type=float, default=0.0)
+    mock.add_argument("--rpm-limit", type=float, default=0)
+    mock.add_argument("--tpm-limit", type=float, default=0)
+    mock.add_argument("--seed", type=int, default=42)
+
+    e2e = parser.add_argument_group("end-to-end")
+    e2e.add_argument("--server-url", default="http://localhost:5000", help="Transcription server URL")
+    e2e.add_argument("--audio", help="16kHz mono 16-bit WAV file to send")
+    e2e.add_argument("--seconds", type=float, default=5.0, help="Synthetic audio length when --audio is not set")
+    e2e.add_argument("--language", default="zh")
+    e2e.add_argument("--header", action="append", help="Extra request header 'Name: value' (repeatable)")
+    e2e.add_argument("--timeout", type=float, default=120.0)
+
+    split = parser.add_argument_group("split (also uses --audio, --seconds, --language, --requests)")
+    split.add_argument("--model", help="Whisper model (default: model_size from server_config.json)")
+    split.add_argument("--parallel", type=int, default=4, help="Chunks decoded concurrently (model num_workers)")
+    split.add_argument("--chunk-seconds", type=float, default=30.0, help="Minimum audio per chunk")
+    split.add_argument("--profile", help="Decode profile from server_config.json (default: its default profile)")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = parse_args()
+    summary = BENCHMARKS[args.mode](args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
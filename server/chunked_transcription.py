@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel Long-Audio Transcription
+Long clips are split at silence into chunks that are decoded concurrently
+on free transcription slots instead of one sequential model.transcribe
+call. Chunk results are stitched back into one ordered segment list whose
+timestamps refer to the original clip.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from polish_gate import join_segment_texts
+from speech_trimmer import SAMPLE_RATE, SpeechTrimmer, TrimResult
+
+logger = logging.getLogger(__name__)
+
+
+class LongAudioSplitter:
+    """Decides whether and how to split a clip for parallel decoding"""
+
+    def __init__(self, trimmer: SpeechTrimmer, config: Dict):
+        """
+        Args:
+            trimmer: Speech detector used to find silence boundaries
+            config: Long-audio configuration with keys:
+                - enabled: bool
+                - min_audio_seconds: float, clips with less speech are decoded in one call
+                - chunk_seconds: float, minimum audio per chunk
+                - max_parallel: int, maximum chunks decoded concurrently for one request
+        """
+        self.trimmer = trimmer
+        self.enabled = config.get("enabled", False)
+        self.min_audio_seconds = float(config.get("min_audio_seconds", 60))
+        self.chunk_seconds = float(config.get("chunk_seconds", 30))
+        self.max_parallel = max(1, int(config.get("max_parallel", 4)))
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "split_requests": 0,
+            "chunks": 0,
+            "audio_seconds": 0.0,
+            "decode_seconds": 0.0,
+            "wall_seconds": 0.0,
+        }
+
+    def plan(self, audio: np.ndarray, trim: Optional[TrimResult], free_slots: int) -> Optional[List[TrimResult]]:
+        """
+        Chunks to decode in parallel, or None to decode the clip in one call
+
+        The number of chunks is bounded by max_parallel and by the transcription
+        slots currently free, so a long clip never queues behind itself.
+        """
+        if not self.enabled:
+            return None
+        seconds = trim.speech_seconds if trim is not None else len(audio) / SAMPLE_RATE
+        parallel = min(self.max_parallel, free_slots, int(seconds // self.chunk_seconds))
+        if seconds < self.min_audio_seconds or parallel < 2:
+            return None
+
+        chunks = self.trimmer.split(audio, trim, max(self.chunk_seconds, seconds / parallel))
+        return chunks if len(chunks) > 1 else None
+
+    def plan_window(self, window: TrimResult, free_slots: int) -> Optional[List[TrimResult]]:
+        """
+        Chunks of a live-session window, or None to decode it in one call
+
+        The window's regions are in session time while its audio starts at
+        the window start, so the window audio is split on its own and the
+        chunks are moved back to session time.
+        """
+        chunks = self.plan(window.audio, None, free_slots)
+        if chunks is None:
+            return None
+        start = window.regions[0][0]
+        return [chunk.shifted(start) for chunk in chunks]
+
+    def record(self, chunks: List[TrimResult], decode_seconds: float, wall_seconds: float):
+        with self._lock:
+            stats = self._stats
+            stats["split_requests"] += 1
+            stats["chunks"] += len(chunks)
+            stats["audio_seconds"] += chunks[0].total_seconds
+            stats["decode_seconds"] += decode_seconds
+            stats["wall_seconds"] += wall_seconds
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["split_requests"]
+        wall = stats.pop("wall_seconds")
+        decode = stats.pop("decode_seconds")
+        stats["avg_chunks"] = round(stats["chunks"] / requests, 2) if requests else 0.0
+        # Sum of chunk decode times over wall time: how much sequential work ran in parallel
+        stats["avg_parallelism"] = round(decode / wall, 2) if wall else 0.0
+        stats["audio_seconds"] = round(stats["audio_seconds"], 1)
+        return stats
+
+
+def run_chunk(fn, *args) -> Dict:
+    """Transcribe one chunk, recording its decode time for the parallelism stats"""
+    started = time.monotonic()
+    result = fn(*args)
+    result["decode_seconds"] = time.monotonic() - started
+    return result
+
+
+class ChunkedTranscription:
+    """Pending chunk transcriptions of one request, stitched on result()"""
+
+    def __init__(self, futures: List[Future], chunks: List[TrimResult], request_id: str,
+                 trim: Optional[TrimResult], splitter: LongAudioSplitter):
+        self.futures = futures
+        self.chunks = chunks
+        self.request_id = request_id
+        self.trim = trim
+        self.splitter = splitter
+        self.started = time.monotonic()
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def result(self, timeout: Optional[float] = None) -> Dict:
+        done, not_done = wait(self.futures, timeout=timeout)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise TimeoutError(f"{len(not_done)} of {len(self.futures)} chunks did not finish")
+        wall = time.monotonic() - self.started
+        results = [future.result() for future in self.futures]
+        result = stitch_results(results, self.chunks, self.request_id, self.trim)
+        if result["success"]:
+            decode = sum(r.get("decode_seconds", 0.0) for r in results)
+            self.splitter.record(self.chunks, decode, wall)
+            result["chunks"] = {
+                "count": len(self.chunks),
+                "wall_ms": round(wall * 1000, 1),
+                "decode_ms": round(decode * 1000, 1),
+            }
+            logger.debug(
+                "Stitched %d chunks (ID: %s): decode %.2fs in %.2fs wall time",
+                len(self.chunks), self.request_id, decode, wall,
+            )
+        return result
+
+
+def stitch_results(results: List[Dict], chunks: List[TrimResult], request_id: str,
+                   trim: Optional[TrimResult]) -> Dict:
+    """Merge per-chunk transcription results into one, in chunk order"""
+    for result in results:
+        if not result.get("success"):
+            return {"success": False, "request_id": request_id, "error": result.get("error")}
+
+    segments = [segment for result in results for segment in result["segments"]]
+    # Auto-detected languages can differ per chunk; the chunk with the most speech decides
+    main = max(zip(results, chunks), key=lambda pair: pair[1].speech_seconds)[0]
+    text = join_segment_texts([result["text"] for result in results], main["language"])
+
+    stitched = {
+        "success": True,
+        "request_id": request_id,
+        "language": main["language"],
+        "language_probability": main["language_probability"],
+        "segments": segments,
+        "text": text,
+        "original_text": text,
+        "llm_used": False,
+        "llm_error": None,
+        "duration": chunks[0].total_seconds,
+        "processing_time": None,
+        "decode_profile": main.get("decode_profile"),
+    }
+    if trim is not None and trim.trimmed:
+        stitched["speech_duration"] = round(trim.speech_seconds, 3)
+        stitched["vad"] = trim.summary()
+
+    timings = {}
+    if trim is not None and trim.trimmed:
+        timings["vad_ms"] = round(trim.elapsed * 1000, 1)
+    lexicon_ms = [r["timings"]["lexicon_ms"] for r in results if "lexicon_ms" in r.get("timings", {})]
+    if lexicon_ms:
+        stitched["lexicon_corrections"] = sum(r.get("lexicon_corrections", 0) for r in results)
+        timings["lexicon_ms"] = round(sum(lexicon_ms), 3)
+        if stitched["lexicon_corrections"]:
+            stitched["asr_text"] = join_segment_texts(
+                [r.get("asr_text", r["text"]) for r in results], main["language"]
+            )
+    if timings:
+        stitched["timings"] = timings
+    return stitched
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decode Profiles
+Named sets of faster-whisper decoding options (beam size, temperature,
+VAD) that a request can pick by name, e.g. a greedy profile for live
+chunks and a beam-search profile for the final transcript. Latency and
+real-time factor are tracked per profile.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from llm_metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Options used for every request before profiles existed
+DEFAULT_OPTIONS = {
+    "beam_size": 5,
+    "temperature": 0.0,
+    "vad_filter": True,
+    "min_silence_duration_ms": 500,
+    "condition_on_previous_text": False,
+}
+
+
+class UnknownProfileError(ValueError):
+    """Raised when a request names a decode profile that is not configured"""
+
+
+class DecodeProfile:
+    """One validated set of decoding options"""
+
+    def __init__(self, name: str, options: Dict):
+        """
+        Args:
+            name: Profile name
+            options: Decoding options; missing keys use DEFAULT_OPTIONS:
+                - beam_size: int >= 1, 1 is greedy decoding
+                - temperature: float or list of floats (fallback temperatures)
+                - vad_filter: bool, faster-whisper's VAD on audio not already trimmed
+                - min_silence_duration_ms: int >= 0, pause that splits speech for that VAD
+                - condition_on_previous_text: bool
+
+        Raises:
+            ValueError: An option is unknown or has an invalid value
+        """
+        unknown = set(options) - set(DEFAULT_OPTIONS) - {"description"}
+        if unknown:
+            raise ValueError(f"unknown option(s) {', '.join(sorted(unknown))}")
+        merged = dict(DEFAULT_OPTIONS, **{k: v for k, v in options.items() if k != "description"})
+
+        beam_size = merged["beam_size"]
+        if isinstance(beam_size, bool) or not isinstance(beam_size, int) or beam_size < 1:
+            raise ValueError(f"beam_size must be a positive integer, got {beam_size!r}")
+        temperature = merged["temperature"]
+        temperatures = temperature if isinstance(temperature, list) else [temperature]
+        if not temperatures or not all(
+            isinstance(t, (int, float)) and not isinstance(t, bool) and 0.0 <= t <= 1.0 for t in temperatures
+        ):
+            raise ValueError(f"temperature must be a number or list of numbers in [0, 1], got {temperature!r}")
+        for key in ("vad_filter", "condition_on_previous_text"):
+            if not isinstance(merged[key], bool):
+                raise ValueError(f"{key} must be true or false, got {merged[key]!r}")
+        silence = merged["min_silence_duration_ms"]
+        if isinstance(silence, bool) or not isinstance(silence, int) or silence < 0:
+            raise ValueError(f"min_silence_duration_ms must be a non-negative integer, got {silence!r}")
+
+        self.name = name
+        self.description = options.get("description", "")
+        self.beam_size = beam_size
+        self.temperature = tuple(float(t) for t in temperature) if isinstance(temperature, list) else float(temperature)
+        self.vad_filter = merged["vad_filter"]
+        self.min_silence_duration_ms = silence
+        self.condition_on_previous_text = merged["condition_on_previous_text"]
+
+    def transcribe_options(self, vad_filter: bool = True) -> Dict:
+        """
+        Keyword arguments for model.transcribe
+
+        Args:
+            vad_filter: False when the audio must not go through the model's VAD
+                (already trimmed, or features were precomputed)
+        """
+        return {
+            "beam_size": self.beam_size,
+            "temperature": self.temperature,
+            "vad_filter": self.vad_filter and vad_filter,
+            "vad_parameters": dict(min_silence_duration_ms=self.min_silence_duration_ms),
+            "condition_on_previous_text": self.condition_on_previous_text,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "description": self.description,
+            "beam_size": self.beam_size,
+            "temperature": list(self.temperature) if isinstance(self.temperature, tuple) else self.temperature,
+            "vad_filter": self.vad_filter,
+            "min_silence_duration_ms": self.min_silence_duration_ms,
+            "condition_on_previous_text": self.condition_on_previous_text,
+        }
+
+
+class DecodeProfiles:
+    """Configured decode profiles and their latency/RTF statistics"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: Decode profile configuration with keys:
+                - default: str, profile used when a request names none
+                - profiles: dict of profile name -> options (see DecodeProfile)
+                - latency_window: int, recent decodes kept per profile for percentiles
+        """
+        self.profiles: Dict[str, DecodeProfile] = {}
+        for name, options in config.get("profiles", {}).items():
+            try:
+                self.profiles[name] = DecodeProfile(name, options)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Ignoring invalid decode profile '{name}': {e}")
+
+        default = config.get("default")
+        if default not in self.profiles:
+            if default is not None:
+                logger.error(f"Default decode profile '{default}' is not configured, using built-in defaults")
+            default = "default"
+            self.profiles.setdefault(default, DecodeProfile(default, {}))
+        self.default = self.profiles[default]
+        self.latency_window = max(1, int(config.get("latency_window", 200)))
+
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {
+                "decodes": 0,
+                "audio_seconds": 0.0,
+                "decode_seconds": 0.0,
+                "latencies": deque(maxlen=self.latency_window),
+            }
+            for name in self.profiles
+        }
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.profiles)
+
+    def resolve(self, name: Optional[str]) -> DecodeProfile:
+        """
+        Profile for a request
+
+        Raises:
+            UnknownProfileError: name is not a configured profile
+        """
+        if name in (None, ""):
+            return self.default
+        profile = self.profiles.get(name) if isinstance(name, str) else None
+        if profile is None:
+            raise UnknownProfileError(f"Unknown decode profile {name!r}, available: {', '.join(self.names)}")
+        return profile
+
+    def record(self, profile: DecodeProfile, audio_seconds: float, decode_seconds: float):
+        with self._lock:
+            stats = self._stats[profile.name]
+            stats["decodes"] += 1
+            stats["audio_seconds"] += audio_seconds
+            stats["decode_seconds"] += decode_seconds
+            stats["latencies"].append(decode_seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            snapshot = {
+                name: dict(stats, latencies=list(stats["latencies"])) for name, stats in self._stats.items()
+            }
+        profiles = {}
+        for name, stats in snapshot.items():
+            decodes = stats["decodes"]
+            latencies = stats["latencies"]
+            audio_seconds = stats["audio_seconds"]
+            profiles[name] = {
+                "decodes": decodes,
+                "audio_seconds": round(audio_seconds, 1),
+                "avg_latency_ms": round(stats["decode_seconds"] / decodes * 1000, 1) if decodes else 0.0,
+                "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "latency_p90_ms": round(percentile(latencies, 90) * 1000, 1),
+                # Decode time per second of audio; below 1 is faster than real time
+                "rtf": round(stats["decode_seconds"] / audio_seconds, 3) if audio_seconds else 0.0,
+            }
+        return {"default": self.default.name, "profiles": profiles}
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental Log-Mel Features
+Live-session windows overlap the audio decoded by earlier live chunks, so
+recomputing the STFT/log-mel of the whole window for every chunk repeats
+most of the work. Each session keeps the raw log-mel frames it has already
+computed in a ring buffer and only computes new hop-aligned frames (plus the
+few frames at the window edges that depend on padding). The features are
+handed to the model through a wrapper around its feature extractor, which
+falls back to the original extractor for any other audio.
+
+The frame layout matches faster-whisper's FeatureExtractor (centered STFT
+with reflect padding, 160 zero samples appended); the wrapper checks this
+against the real extractor when it is installed and disables itself on a
+mismatch.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+
+class MelSpectrogram:
+    """Vectorized log-mel frames laid out like faster-whisper's FeatureExtractor"""
+
+    def __init__(self, mel_filters: np.ndarray, n_fft: int = 400, hop_length: int = 160, padding: int = 160):
+        self.mel_filters = mel_filters.astype(np.float32)
+        self.n_fft = n_fft
+        self.hop = hop_length
+        self.half = n_fft // 2
+        self.padding = padding
+        # Periodic Hann window, as torch.hann_window
+        self.window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+        self.drop_last = True
+
+    def frame_count(self, samples: int) -> int:
+        """Frames the extractor returns for a waveform of this length"""
+        frames = 1 + (samples + self.padding) // self.hop
+        return frames - 1 if self.drop_last else frames
+
+    def raw_frames(self, padded: np.ndarray, first: int, count: int) -> np.ndarray:
+        """log10 mel power of count frames starting at sample first of an already padded signal"""
+        if count <= 0:
+            return np.zeros((self.mel_filters.shape[0], 0), dtype=np.float32)
+        frames = sliding_window_view(padded, self.n_fft)[first:first + count * self.hop:self.hop]
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        mel = self.mel_filters @ power.T.astype(np.float32)
+        return np.log10(np.maximum(mel, 1e-10))
+
+    @staticmethod
+    def normalize(raw: np.ndarray) -> np.ndarray:
+        """Whisper's dynamic range clamp and scaling, over the whole window"""
+        if raw.shape[1] == 0:
+            return raw
+        return (np.maximum(raw, raw.max() - 8.0) + 4.0) / 4.0
+
+    def full(self, audio: np.ndarray) -> np.ndarray:
+        """Raw frames of a whole waveform, as the extractor computes them"""
+        padded = np.pad(np.pad(audio, (0, self.padding)), self.half, mode="reflect")
+        return self.raw_frames(padded, 0, self.frame_count(len(audio)))
+
+
+class SessionMel:
+    """Ring buffer of one session's raw log-mel frames, in session frame numbers"""
+
+    def __init__(self, mel: MelSpectrogram, capacity: int):
+        self.mel = mel
+        self.capacity = capacity
+        self.ring = np.zeros((mel.mel_filters.shape[0], capacity), dtype=np.float32)
+        self.computed_until = 0  # frames [0, computed_until) have been computed from real audio
+
+    def window(self, audio: np.ndarray, start: int, end: int) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Raw frames of audio[start:end], as the extractor would compute them for that slice
+
+        Args:
+            audio: The session's audio buffer (samples before end are real audio)
+            start: First sample of the window; must be hop-aligned
+            end: End of the window
+
+        Returns:
+            Tuple of (raw frames, frames computed now), or None when the window
+            is too short, not hop-aligned or reaches back beyond the ring buffer
+        """
+        mel = self.mel
+        hop, half = mel.hop, mel.half
+        if start % hop:
+            return None
+        length = end - start
+        count = mel.frame_count(length)
+        base = start // hop
+        if count < 4 or count > self.capacity:
+            return None
+
+        # Frames whose samples are all real audio can come from the ring buffer
+        final_until = (end - half) // hop + 1  # session frames [.., final_until) need no end padding
+        if final_until > self.computed_until:
+            first = self.computed_until
+            if first * hop < half:
+                padded = np.pad(audio[:final_until * hop + half], (half, 0), mode="reflect")
+                offset = first * hop
+            else:
+                padded = audio[first * hop - half:final_until * hop + half]
+                offset = 0
+            fresh = self.mel.raw_frames(padded, offset, final_until - first)
+            self.ring[:, np.arange(first, final_until) % self.capacity] = fresh
+            computed = final_until - first
+            self.computed_until = final_until
+        else:
+            computed = 0
+        if base < self.computed_until - self.capacity:
+            return None
+
+        raw = np.empty((self.ring.shape[0], count), dtype=np.float32)
+        # Head: the first two frames of a window that does not start the session reflect at its start
+        head = 0 if start == 0 else 2
+        if head:
+            padded = np.pad(audio[start:start + half + hop * head], (half, 0), mode="reflect")
+            raw[:, :head] = mel.raw_frames(padded, 0, head)
+        # Tail: frames reaching past the end see the zero padding and the right reflection
+        middle_end = max(head, min(count, final_until - base))
+        tail_first = start + middle_end * hop - half
+        tail = np.pad(np.pad(audio[tail_first:end], (0, mel.padding)), (0, half), mode="reflect")
+        raw[:, middle_end:] = mel.raw_frames(tail, 0, count - middle_end)
+        raw[:, head:middle_end] = self.ring[:, np.arange(base + head, base + middle_end) % self.capacity]
+        return raw, computed + head + (count - middle_end)
+
+
+class FeatureInjector:
+    """Wraps a model's feature extractor to accept precomputed features for a given waveform"""
+
+    def __init__(self, extractor):
+        self._extractor = extractor
+        self._local = threading.local()
+        self.mel = None
+        self.injected = 0
+        try:
+            self.mel = MelSpectrogram(
+                np.asarray(extractor.mel_filters),
+                getattr(extractor, "n_fft", 400),
+                getattr(extractor, "hop_length", 160),
+            )
+            probe = (np.random.default_rng(0).standard_normal(16000) * 0.1).astype(np.float32)
+            expected = np.asarray(extractor(probe))
+            if expected.shape[1] == self.mel.frame_count(len(probe)) + 1:
+                self.mel.drop_last = False
+            ours = MelSpectrogram.normalize(self.mel.full(probe))
+            if ours.shape != expected.shape or not np.allclose(ours, expected, atol=1e-3):
+                logger.warning("Feature extractor layout not recognized, incremental features disabled")
+                self.mel = None
+        except Exception as e:
+            logger.warning(f"Incremental features unavailable: {e}")
+            self.mel = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mel is not None
+
+    def __getattr__(self, name):
+        return getattr(self._extractor, name)
+
+    @contextmanager
+    def provide(self, waveform: np.ndarray, features: np.ndarray):
+        """Use features for the next extractor call on this thread with exactly this waveform"""
+        self._local.pending = (waveform, features)
+        try:
+            yield
+        finally:
+            self._local.pending = None
+
+    def __call__(self, waveform, padding=160, chunk_length=None, **kwargs):
+        pending = getattr(self._local, "pending", None)
+        if pending is not None and pending[0] is waveform and padding == self.mel.padding and not kwargs:
+            self._local.pending = None
+            if chunk_length is not None:
+                # Same side effect as the original extractor
+                self._extractor.n_samples = chunk_length * self._extractor.sampling_rate
+                self._extractor.nb_max_frames = self._extractor.n_samples // self._extractor.hop_length
+            self.injected += 1
+            return pending[1]
+        return self._extractor(waveform, padding=padding, chunk_length=chunk_length, **kwargs)
+
+
+class IncrementalFeatures:
+    """Per-session incremental log-mel, with CPU time measured against full recomputation"""
+
+    def __init__(self, injector: FeatureInjector, config: Dict):
+        """
+        Args:
+            injector: Installed wrapper of the model's feature extractor
+            config: Incremental feature configuration with keys:
+                - enabled: bool
+                - max_window_seconds: float, ring buffer size; longer windows are computed by the model
+                - measure_every: int, every Nth window is also computed in full to measure the saving
+        """
+        self.injector = injector
+        self.enabled = config.get("enabled", False) and injector is not None and injector.enabled
+        self.capacity = int(float(config.get("max_window_seconds", 60)) * 100)
+        self.measure_every = max(1, int(config.get("measure_every", 10)))
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "windows": 0,
+            "fallbacks": 0,
+            "frames": 0,
+            "computed_frames": 0,
+            "incremental_seconds": 0.0,
+            "measured_windows": 0,
+            "measured_frames": 0,
+            "measured_full_seconds": 0.0,
+            "mismatches": 0,
+        }
+
+    def session(self) -> Optional[SessionMel]:
+        return SessionMel(self.injector.mel, self.capacity) if self.enabled else None
+
+    def window(self, session_mel: SessionMel, audio: np.ndarray, start: int, end: int) -> Optional[np.ndarray]:
+        """Normalized features of audio[start:end], or None to let the model compute them"""
+        started = time.perf_counter()
+        window = session_mel.window(audio, start, end)
+        if window is None:
+            with self._lock:
+                self._stats["fallbacks"] += 1
+            return None
+        raw, computed = window
+        features = MelSpectrogram.normalize(raw)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            stats = self._stats
+            stats["windows"] += 1
+            stats["frames"] += raw.shape[1]
+            stats["computed_frames"] += computed
+            stats["incremental_seconds"] += elapsed
+            measure = stats["windows"] % self.measure_every == 0
+        if measure:
+            started = time.perf_counter()
+            full = MelSpectrogram.normalize(session_mel.mel.full(audio[start:end]))
+            full_elapsed = time.perf_counter() - started
+            with self._lock:
+                stats["measured_windows"] += 1
+                stats["measured_frames"] += raw.shape[1]
+                stats["measured_full_seconds"] += full_elapsed
+                if not np.allclose(full, features, atol=1e-3):
+                    stats["mismatches"] += 1
+        return features
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        frames = stats["frames"]
+        measured_frames = stats.pop("measured_frames")
+        full_seconds = stats.pop("measured_full_seconds")
+        incremental = stats.pop("incremental_seconds")
+        stats["reused_share"] = round(1 - stats["computed_frames"] / frames, 3) if frames else 0.0
+        stats["injected"] = self.injector.injected if self.injector is not None else 0
+        stats["incremental_ms"] = round(incremental * 1000, 1)
+        # Full recomputation cost per frame, measured on sampled windows
+        if measured_frames:
+            full_ms = full_seconds / measured_frames * frames * 1000
+            stats["full_recompute_ms"] = round(full_ms, 1)
+            stats["cpu_ms_saved"] = round(full_ms - incremental * 1000, 1)
+        return stats
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Language Detection Cache
+Without a configured language every request runs Whisper's language
+detection, including each live chunk of the same speaker. The cache keeps
+the languages detected per client (client id or IP) and pins a client's
+language after several confident detections in a row, so later requests
+skip detection. Detection itself can run on a small model over the first
+seconds of speech instead of the main model.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from speech_trimmer import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class LanguageIdentifier:
+    """Optional small model for language ID on the first seconds of a clip"""
+
+    def __init__(self, config: Dict, device: str, compute_type: str):
+        """
+        Args:
+            config: Language ID configuration with keys:
+                - enabled: bool
+                - model: str, small multilingual Whisper model (tiny, base)
+                - device / compute_type: str, defaults to the main model's
+                - first_seconds: float, audio used for detection
+                - workers / queue_size: int, language ID stage size
+                - timeout_seconds: float, slower detections fall back to the main model
+            device: Device of the main model
+            compute_type: Compute type of the main model
+        """
+        self.enabled = config.get("enabled", False)
+        self.model_size = config.get("model", "tiny")
+        self.first_samples = int(float(config.get("first_seconds", 10)) * SAMPLE_RATE)
+        self.timeout = float(config.get("timeout_seconds", 5.0))
+        self.model = None
+        if self.enabled:
+            try:
+                self.model = WhisperModel(
+                    self.model_size,
+                    device=config.get("device", device),
+                    compute_type=config.get("compute_type", compute_type),
+                )
+                logger.info(f"Language ID model loaded: {self.model_size}")
+            except Exception as e:
+                logger.error(f"Failed to load language ID model {self.model_size}, disabled: {e}")
+                self.enabled = False
+
+    def detect(self, audio: np.ndarray) -> Tuple[str, float]:
+        """Language and probability of the first seconds of audio"""
+        audio = audio[:self.first_samples]
+        model = self.model
+        if hasattr(model, "detect_language"):
+            language, probability, _ = model.detect_language(audio)
+            return language, probability
+        if getattr(model, "feature_extractor", None) is not None and hasattr(model, "encode"):
+            # faster-whisper 1.0: run only the encoder and the language head
+            features = model.feature_extractor(audio)
+            encoder_output = model.encode(features[:, :model.feature_extractor.nb_max_frames])
+            token, probability = model.model.detect_language(encoder_output)[0][0]
+            return token[2:-2], probability
+        # Older versions: transcribe() detects the language eagerly; the segments are never decoded
+        _, info = model.transcribe(audio, beam_size=1, vad_filter=False)
+        return info.language, info.language_probability
+
+
+class ClientLanguage:
+    """Detection history of one client"""
+
+    def __init__(self):
+        self.language = None
+        self.streak = 0  # consecutive confident detections of language
+        self.pinned = False
+        self.last_seen = time.monotonic()
+
+
+class LanguageCache:
+    """Per-client detected languages, pinned after repeated confident detections"""
+
+    def __init__(self, config: Dict, identifier: Optional[LanguageIdentifier] = None):
+        """
+        Args:
+            config: Language cache configuration with keys:
+                - enabled: bool
+                - min_detections: int, consecutive confident detections that pin a language
+                - min_probability: float, detections below this probability reset the streak
+                - ttl_seconds: float, idle clients are forgotten (and unpinned)
+                - max_clients: int, least recently seen clients are dropped beyond this
+                - language_id: dict, see LanguageIdentifier
+            identifier: Small-model language ID (None to detect with the main model)
+        """
+        self.enabled = config.get("enabled", False)
+        self.min_detections = max(1, int(config.get("min_detections", 3)))
+        self.min_probability = float(config.get("min_probability", 0.8))
+        self.ttl = float(config.get("ttl_seconds", 1800))
+        self.max_clients = max(1, int(config.get("max_clients", 1024)))
+        self.identifier = identifier if identifier is not None and identifier.enabled else None
+
+        self._lock = threading.Lock()
+        self._clients: Dict[str, ClientLanguage] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "pins": 0,
+            "low_confidence": 0,
+            "switches": 0,
+            "lid_detections": 0,
+            "lid_seconds": 0.0,
+            "model_detections": 0,
+            "model_seconds": 0.0,
+        }
+
+    def lookup(self, client_key: str) -> Optional[str]:
+        """Pinned language of a client, or None when it still has to be detected"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_locked(now)
+            client = self._clients.get(client_key)
+            if client is not None and client.pinned:
+                client.last_seen = now
+                self._stats["hits"] += 1
+                return client.language
+            self._stats["misses"] += 1
+            return None
+
+    def identify(self, audio: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Language and probability from the small model, or None without one"""
+        if self.identifier is None:
+            return None
+        started = time.perf_counter()
+        language, probability = self.identifier.detect(audio)
+        self.record_detection(time.perf_counter() - started, "lid")
+        return language, probability
+
+    def observe(self, client_key: str, language: Optional[str], probability: Optional[float]):
+        """Record a detected language for a client; pins it after min_detections confident ones"""
+        if not language:
+            return
+        now = time.monotonic()
+        with self._lock:
+            client = self._clients.get(client_key)
+            if client is None:
+                if len(self._clients) >= self.max_clients:
+                    oldest = min(self._clients, key=lambda key: self._clients[key].last_seen)
+                    del self._clients[oldest]
+                client = self._clients[client_key] = ClientLanguage()
+            client.last_seen = now
+            if client.pinned:
+                return
+            if probability is None or probability < self.min_probability:
+                client.streak = 0
+                self._stats["low_confidence"] += 1
+                return
+            if language == client.language:
+                client.streak += 1
+            else:
+                if client.language is not None:
+                    self._stats["switches"] += 1
+                client.language, client.streak = language, 1
+            if client.streak >= self.min_detections:
+                client.pinned = True
+                self._stats["pins"] += 1
+                logger.info(f"Pinned language '{language}' for client {client_key}")
+
+    def record_detection(self, seconds: float, source: str):
+        """Time spent detecting a language, by "lid" (small model) or "model" (main model)"""
+        with self._lock:
+            self._stats[f"{source}_detections"] += 1
+            self._stats[f"{source}_seconds"] += seconds
+
+    def _evict_locked(self, now: float):
+        expired = [key for key, client in self._clients.items() if now - client.last_seen > self.ttl]
+        for key in expired:
+            del self._clients[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["clients"] = len(self._clients)
+            stats["pinned_clients"] = sum(1 for client in self._clients.values() if client.pinned)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        detection_ms = {}
+        for source in ("lid", "model"):
+            count = stats[f"{source}_detections"]
+            seconds = stats.pop(f"{source}_seconds")
+            detection_ms[source] = seconds / count * 1000 if count else None
+            stats[f"avg_{source}_detect_ms"] = round(detection_ms[source], 1) if count else 0.0
+        # Each hit skips one detection, costed at the measured average of the path it would take
+        per_detection = detection_ms["lid"] if self.identifier is not None else detection_ms["model"]
+        stats["detect_ms_saved"] = round(stats["hits"] * per_detection, 1) if per_detection else 0.0
+        return stats
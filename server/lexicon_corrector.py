@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Domain Lexicon Correction
+Fixes homophone mis-recognitions of domain terms (e.g. "派森" -> "Python")
+locally, before or instead of the LLM. A lexicon maps each term to its
+common mis-transcriptions; all of them are compiled into Aho-Corasick
+automata so a transcript is scanned once, in microseconds. With pypinyin
+installed, a term can also list pinyin readings, and any characters with
+that pronunciation are corrected too. Readings are never derived from the
+variants: short toneless readings such as "dao ke" also match ordinary
+words (刀客, 到课), so pronunciation matching is opt-in per term.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over token sequences (characters or pinyin syllables)"""
+
+    def __init__(self):
+        self._goto: List[Dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+
+    def add(self, tokens: Sequence, value: str):
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][token] = nxt
+            node = nxt
+        self._out[node].append((len(tokens), value))
+
+    def build(self):
+        """Compute failure links (breadth first) once all patterns are added"""
+        queue = list(self._goto[0].values())
+        while queue:
+            next_queue = []
+            for node in queue:
+                for token, child in self._goto[node].items():
+                    fail = self._fail[node]
+                    while fail and token not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    target = self._goto[fail].get(token, 0)
+                    self._fail[child] = target if target != child else 0
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+                    next_queue.append(child)
+            queue = next_queue
+
+    def find(self, tokens: Sequence) -> Iterator[Tuple[int, int, str]]:
+        """Yield (start, end, value) for every pattern occurrence"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for length, value in out[node]:
+                yield index + 1 - length, index + 1, value
+
+
+def _is_cjk(char: str) -> bool:
+    return "一" <= char <= "鿿" or "㐀" <= char <= "䶿"
+
+
+@lru_cache(maxsize=8192)
+def _syllable(char: str) -> str:
+    """Toneless default reading of one Chinese character"""
+    return lazy_pinyin(char)[0]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+def _normalize(text: str) -> str:
+    """Text without whitespace and punctuation, for comparing LLM output"""
+    return "".join(
+        c for c in text if not c.isspace() and not unicodedata.category(c).startswith("P")
+    ).lower()
+
+
+def load_lexicon(path: str) -> Dict:
+    """Read the `terms` mapping of a lexicon JSON file"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("terms", {})
+
+
+class LexiconCorrector:
+    """Replaces known mis-transcriptions of domain terms using Aho-Corasick matching"""
+
+    BEFORE_LLM = "before_llm"
+    INSTEAD_OF_LLM = "instead_of_llm"
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: Lexicon configuration with keys:
+                - enabled: bool
+                - path: str, lexicon JSON file (relative paths are resolved from the project root)
+                - terms: dict, inline entries merged over the file
+                - pinyin: bool, also match the explicit "pinyin" readings of a term
+                  by pronunciation (needs pypinyin)
+                - min_pinyin_syllables: int, shorter readings are ignored
+                - mode: "before_llm" (corrected text is sent to the LLM) or
+                  "instead_of_llm" (the LLM is not called)
+        """
+        self.enabled = config.get("enabled", False)
+        self.mode = config.get("mode", self.BEFORE_LLM)
+        if self.mode not in (self.BEFORE_LLM, self.INSTEAD_OF_LLM):
+            logger.warning(f"Unknown lexicon mode {self.mode!r}, using {self.BEFORE_LLM}")
+            self.mode = self.BEFORE_LLM
+        self.min_pinyin_syllables = max(1, int(config.get("min_pinyin_syllables", 3)))
+        self.use_pinyin = config.get("pinyin", True) and lazy_pinyin is not None
+        if config.get("pinyin", True) and lazy_pinyin is None and self.enabled:
+            logger.warning("pypinyin is not installed, lexicon pinyin readings are ignored")
+
+        terms = {}
+        path = config.get("path")
+        if self.enabled and path:
+            if not os.path.isabs(path):
+                path = os.path.join(PROJECT_ROOT, path)
+            try:
+                terms.update(load_lexicon(path))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not load lexicon {path}: {e}")
+        terms.update(config.get("terms", {}))
+
+        self._literal = AhoCorasick()
+        self._pinyin = AhoCorasick()
+        self.term_count = 0
+        self.pattern_count = 0
+        self.pinyin_count = 0
+        for term, entry in terms.items():
+            if term.startswith("_"):
+                continue
+            self._add_term(term, entry)
+        self._literal.build()
+        self._pinyin.build()
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "corrected_requests": 0,
+            "corrections": 0,
+            "match_us_total": 0.0,
+            "llm_calls_avoided": 0,
+            "llm_checked": 0,
+            "llm_redundant": 0,
+        }
+
+        if self.enabled:
+            logger.info(
+                f"Lexicon loaded: {self.term_count} terms, {self.pattern_count} patterns "
+                f"(pinyin matching: {self.use_pinyin}, mode: {self.mode})"
+            )
+
+    @property
+    def replaces_llm(self) -> bool:
+        return self.enabled and self.mode == self.INSTEAD_OF_LLM
+
+    def _add_term(self, term: str, entry):
+        if isinstance(entry, dict):
+            variants = entry.get("variants", [])
+            readings = list(entry.get("pinyin", []))
+        else:
+            variants = entry
+            readings = []
+
+        self.term_count += 1
+        for variant in variants:
+            if not variant or variant == term:
+                continue
+            self._literal.add([c.lower() for c in variant], term)
+            self.pattern_count += 1
+
+        if not self.use_pinyin:
+            return
+        for reading in readings:
+            syllables = reading.lower().split()
+            if len(syllables) < self.min_pinyin_syllables:
+                logger.warning(
+                    f"Ignoring pinyin reading {reading!r} of '{term}': "
+                    f"fewer than {self.min_pinyin_syllables} syllables"
+                )
+                continue
+            self._pinyin.add(syllables, term)
+            self.pattern_count += 1
+            self.pinyin_count += 1
+
+    def correct(self, text: str) -> Tuple[str, int]:
+        """
+        Replace lexicon variants in one text
+
+        Returns:
+            Tuple of (corrected_text, number_of_replacements)
+        """
+        if not self.enabled or not text:
+            return text, 0
+
+        matches = []
+        for start, end, term in self._literal.find([c.lower() for c in text]):
+            matches.append((start, end, 0, term))
+        if self.pinyin_count and any(_is_cjk(c) for c in text):
+            # Per-character readings (cached) keep the scan in the microsecond range
+            tokens = [_syllable(c) if _is_cjk(c) else None for c in text]
+            for start, end, term in self._pinyin.find(tokens):
+                matches.append((start, end, 1, term))
+        if not matches:
+            return text, 0
+
+        # Leftmost-longest, literal matches before pronunciation matches
+        matches.sort(key=lambda m: (m[0], m[0] - m[1], m[2]))
+        pieces = []
+        position = 0
+        count = 0
+        for start, end, _, term in matches:
+            if start < position:
+                continue
+            if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            if text[start:end] == term:
+                continue
+            pieces.append(text[position:start])
+            pieces.append(term)
+            position = end
+            count += 1
+        if not count:
+            return text, 0
+        pieces.append(text[position:])
+        return "".join(pieces), count
+
+    def start(self) -> "LexiconPass":
+        return LexiconPass(self)
+
+    def record(self, corrections: int, elapsed: float):
+        with self._lock:
+            stats = self._stats
+            stats["requests"] += 1
+            stats["corrections"] += corrections
+            stats["match_us_total"] += elapsed * 1e6
+            if corrections:
+                stats["corrected_requests"] += 1
+
+    def record_llm_avoided(self):
+        with self._lock:
+            self._stats["llm_calls_avoided"] += 1
+
+    def record_llm_result(self, corrected_text: str, polished_text: str):
+        """
+        Compare the LLM output with the lexicon-corrected text it was given
+
+        An LLM reply that only differs in punctuation or spacing means the
+        lexicon had already made the call unnecessary.
+        """
+        with self._lock:
+            self._stats["llm_checked"] += 1
+            if _normalize(corrected_text) == _normalize(polished_text):
+                self._stats["llm_redundant"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        match_us = stats.pop("match_us_total")
+        stats["mode"] = self.mode
+        stats["terms"] = self.term_count
+        stats["patterns"] = self.pattern_count
+        stats["pinyin"] = self.use_pinyin
+        stats["avg_match_us"] = round(match_us / requests, 1) if requests else 0.0
+        checked = stats["llm_checked"]
+        stats["llm_redundant_share"] = round(stats["llm_redundant"] / checked, 3) if checked else 0.0
+        return stats
+
+
+class LexiconPass:
+    """Lexicon correction of one transcript, applied segment by segment during decoding"""
+
+    def __init__(self, corrector: LexiconCorrector):
+        self.corrector = corrector
+        self.corrections = 0
+        self.elapsed = 0.0
+
+    def correct(self, text: str) -> str:
+        started = time.perf_counter()
+        text, count = self.corrector.correct(text)
+        self.elapsed += time.perf_counter() - started
+        self.corrections += count
+        return text
+
+    def finish(self) -> Dict:
+        self.corrector.record(self.corrections, self.elapsed)
+        return {"corrections": self.corrections, "match_ms": round(self.elapsed * 1000, 3)}
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Live Session Store
+Keeps the audio and confirmed transcript of a live-streaming recording
+under a session id. Each live chunk stores its audio and decodes the
+session from the end of the last confirmed segment (plus a little
+context) to the newest sample; every segment but the last one that ends
+guard_seconds before that point is confirmed. The final pass after the
+hotkey is released then only decodes the unconfirmed tail instead of the
+whole recording. With incremental features enabled, the log-mel frames of
+the session are computed once and reused by every window. The confirmed
+transcript is also kept as prompt tokens, tokenized once per segment and
+trimmed to a token budget, and used as decoding context for every window.
+
+Sessions live in the memory of one worker process. When a request reaches
+a process without the session's audio the client falls back to sending the
+whole recording.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from incremental_features import IncrementalFeatures
+from polish_gate import NO_SPACE_LANGUAGES, join_segment_texts
+from speech_trimmer import SAMPLE_RATE, TrimResult
+
+logger = logging.getLogger(__name__)
+
+
+class SessionContext:
+    """Confirmed transcript of a session as decoding prompt, tokenized once per segment"""
+
+    def __init__(self, tokenize: Optional[Callable[[str], List[int]]], token_budget: int, char_budget: int = 200):
+        """
+        Args:
+            tokenize: Text to Whisper token ids; None keeps the prompt as text
+            token_budget: Maximum prompt length in tokens (base prompt included)
+            char_budget: Maximum transcript length in characters without a tokenizer
+        """
+        self.tokenize = tokenize
+        self.token_budget = token_budget
+        self.char_budget = char_budget
+        self.texts: List[str] = []
+        self.tokens: List[int] = []  # tail of the transcript's tokens, at most token_budget long
+        self.base_text = None
+        self.base_tokens: List[int] = []
+
+    def add(self, texts: List[str], language: Optional[str]) -> int:
+        """Append confirmed segment texts; returns the number of texts tokenized"""
+        separator = "" if (language or "").split("-")[0] in NO_SPACE_LANGUAGES else " "
+        tokenized = 0
+        for text in texts:
+            if not text:
+                continue
+            self.texts.append(text)
+            if self.tokenize is not None:
+                # Whisper prompts start with a space, as faster-whisper encodes text prompts
+                piece = (" " if not self.tokens else separator) + text
+                self.tokens = (self.tokens + self.tokenize(piece))[-self.token_budget:]
+                tokenized += 1
+        return tokenized
+
+    def prompt(self, base: Optional[Union[str, List[int]]]) -> Optional[Union[str, List[int]]]:
+        """
+        Decoding prompt: the base prompt followed by the end of the transcript
+
+        Args:
+            base: Initial prompt as text, or as token ids (pre-tokenized user profile)
+
+        Returns token ids with a tokenizer (base prompt tokenized once per session),
+        otherwise text; None when there is nothing to prompt with
+        """
+        if self.tokenize is None:
+            transcript = "".join(self.texts)[-self.char_budget:]
+            return transcript or base or None
+        if base != self.base_text:
+            self.base_text = base
+            if isinstance(base, list):
+                self.base_tokens = base[-self.token_budget:]
+            else:
+                self.base_tokens = self.tokenize(" " + base.strip())[-self.token_budget:] if base else []
+        room = self.token_budget - len(self.base_tokens)
+        tokens = self.base_tokens + (self.tokens[-room:] if room > 0 else [])
+        return tokens or None
+
+
+class LiveSession:
+    """Audio buffer and confirmed segments of one recording"""
+
+    def __init__(self, session_id: str, max_samples: int, features: Optional[IncrementalFeatures] = None,
+                 context: Optional[SessionContext] = None):
+        self.session_id = session_id
+        self.max_samples = max_samples
+        self.features = features
+        self.mel = features.session() if features is not None else None
+        self.context = context if context is not None else SessionContext(None, 0)
+        self.lock = threading.Lock()
+        self.audio = np.zeros(SAMPLE_RATE * 30, dtype=np.float32)
+        self.covered: List[Tuple[int, int]] = []  # merged [start, end) sample ranges received
+        self.confirmed: List[Dict] = []
+        self.confirmed_until = 0.0  # seconds; the transcript before this point is final
+        self.decoding = False  # one live decode per session at a time
+        self.overflow = False
+        self.last_seen = time.monotonic()
+
+    @property
+    def stored_until(self) -> int:
+        """Length of the contiguous audio prefix received so far"""
+        if self.covered and self.covered[0][0] == 0:
+            return self.covered[0][1]
+        return 0
+
+    def write(self, offset: int, audio: np.ndarray) -> bool:
+        end = offset + len(audio)
+        if end > self.max_samples:
+            self.overflow = True
+            return False
+        if end > len(self.audio):
+            grown = np.zeros(max(end, len(self.audio) * 2), dtype=np.float32)
+            grown[:len(self.audio)] = self.audio
+            self.audio = grown
+        self.audio[offset:end] = audio
+
+        merged = []
+        for start, stop in sorted(self.covered + [(offset, end)]):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        self.covered = merged
+        return True
+
+    def window(self, context_seconds: float, end: int) -> TrimResult:
+        """Audio from shortly before confirmed_until up to end, mapped to session time"""
+        start = int(max(0.0, self.confirmed_until - context_seconds) * SAMPLE_RATE)
+        # Hop-aligned, so the window's feature frames line up with the session's
+        start = min(start - start % 160, end)
+        window = TrimResult(self.audio[start:end].copy(), [(start, end)], end, 0.0, trimmed=False)
+        if self.mel is not None:
+            window.features = self.features.window(self.mel, self.audio, start, end)
+        return window
+
+    def new_segments(self, segments: List[Dict]) -> List[Dict]:
+        """Segments of a window decode that are not part of the confirmed transcript"""
+        # Segments mostly inside the context before confirmed_until were already confirmed
+        return [s for s in segments if (s["start"] + s["end"]) / 2 >= self.confirmed_until]
+
+    def summary(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "audio_until": self.stored_until,
+            "confirmed_until": round(self.confirmed_until, 3),
+            "confirmed_segments": len(self.confirmed),
+        }
+
+
+class LivePass:
+    """A live chunk's decode of the session's unconfirmed audio"""
+
+    def __init__(self, store: "LiveSessionStore", session: LiveSession, window: Optional[TrimResult]):
+        """
+        Args:
+            window: Audio to decode, or None when another live decode of the
+                session is running (the chunk is only stored; the next decode covers it)
+        """
+        self.store = store
+        self.session = session
+        self.window = window
+        self.finished = window is None
+
+    def prompt(self, base: Optional[Union[str, List[int]]] = None) -> Optional[Union[str, List[int]]]:
+        """Session transcript as decoding context, after the base prompt"""
+        with self.session.lock:
+            prompt = self.session.context.prompt(base)
+        self.store.record_prompt(prompt)
+        return prompt
+
+    def summary(self) -> Dict:
+        with self.session.lock:
+            return self.session.summary()
+
+    def finish(self, result: Optional[Dict]) -> Optional[Dict]:
+        """
+        Confirm the settled segments of the window's result
+
+        Must be called for every decoded window, also when decoding failed
+        (result None), so the next live chunk can decode again; later calls
+        return the result unchanged.
+
+        Returns:
+            The result with only the segments that are new to the session
+            and a session summary
+        """
+        session = self.session
+        with session.lock:
+            if self.finished:
+                return result
+            self.finished = True
+            session.decoding = False
+            if not result or not result.get("success"):
+                return result
+
+            new = session.new_segments(result["segments"])
+            confirm_before = self.window.total_seconds - self.store.guard_seconds
+            # The last segment may still be cut off by the end of the window
+            confirmed = []
+            for segment in new[:-1]:
+                if segment["end"] > confirm_before:
+                    break
+                confirmed.append(segment)
+                session.confirmed_until = segment["end"]
+            session.confirmed.extend(confirmed)
+            tokenized = session.context.add([segment["text"] for segment in confirmed], result.get("language"))
+            summary = session.summary()
+
+        result["segments"] = new
+        result["text"] = join_segment_texts([s["text"] for s in new], result.get("language"))
+        result["original_text"] = result["text"]
+        result["session"] = summary
+        self.store.record_live_decode(self.window.speech_seconds, tokenized)
+        return result
+
+
+class FinalPass:
+    """Unconfirmed tail of a session still to decode, and the transcript confirmed before it"""
+
+    def __init__(self, store: "LiveSessionStore", session: LiveSession, window: TrimResult, confirmed: List[Dict],
+                 confirmed_until: float):
+        self.store = store
+        self.session = session
+        self.window = window
+        self.confirmed = confirmed
+        self.confirmed_until = confirmed_until
+
+    def prompt(self, base: Optional[Union[str, List[int]]] = None) -> Optional[Union[str, List[int]]]:
+        """Tail of the confirmed transcript, as decoding context for the window"""
+        with self.session.lock:
+            prompt = self.session.context.prompt(base)
+        self.store.record_prompt(prompt)
+        return prompt
+
+    def merge(self, result: Dict) -> Dict:
+        """Prepend the confirmed segments to the tail's transcription result"""
+        if not result.get("success"):
+            return result
+        segments = self.confirmed + [
+            s for s in result["segments"] if (s["start"] + s["end"]) / 2 >= self.confirmed_until
+        ]
+        text = join_segment_texts([segment["text"] for segment in segments], result.get("language"))
+        result["segments"] = segments
+        result["text"] = text
+        result["original_text"] = text
+        # asr_text would only cover the decoded tail
+        result.pop("asr_text", None)
+        result["session"] = {
+            "session_id": self.session.session_id,
+            "confirmed_segments": len(self.confirmed),
+            "reused_seconds": round(self.window.regions[0][0] / SAMPLE_RATE, 3),
+            "decoded_seconds": round(self.window.speech_seconds, 3),
+        }
+        return result
+
+
+class LiveSessionStore:
+    """Live-streaming sessions of this worker process, evicted after a TTL"""
+
+    def __init__(self, config: Dict, features: Optional[IncrementalFeatures] = None,
+                 tokenize: Optional[Callable[[str], List[int]]] = None):
+        """
+        Args:
+            features: Incremental log-mel extraction shared by the sessions (None to disable)
+            tokenize: The model's text to token ids, for prompts kept as tokens (None keeps text prompts)
+            config: Live session configuration with keys:
+                - enabled: bool
+                - ttl_seconds: float, sessions idle for longer are dropped
+                - max_session_seconds: float, audio kept per session; longer recordings
+                  fall back to a full final pass
+                - guard_seconds: float, segments ending this close to the newest audio stay unconfirmed
+                - context_seconds: float, audio before confirmed_until decoded again as context
+                - max_sessions: int, least recently used sessions are dropped beyond this
+                - prompt_token_budget: int, maximum decoding prompt length in tokens
+                - incremental_features: dict, see IncrementalFeatures
+        """
+        self.enabled = config.get("enabled", True)
+        self.ttl = float(config.get("ttl_seconds", 120))
+        self.max_samples = int(float(config.get("max_session_seconds", 600)) * SAMPLE_RATE)
+        self.guard_seconds = float(config.get("guard_seconds", 1.0))
+        self.context_seconds = float(config.get("context_seconds", 0.5))
+        self.max_sessions = max(1, int(config.get("max_sessions", 256)))
+        self.features = features if features is not None and features.enabled else None
+        self.tokenize = tokenize
+        self.prompt_token_budget = max(1, int(config.get("prompt_token_budget", 200)))
+
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, LiveSession] = {}
+        self._stats = {
+            "live_chunks": 0,
+            "final_passes": 0,
+            "fallbacks": 0,
+            "evicted": 0,
+            "tokenized_segments": 0,
+            "token_prompts": 0,
+            "prompt_tokens": 0,
+            "live_decoded_seconds": 0.0,
+            "reused_seconds": 0.0,
+            "decoded_seconds": 0.0,
+        }
+
+    def _session(self, session_id: str, create: bool) -> Optional[LiveSession]:
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if now - s.last_seen > self.ttl]
+            for sid in expired:
+                del self._sessions[sid]
+            self._stats["evicted"] += len(expired)
+
+            session = self._sessions.get(session_id)
+            if session is None and create:
+                if len(self._sessions) >= self.max_sessions:
+                    oldest = min(self._sessions.values(), key=lambda s: s.last_seen)
+                    del self._sessions[oldest.session_id]
+                    self._stats["evicted"] += 1
+                context = SessionContext(self.tokenize, self.prompt_token_budget)
+                session = LiveSession(session_id, self.max_samples, self.features, context)
+                self._sessions[session_id] = session
+            if session is not None:
+                session.last_seen = now
+            return session
+
+    def live_pass(self, session_id: str, offset: int, audio: np.ndarray, decode: bool = True) -> Optional[LivePass]:
+        """
+        Store a live chunk and plan its decode
+
+        Returns:
+            LivePass (its window is None when nothing should be decoded now), or
+            None when the session's audio has a gap; the chunk is then decoded
+            on its own as without a session
+        """
+        session = self._session(session_id, create=True)
+        with self._lock:
+            self._stats["live_chunks"] += 1
+        with session.lock:
+            if not session.write(offset, audio) or session.stored_until < offset + len(audio):
+                return None
+            if not decode or session.decoding:
+                return LivePass(self, session, None)
+            session.decoding = True
+            return LivePass(self, session, session.window(self.context_seconds, session.stored_until))
+
+    def final_pass(self, session_id: str, offset: int, tail: np.ndarray) -> Optional[FinalPass]:
+        """
+        Assemble the recording from stored audio plus the uploaded tail
+
+        Returns:
+            FinalPass, or None when the session is unknown or audio before
+            offset is missing (the client then sends the whole recording)
+        """
+        session = self._session(session_id, create=False)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if session is None:
+            with self._lock:
+                self._stats["fallbacks"] += 1
+            return None
+
+        with session.lock:
+            if session.overflow or session.stored_until < offset or not session.write(offset, tail):
+                with self._lock:
+                    self._stats["fallbacks"] += 1
+                return None
+            end = offset + len(tail)
+            window = session.window(self.context_seconds, end)
+            confirmed = list(session.confirmed)
+            confirmed_until = session.confirmed_until
+
+        with self._lock:
+            self._stats["final_passes"] += 1
+            self._stats["reused_seconds"] += window.regions[0][0] / SAMPLE_RATE
+            self._stats["decoded_seconds"] += window.speech_seconds
+        return FinalPass(self, session, window, confirmed, confirmed_until)
+
+    def record_live_decode(self, seconds: float, tokenized: int = 0):
+        with self._lock:
+            self._stats["live_decoded_seconds"] += seconds
+            self._stats["tokenized_segments"] += tokenized
+
+    def record_prompt(self, prompt: Optional[Union[str, List[int]]]):
+        if isinstance(prompt, list):
+            with self._lock:
+                self._stats["token_prompts"] += 1
+                self._stats["prompt_tokens"] += len(prompt)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active_sessions"] = len(self._sessions)
+        total = stats["reused_seconds"] + stats["decoded_seconds"]
+        # Share of final-pass audio that was not decoded again after the hotkey was released
+        stats["reused_share"] = round(stats["reused_seconds"] / total, 3) if total else 0.0
+        for key in ("live_decoded_seconds", "reused_seconds", "decoded_seconds"):
+            stats[key] = round(stats[key], 1)
+        prompts = stats["token_prompts"]
+        stats["prompt_tokenizer"] = self.tokenize is not None
+        stats["prompt_token_budget"] = self.prompt_token_budget
+        prompt_tokens = stats.pop("prompt_tokens")
+        stats["avg_prompt_tokens"] = round(prompt_tokens / prompts, 1) if prompts else 0.0
+        if self.features is not None:
+            stats["features"] = self.features.stats()
+        return stats
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Endpoint Pool
+Weighted selection across several OpenAI-compatible endpoints, per-endpoint
+latency tracking, hedge delays derived from each endpoint's recent latency,
+and automatic demotion of endpoints that are much slower than the best one
+or keep failing
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from llm_metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class LLMEndpoint:
+    """One OpenAI-compatible endpoint and its recent latency"""
+
+    def __init__(self, name: str, api_url: str, api_key: str, model: str, weight: float, window: int):
+        self.name = name
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(0.0, float(weight))
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.demoted_until = 0.0
+        self.times_demoted = 0
+
+    def is_demoted(self, now: float) -> bool:
+        return now < self.demoted_until
+
+
+class EndpointPool:
+    """Chooses primary and hedge endpoints and tracks their latency"""
+
+    def __init__(self, endpoints: List[LLMEndpoint], config: Dict):
+        """
+        Args:
+            endpoints: Configured endpoints (at least one)
+            config: Hedging configuration with keys:
+                - enabled: bool, send a duplicate to a second endpoint when the primary is slow
+                - percentile: float, hedge once the primary exceeds this latency percentile
+                - initial_delay_ms: float, hedge delay before an endpoint has min_samples latencies
+                - min_delay_ms / max_delay_ms: float, bounds of the hedge delay
+                - min_samples: int, latencies needed before percentiles are trusted
+                - demote_ratio: float, demote endpoints whose median latency exceeds
+                  the best endpoint's median by this factor
+                - demote_failures: int, demote after this many consecutive failures
+                - demote_seconds: float, how long a demoted endpoint only serves as fallback
+        """
+        self.endpoints = endpoints
+        self.hedging = config.get("enabled", False) and len(endpoints) > 1
+        self.hedge_percentile = float(config.get("percentile", 90))
+        self.initial_delay = float(config.get("initial_delay_ms", 1000)) / 1000.0
+        self.min_delay = float(config.get("min_delay_ms", 100)) / 1000.0
+        self.max_delay = float(config.get("max_delay_ms", 5000)) / 1000.0
+        self.min_samples = max(1, int(config.get("min_samples", 20)))
+        self.demote_ratio = float(config.get("demote_ratio", 2.0))
+        self.demote_failures = max(1, int(config.get("demote_failures", 3)))
+        self.demote_seconds = float(config.get("demote_seconds", 60))
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    @property
+    def primary(self) -> LLMEndpoint:
+        return self.endpoints[0]
+
+    def choose(self) -> LLMEndpoint:
+        """Weighted random choice among endpoints that are not demoted"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if not e.is_demoted(now) and e.weight > 0]
+            if not candidates:
+                # Everything demoted: use the one that recovers first
+                return min(self.endpoints, key=lambda e: e.demoted_until)
+            total = sum(e.weight for e in candidates)
+            pick = self._rng.uniform(0, total)
+            for endpoint in candidates:
+                pick -= endpoint.weight
+                if pick <= 0:
+                    return endpoint
+            return candidates[-1]
+
+    def hedge_target(self, primary: LLMEndpoint) -> Optional[LLMEndpoint]:
+        """Fastest other endpoint, preferring ones that are not demoted"""
+        if not self.hedging:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            others = [e for e in self.endpoints if e is not primary]
+            if not others:
+                return None
+            return min(others, key=lambda e: (e.is_demoted(now), self._median_locked(e)))
+
+    def hedge_delay(self, endpoint: LLMEndpoint) -> float:
+        """Seconds to wait for the endpoint before sending a hedge"""
+        with self._lock:
+            if len(endpoint.latencies) < self.min_samples:
+                delay = self.initial_delay
+            else:
+                delay = percentile(list(endpoint.latencies), self.hedge_percentile)
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def record(self, endpoint: LLMEndpoint, latency: float, success: bool):
+        """Record the outcome of one request and re-evaluate demotion"""
+        now = time.monotonic()
+        with self._lock:
+            endpoint.requests += 1
+            if success:
+                endpoint.latencies.append(latency)
+                endpoint.consecutive_failures = 0
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.demote_failures:
+                    self._demote_locked(endpoint, now, f"{endpoint.consecutive_failures} consecutive failures")
+                return
+
+            if len(self.endpoints) < 2 or len(endpoint.latencies) < self.min_samples:
+                return
+            medians = [
+                self._median_locked(e) for e in self.endpoints
+                if len(e.latencies) >= self.min_samples and not e.is_demoted(now)
+            ]
+            if not medians:
+                return
+            median = self._median_locked(endpoint)
+            best = min(medians)
+            if best > 0 and median > best * self.demote_ratio:
+                self._demote_locked(
+                    endpoint, now, f"median latency {median * 1000:.0f}ms vs best {best * 1000:.0f}ms"
+                )
+
+    def record_hedge(self, endpoint: LLMEndpoint, won: bool = False):
+        with self._lock:
+            if won:
+                endpoint.hedges_won += 1
+            else:
+                endpoint.hedges_sent += 1
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            result = []
+            for endpoint in self.endpoints:
+                latencies = list(endpoint.latencies)
+                result.append({
+                    "name": endpoint.name,
+                    "api_url": endpoint.api_url,
+                    "model": endpoint.model,
+                    "weight": endpoint.weight,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "hedges_sent": endpoint.hedges_sent,
+                    "hedges_won": endpoint.hedges_won,
+                    "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                    "latency_p90_ms": round(percentile(latencies, 90) * 1000, 1),
+                    "demoted": endpoint.is_demoted(now),
+                    "demoted_remaining_seconds": round(max(0.0, endpoint.demoted_until - now), 1),
+                    "times_demoted": endpoint.times_demoted,
+                })
+            return result
+
+    def _median_locked(self, endpoint: LLMEndpoint) -> float:
+        if not endpoint.latencies:
+            return 0.0
+        return percentile(list(endpoint.latencies), 50)
+
+    def _demote_locked(self, endpoint: LLMEndpoint, now: float, reason: str):
+        if endpoint.is_demoted(now):
+            return
+        endpoint.demoted_until = now + self.demote_seconds
+        endpoint.times_demoted += 1
+        # Fresh samples decide whether it stays demoted after the cooldown
+        endpoint.latencies.clear()
+        endpoint.consecutive_failures = 0
+        logger.warning(f"LLM endpoint {endpoint.name} demoted for {self.demote_seconds}s: {reason}")
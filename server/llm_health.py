@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Health Monitor
+Derives endpoint health from the outcome of real polish calls and only
+sends an active probe when traffic has been idle. Probe results are cached
+with a TTL and probes are rate-limited, so health endpoints can be polled
+frequently without spending tokens or blocking.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+from llm_metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Passive health from recent calls, with a cached, rate-limited active probe"""
+
+    HEALTHY = "healthy"
+    UNHEALTHY = "unhealthy"
+    UNKNOWN = "unknown"
+
+    def __init__(self, probe: Callable[[], Tuple[bool, str]], config: Dict):
+        """
+        Args:
+            probe: Sends one minimal request and returns (is_healthy, message)
+            config: Health configuration with keys:
+                - window_seconds: float, real calls within this window decide health
+                - min_calls: int, calls in the window needed to judge from traffic
+                - min_success_rate: float, success share below which the endpoint is unhealthy
+                - probe_ttl_seconds: float, how long a probe result is reused
+                - probe_min_interval_seconds: float, minimum time between probes
+        """
+        self.probe = probe
+        self.window = float(config.get("window_seconds", 60))
+        self.min_calls = max(1, int(config.get("min_calls", 3)))
+        self.min_success_rate = float(config.get("min_success_rate", 0.5))
+        self.probe_ttl = float(config.get("probe_ttl_seconds", 60))
+        self.probe_min_interval = float(config.get("probe_min_interval_seconds", 30))
+
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=1000)  # (timestamp, success, latency)
+        self._probe_result = None  # (is_healthy, message, checked_at)
+        self._probe_started_at = 0.0
+        self._probe_running = False
+        self._probes = 0
+
+    def record(self, success: bool, latency: Optional[float] = None):
+        """Record the outcome of a real LLM call"""
+        with self._lock:
+            self._calls.append((time.monotonic(), success, latency))
+
+    def status(self) -> Dict:
+        """
+        Current health without blocking
+
+        Uses recent traffic when there is enough of it, otherwise the cached
+        probe result; starts a background probe when that result is missing
+        or older than the TTL.
+        """
+        now = time.monotonic()
+        with self._lock:
+            recent = [c for c in self._calls if now - c[0] <= self.window]
+            probe_result = self._probe_result
+
+        if len(recent) >= self.min_calls:
+            successes = sum(1 for c in recent if c[1])
+            success_rate = successes / len(recent)
+            latencies = [c[2] for c in recent if c[1] and c[2] is not None]
+            healthy = success_rate >= self.min_success_rate
+            return {
+                "state": self.HEALTHY if healthy else self.UNHEALTHY,
+                "source": "traffic",
+                "message": (
+                    f"{successes}/{len(recent)} LLM calls succeeded in the last {self.window:.0f}s"
+                ),
+                "recent_calls": len(recent),
+                "success_rate": round(success_rate, 3),
+                "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+                "age_seconds": round(now - recent[-1][0], 1),
+            }
+
+        if probe_result is None or now - probe_result[2] > self.probe_ttl:
+            self._start_probe(now)
+
+        if probe_result is None:
+            return {
+                "state": self.UNKNOWN,
+                "source": "probe",
+                "message": "No recent LLM calls; health probe scheduled",
+                "recent_calls": len(recent),
+                "age_seconds": None,
+            }
+
+        healthy, message, checked_at = probe_result
+        return {
+            "state": self.HEALTHY if healthy else self.UNHEALTHY,
+            "source": "probe",
+            "message": message,
+            "recent_calls": len(recent),
+            "age_seconds": round(now - checked_at, 1),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"probes": self._probes, "probe_running": self._probe_running}
+
+    def _start_probe(self, now: float):
+        with self._lock:
+            if self._probe_running or now - self._probe_started_at < self.probe_min_interval:
+                return
+            self._probe_running = True
+            self._probe_started_at = now
+            self._probes += 1
+        threading.Thread(target=self._run_probe, name="llm-health-probe", daemon=True).start()
+
+    def _run_probe(self):
+        try:
+            healthy, message = self.probe()
+        except Exception as e:
+            healthy, message = False, f"LLM health probe failed: {e}"
+        if not healthy:
+            logger.warning(f"LLM health probe: {message}")
+        with self._lock:
+            self._probe_result = (healthy, message, time.monotonic())
+            self._probe_running = False
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Call Metrics
+Time to first token, generation rate and total latency of polish calls
+"""
+
+import math
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+class CallMetrics:
+    """Time to first token, throughput and total latency of one polish call"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+        self.completion_tokens = 0
+        self.streamed = False
+        self.attempts = 0
+
+    @property
+    def ttft(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def latency(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Generation rate: tokens after the first one over the time they took to arrive"""
+        if self.finished_at is None or self.first_token_at is None or not self.completion_tokens:
+            return None
+        if self.streamed:
+            elapsed = self.finished_at - self.first_token_at
+            tokens = self.completion_tokens - 1
+        else:
+            elapsed = self.finished_at - self.started_at
+            tokens = self.completion_tokens
+        return tokens / elapsed if elapsed > 0 and tokens > 0 else None
+
+    def to_dict(self) -> Dict:
+        return CallMetrics.merge([self])
+
+    @staticmethod
+    def merge(metrics: List["CallMetrics"]) -> Dict:
+        """
+        Summarize the calls made for one request
+
+        Calls of one request run in parallel, so the request's TTFT is the
+        earliest first token and its LLM latency the slowest call.
+        """
+        done = [m for m in metrics if m.finished_at is not None]
+        ttfts = [m.ttft for m in done if m.ttft is not None]
+        rates = [m.tokens_per_second for m in done if m.tokens_per_second is not None]
+        return {
+            "llm_calls": len(done),
+            "llm_streamed": any(m.streamed for m in done),
+            "llm_ttft_ms": round(min(ttfts) * 1000, 1) if ttfts else None,
+            "llm_ms": round(max(m.latency for m in done) * 1000, 1) if done else None,
+            "llm_completion_tokens": sum(m.completion_tokens for m in done),
+            "llm_tokens_per_second": round(sum(rates) / len(rates), 1) if rates else None,
+        }
@@ -3,28 +3,199 @@
 """
 LLM Service for Text Polish and Correction
 Supports OpenAI API compatible endpoints (e.g., ModelScope, Ollama, etc.)
-Uses OpenAI SDK for reliable API communication
+Requests go through LLMTransport (async, pooled), which uses the OpenAI SDK
+when it is installed and plain HTTP otherwise
 """
 
+import heapq
+import itertools
 import logging
-from typing import Optional, Dict, Tuple
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Dict, Tuple
+import threading
 import time
 
-# Try to import OpenAI SDK
-try:
-    from openai import OpenAI, APIError, APIConnectionError, RateLimitError, AuthenticationError
-    OPENAI_SDK_AVAILABLE = True
-except ImportError:
-    OPENAI_SDK_AVAILABLE = False
-    # Fallback to requests if OpenAI SDK is not available
-    import requests
+from llm_endpoints import EndpointPool, LLMEndpoint
+from llm_health import HealthMonitor
+from llm_metrics import CallMetrics, percentile
+from llm_transport import OPENAI_SDK_AVAILABLE, LLMTransport, TransportError
+from polish_batcher import PolishBatcher
+from polish_cache import PolishCache
 
 logger = logging.getLogger(__name__)
 
+# Project root, used to resolve relative paths in the LLM configuration
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# User message prefix of a single polish request; the transcript follows
+POLISH_PREFIX = "Please polish and correct this text:\n\n"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the LLM endpoint
+
+    closed    - requests flow normally, consecutive failures are counted
+    open      - requests are rejected immediately until the cooldown expires
+    half_open - a single probe request is let through; success closes the
+                breaker, failure re-opens it for another cooldown
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+        self._rejected = 0
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent to the endpoint"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self._rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self._rejected += 1
+                    return False
+                self._probe_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("LLM circuit breaker closed after successful probe")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                    logger.warning(
+                        f"LLM circuit breaker opened after {self._consecutive_failures} consecutive failures, "
+                        f"cooling down for {self.cooldown}s"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        """Breaker state for health/metrics endpoints"""
+        with self._lock:
+            remaining = 0.0
+            if self._state == self.OPEN:
+                remaining = max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown,
+                "cooldown_remaining_seconds": round(remaining, 2),
+                "times_opened": self._times_opened,
+                "rejected_requests": self._rejected,
+            }
+
+
+class RetryScheduler:
+    """Single timer thread that runs callbacks after a delay without parking worker threads"""
+
+    def __init__(self, name: str = "llm-retry-scheduler"):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def schedule(self, delay: float, callback: Callable[[], None]):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), callback))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, callback = self._heap[0]
+                wait_time = due - time.monotonic()
+                if wait_time > 0:
+                    self._cond.wait(wait_time)
+                    continue
+                heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Scheduled LLM retry failed to start: {e}")
+
+
+class PolishCall:
+    """State of one polish call carried across its attempts"""
+
+    def __init__(self, text: str, future: Future, max_tokens: int, stream: bool,
+                 on_delta: Optional[Callable[[Optional[str]], None]], metrics: CallMetrics,
+                 prompt: Optional[str] = None, cacheable: bool = True,
+                 deadline: Optional[float] = None):
+        self.text = text
+        self.prompt = prompt if prompt is not None else POLISH_PREFIX + text
+        self.cacheable = cacheable
+        self.future = future
+        self.max_tokens = max_tokens
+        self.stream = stream
+        self.on_delta = on_delta
+        self.metrics = metrics
+        self.deadline = deadline  # time.monotonic() by which the call must finish
+        self.attempt = 0
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None without a deadline)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+
+class AttemptRace:
+    """Requests racing to settle one attempt: the primary and an optional hedge"""
+
+    def __init__(self, primary: LLMEndpoint):
+        self.primary = primary
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.hedged = False
+        self.finished = False
+
 
 class LLMService:
     """LLM service for text polishing and correction using OpenAI SDK"""
 
+    # Outcomes of a single request attempt
+    SUCCESS = "success"
+    BAD_RESPONSE = "bad_response"  # Endpoint answered but the content is unusable
+    RETRYABLE = "retryable"  # Rate limit, connection or server error
+    FATAL = "fatal"  # Endpoint failure that retrying will not fix (e.g. auth)
+
     def __init__(self, config: Dict):
         """
         Initialize LLM service
@@ -40,7 +211,21 @@ class LLMService:
                 - retry_delay: int, Delay between retries in seconds
                 - temperature: float, Sampling temperature
                 - max_tokens: int, Maximum tokens in response
+                - stream: bool, Stream completions (measures time to first token)
                 - system_prompt: str, System prompt for LLM
+                - max_concurrency: int, Maximum in-flight LLM API requests (transport semaphore)
+                - transport: dict, backend and connection pool settings (see LLMTransport)
+                - circuit_breaker: dict, failure_threshold and cooldown_seconds
+                - cache: dict, polish result cache (enabled, memory_entries,
+                  sqlite_path, max_entries, ttl_seconds)
+                - batching: dict, cross-request batching of short texts
+                  (enabled, max_chars, max_batch, window_ms, tokens_per_char)
+                - endpoints: list, optional extra endpoints (name, api_url, api_key,
+                  model, weight); api_key and model default to the top-level values
+                - hedging: dict, hedged requests across endpoints (see EndpointPool)
+                - health: dict, passive health and cached probe settings (see HealthMonitor)
+                - deadline: dict, min_budget_seconds: calls with less time left before
+                  their deadline skip the LLM (or stop retrying)
         """
         self.enabled = config.get("enabled", False)
         self.api_url = config.get("api_url", "").strip()
@@ -50,6 +235,30 @@ class LLMService:
         self.max_retries = config.get("max_retries", 2)
         self.retry_delay = config.get("retry_delay", 1)
 
+        # Endpoints: the top-level api_url first, then any configured extras
+        hedging_config = config.get("hedging", {})
+        window = int(hedging_config.get("window", 200))
+        endpoints = []
+        if self.api_url:
+            endpoints.append(LLMEndpoint("primary", self.api_url, self.api_key, self.model,
+                                         config.get("weight", 1.0), window))
+        for index, endpoint_config in enumerate(config.get("endpoints", [])):
+            api_url = (endpoint_config.get("api_url") or "").strip()
+            if not api_url:
+                continue
+            endpoints.append(LLMEndpoint(
+                endpoint_config.get("name", f"endpoint-{index + 1}"),
+                api_url,
+                (endpoint_config.get("api_key") or self.api_key).strip(),
+                endpoint_config.get("model") or self.model,
+                endpoint_config.get("weight", 1.0),
+                window,
+            ))
+        if endpoints and not self.api_url:
+            self.api_url, self.api_key = endpoints[0].api_url, endpoints[0].api_key
+            self.model = self.model or endpoints[0].model
+        self.endpoints = EndpointPool(endpoints, hedging_config) if endpoints else None
+
         # System prompt for polishing and correcting transcription
         self.system_prompt = config.get(
             "system_prompt",
@@ -60,22 +269,68 @@ class LLMService:
 
         self.temperature = config.get("temperature", 0.3)
         self.max_tokens = config.get("max_tokens", 2000)
+        self.stream = config.get("stream", False)
+        self.min_budget = float(config.get("deadline", {}).get("min_budget_seconds", 1.0))
+
+        # Recent successful calls, for TTFT / throughput / latency metrics
+        self._call_stats_lock = threading.Lock()
+        self._recent_calls = deque(maxlen=512)
+        self._call_totals = {"calls": 0, "streamed_calls": 0, "completion_tokens": 0}
+        self._deadline_stats = {"skipped": 0, "retries_cut": 0, "capped_requests": 0}
+
+        # Requests run on the transport's event loop; completions are handled on a
+        # small pool and backoff waits are scheduled on a timer thread, so no
+        # thread blocks on the network or sleeps between attempts
+        self.max_concurrency = max(1, int(config.get("max_concurrency", 4)))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="llm"
+        )
+        self._scheduler = RetryScheduler()
 
-        # Initialize OpenAI client if enabled
-        self.client = None
-        if self.is_enabled() and OPENAI_SDK_AVAILABLE:
-            try:
-                self.client = OpenAI(
-                    api_key=self.api_key,
-                    base_url=self.api_url,
-                    timeout=self.timeout,
-                )
-                logger.info(f"LLM Service initialized with OpenAI SDK - Model: {self.model}")
-            except Exception as e:
-                logger.warning(f"Failed to initialize OpenAI client: {e}")
-                self.client = None
-        elif self.enabled and not OPENAI_SDK_AVAILABLE:
-            logger.warning("OpenAI SDK not available, LLM service will use requests library as fallback")
+        # Health comes from real calls; probes only run when traffic is idle
+        self.health = HealthMonitor(self._probe, config.get("health", {}))
+
+        breaker_config = config.get("circuit_breaker", {})
+        self.breaker = CircuitBreaker(
+            failure_threshold=breaker_config.get("failure_threshold", 5),
+            cooldown=breaker_config.get("cooldown_seconds", 30),
+        )
+
+        # Polish result cache (memory LRU + SQLite)
+        self.cache = None
+        cache_config = config.get("cache", {})
+        if self.is_enabled() and cache_config.get("enabled", False):
+            sqlite_path = cache_config.get("sqlite_path", "cache/polish_cache.sqlite3")
+            if sqlite_path and not os.path.isabs(sqlite_path):
+                sqlite_path = os.path.join(PROJECT_ROOT, sqlite_path)
+            self.cache = PolishCache(
+                model=self.model,
+                system_prompt=self.system_prompt,
+                temperature=self.temperature,
+                memory_entries=cache_config.get("memory_entries", 1024),
+                sqlite_path=sqlite_path,
+                max_entries=cache_config.get("max_entries", 50000),
+                ttl_seconds=cache_config.get("ttl_seconds", 7 * 24 * 3600),
+            )
+
+        # Short texts from concurrent requests can share one LLM call
+        self.batcher = None
+        batching_config = config.get("batching", {})
+        if self.is_enabled() and batching_config.get("enabled", False):
+            self.batcher = PolishBatcher(self, batching_config)
+
+        # Async transport shared by all endpoints
+        self.transport = None
+        if self.is_enabled():
+            self.transport = LLMTransport(
+                self.endpoints.endpoints, config.get("transport", {}), self.max_concurrency, self.timeout
+            )
+            if not OPENAI_SDK_AVAILABLE:
+                logger.warning(f"OpenAI SDK not available, using the {self.transport.backend} transport")
+            logger.info(
+                f"LLM Service initialized - Model: {self.model}, transport: {self.transport.backend}, "
+                f"endpoints: {len(self.endpoints.endpoints)}, hedging: {self.endpoints.hedging}"
+            )
 
         logger.info(f"LLM Service initialized - Enabled: {self.enabled}, Model: {self.model}, SDK: {OPENAI_SDK_AVAILABLE}")
 
@@ -106,145 +361,433 @@ class LLMService:
 
     def health_check(self) -> Tuple[bool, str]:
         """
-        Perform health check on LLM API
+        Report LLM API health without blocking
+
+        Health is derived from recent real polish calls; when there are too
+        few, a cached probe result is used and a new probe is started in the
+        background once it is older than the TTL. An unknown state (no calls
+        and no probe result yet) is reported as healthy.
 
         Returns:
             Tuple of (is_healthy, status_message)
         """
-        if not self.is_enabled():
-            return True, "LLM service is disabled"
-
-        if not OPENAI_SDK_AVAILABLE:
-            return False, "OpenAI SDK not available"
+        status = self.health_status()
+        return status["state"] != HealthMonitor.UNHEALTHY, status["message"]
 
+    def health_status(self) -> Dict:
+        """Health state, its source (traffic/probe/breaker) and supporting numbers"""
+        if not self.is_enabled():
+            return {"state": HealthMonitor.HEALTHY, "source": "config", "message": "LLM service is disabled"}
+
+        breaker_state = self.breaker.snapshot()
+        if breaker_state["state"] == CircuitBreaker.OPEN:
+            return {
+                "state": HealthMonitor.UNHEALTHY,
+                "source": "circuit_breaker",
+                "message": (
+                    "LLM circuit breaker is open, retrying in "
+                    f"{breaker_state['cooldown_remaining_seconds']}s"
+                ),
+            }
+
+        return self.health.status()
+
+    def _probe(self) -> Tuple[bool, str]:
+        """Minimal completion against the primary endpoint (run by the health monitor)"""
         try:
-            # Try a minimal request to check connectivity
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": "test"}
-                ],
-                max_tokens=10,
-            )
+            self.transport.chat(
+                self.endpoints.primary,
+                [{"role": "user", "content": "test"}],
+                max_tokens=1,
+            ).result()
             return True, "LLM API is healthy"
-
-        except AuthenticationError as e:
-            return False, f"LLM API authentication failed: Invalid API key or base URL"
-        except RateLimitError as e:
-            return False, f"LLM API rate limited (429): {str(e)}"
-        except APIConnectionError as e:
-            return False, f"LLM API connection error: {str(e)}"
-        except APIError as e:
-            return False, f"LLM API error: {str(e)}"
+        except TransportError as e:
+            return False, str(e)
         except Exception as e:
             return False, f"LLM health check failed: {str(e)}"
 
-    def polish_text(self, text: str) -> Tuple[Optional[str], bool, str]:
+    def polish_text(
+        self,
+        text: str,
+        max_tokens: Optional[int] = None,
+        on_delta: Optional[Callable[[Optional[str]], None]] = None,
+        metrics: Optional[CallMetrics] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Optional[str], bool, str]:
         """
         Polish and correct transcribed text using LLM
 
+        Blocking wrapper around polish_text_async().
+
         Args:
             text: Original transcribed text
+            max_tokens: Output token budget for this call (defaults to the configured max_tokens)
+            on_delta: See polish_text_async()
+            metrics: See polish_text_async()
+            deadline: See polish_text_async()
 
         Returns:
             Tuple of (corrected_text, success, error_message)
             - If success=True, corrected_text contains the polished text
             - If success=False, corrected_text=None and error_message explains the failure
         """
+        return self.polish_text_async(text, max_tokens, on_delta, metrics, deadline=deadline).result()
+
+    def polish_text_async(
+        self,
+        text: str,
+        max_tokens: Optional[int] = None,
+        on_delta: Optional[Callable[[Optional[str]], None]] = None,
+        metrics: Optional[CallMetrics] = None,
+        batch: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Future:
+        """
+        Polish text without blocking the caller
+
+        Attempts run on the LLM request pool and retries are rescheduled on a
+        timer, so neither the caller nor a pool thread sleeps during backoff.
+        Cached results resolve immediately. When the circuit breaker is open
+        the future resolves immediately with a failure so the caller can fall
+        back to the raw transcript.
+
+        With a deadline, each request's HTTP timeout is capped at the time
+        left, retries that could not finish in time are dropped, and the LLM
+        is skipped outright when less than min_budget_seconds remain.
+
+        Args:
+            text: Original transcribed text
+            max_tokens: Output token budget for this call, capped at the configured max_tokens
+            on_delta: Called with each streamed text delta; forces a streaming request.
+                Called with None when a failed attempt is retried, meaning the
+                deltas received so far should be discarded.
+            metrics: CallMetrics filled in when the call completes
+            batch: Allow the text to share a batched request with other short texts
+                (only when batching is enabled and no on_delta is given)
+            deadline: time.monotonic() by which the result is needed (None for no limit)
+
+        Returns:
+            Future resolving to (corrected_text, success, error_message)
+        """
+        future = Future()
+
         if not self.is_enabled():
             logger.debug("LLM service is disabled, returning original text")
-            return text, True, ""
+            future.set_result((text, True, ""))
+            return future
 
         if not text or not text.strip():
             logger.debug("Empty text provided, skipping LLM polishing")
-            return text, True, ""
+            future.set_result((text, True, ""))
+            return future
+
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                logger.debug("LLM polish cache hit (length: %d)", len(text))
+                future.set_result((cached, True, ""))
+                return future
+
+        if self._skip_for_deadline(deadline, future):
+            return future
+
+        if batch and on_delta is None and self.batcher is not None and self.batcher.accepts(text):
+            return self.batcher.submit(text, future, metrics or CallMetrics(), deadline)
+
+        budget = self.max_tokens if max_tokens is None else max(1, min(int(max_tokens), self.max_tokens))
+        stream = self.stream or on_delta is not None
+        logger.debug("Starting LLM text polishing (length: %d, max_tokens: %s, stream: %s)", len(text), budget, stream)
+        call = PolishCall(text, future, budget, stream, on_delta, metrics or CallMetrics(), deadline=deadline)
+        self._submit_attempt(call)
+        return future
+
+    def complete_async(self, prompt: str, max_tokens: Optional[int] = None,
+                       metrics: Optional[CallMetrics] = None, deadline: Optional[float] = None) -> Future:
+        """
+        Send a prepared user message with the polish system prompt
 
-        if not OPENAI_SDK_AVAILABLE:
-            logger.warning("OpenAI SDK not available, skipping LLM polishing")
-            return None, False, "OpenAI SDK not available"
+        Goes through the same request pool, retries and circuit breaker as
+        polish_text_async() but bypasses the cache and the batcher; used for
+        batched requests whose reply is parsed by the caller.
 
-        logger.info(f"Starting LLM text polishing (length: {len(text)})")
+        Returns:
+            Future resolving to (reply_text, success, error_message)
+        """
+        future = Future()
+        if not self.is_enabled():
+            future.set_result((None, False, "LLM service unavailable"))
+            return future
+        if self._skip_for_deadline(deadline, future):
+            return future
+
+        budget = self.max_tokens if max_tokens is None else max(1, min(int(max_tokens), self.max_tokens))
+        call = PolishCall(prompt, future, budget, self.stream, None, metrics or CallMetrics(),
+                          prompt=prompt, cacheable=False, deadline=deadline)
+        self._submit_attempt(call)
+        return future
+
+    def deadline_error(self, deadline: Optional[float]) -> Optional[str]:
+        """
+        Check whether a deadline still leaves time for an LLM call
 
-        for attempt in range(self.max_retries):
-            try:
-                logger.debug(f"Sending request to LLM API (attempt {attempt + 1}/{self.max_retries})")
-
-                # Use OpenAI SDK to call LLM
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": self.system_prompt,
-                        },
-                        {
-                            "role": "user",
-                            "content": f"Please polish and correct this text:\n\n{text}",
-                        },
-                    ],
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                )
-
-                # Extract content from response
-                if not response.choices:
-                    error_msg = "LLM API response missing choices"
-                    logger.error(f"{error_msg}")
-                    return None, False, error_msg
-
-                corrected_text = response.choices[0].message.content.strip()
-
-                if not corrected_text:
-                    error_msg = "LLM API returned empty response"
-                    logger.warning(error_msg)
-                    return None, False, error_msg
-
-                logger.info(f"LLM polishing completed successfully (length: {len(corrected_text)})")
-                return corrected_text, True, ""
-
-            except AuthenticationError as e:
-                error_msg = "LLM API authentication failed: Invalid API key or base URL"
-                logger.error(error_msg)
-                return None, False, error_msg
-
-            except RateLimitError as e:
-                error_msg = "LLM API rate limit exceeded (429)"
-                logger.warning(f"{error_msg}, attempt {attempt + 1}/{self.max_retries}")
-                if attempt < self.max_retries - 1:
-                    wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return None, False, error_msg
-
-            except APIConnectionError as e:
-                error_msg = f"LLM API connection error: {str(e)}"
-                logger.warning(f"{error_msg}, attempt {attempt + 1}/{self.max_retries}")
-                if attempt < self.max_retries - 1:
-                    wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return None, False, error_msg
-
-            except APIError as e:
-                error_msg = f"LLM API error: {str(e)}"
-                logger.error(f"{error_msg}, attempt {attempt + 1}/{self.max_retries}")
-                if attempt < self.max_retries - 1:
-                    wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return None, False, error_msg
+        Returns:
+            None if at least min_budget_seconds remain (or there is no deadline),
+            otherwise the error message; the skip is counted in call_stats()
+        """
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining >= self.min_budget:
+            return None
+        with self._call_stats_lock:
+            self._deadline_stats["skipped"] += 1
+        error_msg = f"LLM skipped: {max(0.0, remaining):.2f}s left before the request deadline"
+        logger.info(error_msg)
+        return error_msg
+
+    def _skip_for_deadline(self, deadline: Optional[float], future: Future) -> bool:
+        """Resolve the future with a failure when the deadline leaves too little time"""
+        error_msg = self.deadline_error(deadline)
+        if error_msg is None:
+            return False
+        future.set_result((None, False, error_msg))
+        return True
+
+    def _submit_attempt(self, call: PolishCall):
+        """
+        Start one attempt, or fail fast if the breaker is open
 
+        The request goes to an endpoint chosen by weight. With hedging enabled
+        a duplicate is sent to another endpoint if the first has not answered
+        within its recent p90 latency; the first successful answer wins.
+        """
+        if not self.breaker.allow_request():
+            error_msg = "LLM circuit breaker open, using original text"
+            logger.warning(error_msg)
+            call.future.set_result((None, False, error_msg))
+            return
+
+        call.metrics.attempts += 1
+        if call.attempt > 0 and call.on_delta is not None:
+            try:
+                call.on_delta(None)
             except Exception as e:
-                error_msg = f"LLM API error: {str(e)}"
-                logger.error(f"{error_msg}, attempt {attempt + 1}/{self.max_retries}")
-                if attempt < self.max_retries - 1:
-                    wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return None, False, error_msg
+                logger.warning(f"LLM delta consumer failed: {e}")
+
+        primary = self.endpoints.choose()
+        race = AttemptRace(primary)
+        self._start_request(call, race, primary)
+
+        # Two streams forwarding deltas to the same consumer would interleave
+        if call.on_delta is None:
+            secondary = self.endpoints.hedge_target(primary)
+            if secondary is not None:
+                delay = self.endpoints.hedge_delay(primary)
+                self._scheduler.schedule(delay, lambda: self._start_hedge(call, race, secondary))
+
+    def _start_request(self, call: PolishCall, race: "AttemptRace", endpoint: LLMEndpoint):
+        """Send one request of an attempt on the transport; its completion is handled on the pool"""
+        with race.lock:
+            race.pending += 1
+        metrics = CallMetrics()
+        try:
+            future = self.transport.chat(
+                endpoint,
+                [
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": call.prompt},
+                ],
+                max_tokens=call.max_tokens,
+                temperature=self.temperature,
+                stream=call.stream,
+                timeout=self._request_timeout(call),
+                on_delta=self._delta_handler(call, metrics) if call.stream else None,
+            )
+        except RuntimeError as e:
+            # Transport loop stopped
+            with race.lock:
+                race.pending -= 1
+                if race.finished:
+                    return
+                race.finished = True
+            call.future.set_result((None, False, f"LLM service unavailable: {e}"))
+            return
+        future.add_done_callback(lambda f: self._dispatch(call, race, endpoint, metrics, f))
+
+    def _start_hedge(self, call: PolishCall, race: "AttemptRace", endpoint: LLMEndpoint):
+        with race.lock:
+            if race.finished:
+                return
+            race.hedged = True
+        logger.info(f"LLM endpoint {race.primary.name} slow, hedging request to {endpoint.name}")
+        self.endpoints.record_hedge(endpoint)
+        self._start_request(call, race, endpoint)
+
+    def _dispatch(self, call: PolishCall, race: "AttemptRace", endpoint: LLMEndpoint,
+                  metrics: CallMetrics, future: Future):
+        """Move completion handling (cache writes, callbacks) off the transport loop"""
+        try:
+            self._executor.submit(self._run_request, call, race, endpoint, metrics, future)
+        except RuntimeError:
+            self._run_request(call, race, endpoint, metrics, future)
+
+    def _run_request(self, call: PolishCall, race: "AttemptRace", endpoint: LLMEndpoint,
+                     metrics: CallMetrics, future: Future):
+        """Settle one finished request of an attempt; the first success (or last failure) wins"""
+        try:
+            corrected_text, outcome, error_msg = self._request_outcome(call, endpoint, metrics, future)
+        except Exception as e:
+            corrected_text, outcome, error_msg = None, self.RETRYABLE, f"LLM API error: {str(e)}"
+            logger.error(f"{error_msg}, attempt {call.attempt + 1}/{self.max_retries}")
+
+        finished_at = metrics.finished_at or time.monotonic()
+        self.endpoints.record(
+            endpoint, finished_at - metrics.started_at, outcome in (self.SUCCESS, self.BAD_RESPONSE)
+        )
+
+        with race.lock:
+            race.pending -= 1
+            if race.finished:
+                return  # Lost the race
+            if outcome != self.SUCCESS and race.pending > 0:
+                return  # The other request may still succeed
+            race.finished = True
+
+        if outcome == self.SUCCESS:
+            if endpoint is not race.primary:
+                self.endpoints.record_hedge(endpoint, won=True)
+            call.metrics.first_token_at = metrics.first_token_at
+            call.metrics.finished_at = metrics.finished_at
+            call.metrics.completion_tokens = metrics.completion_tokens
+            call.metrics.streamed = metrics.streamed
+        self._finish_attempt(call, corrected_text, outcome, error_msg)
+
+    def _finish_attempt(self, call: PolishCall, corrected_text: Optional[str], outcome: str, error_msg: str):
+        """Resolve the call or schedule the next attempt"""
+        attempt, future = call.attempt, call.future
+        self.health.record(outcome in (self.SUCCESS, self.BAD_RESPONSE), call.metrics.latency)
+        if outcome == self.SUCCESS:
+            self.breaker.record_success()
+            self._record_call(call.metrics)
+            if self.cache is not None and call.cacheable:
+                self.cache.put(call.text, corrected_text)
+            future.set_result((corrected_text, True, ""))
+            return
+
+        if outcome == self.BAD_RESPONSE:
+            # The endpoint answered, so this is not an endpoint failure
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+        if outcome == self.RETRYABLE and attempt < self.max_retries - 1:
+            wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
+            remaining = call.remaining()
+            if remaining is not None and remaining - wait_time < self.min_budget:
+                with self._call_stats_lock:
+                    self._deadline_stats["retries_cut"] += 1
+                logger.info(f"Not retrying LLM request: {max(0.0, remaining):.2f}s left before the deadline")
+                future.set_result((None, False, f"{error_msg} (no time left to retry)"))
+                return
+            logger.info(f"Scheduling LLM retry in {wait_time} seconds...")
+            call.attempt += 1
+            self._scheduler.schedule(wait_time, lambda: self._submit_attempt(call))
+            return
+
+        future.set_result((None, False, error_msg))
+
+    def _request_timeout(self, call: PolishCall) -> float:
+        """HTTP timeout of one request; it never outlives the call's deadline"""
+        timeout = self.timeout
+        remaining = call.remaining()
+        if remaining is not None and remaining < timeout:
+            timeout = max(0.1, remaining)
+            with self._call_stats_lock:
+                self._deadline_stats["capped_requests"] += 1
+        return timeout
+
+    def _delta_handler(self, call: PolishCall, metrics: CallMetrics) -> Callable[[str], None]:
+        """Streamed delta callback: times the first token and forwards deltas to the caller"""
+        def on_delta(delta: str):
+            if metrics.first_token_at is None:
+                metrics.first_token_at = time.monotonic()
+            metrics.completion_tokens += 1
+            if call.on_delta is not None:
+                try:
+                    call.on_delta(delta)
+                except Exception as e:
+                    logger.warning(f"LLM delta consumer failed: {e}")
+        return on_delta
+
+    def _request_outcome(self, call: PolishCall, endpoint: LLMEndpoint, metrics: CallMetrics,
+                         future: Future) -> Tuple[Optional[str], str, str]:
+        """
+        Classify a finished request
 
-        return None, False, "Max retries exceeded"
+        Returns:
+            Tuple of (corrected_text, outcome, error_message) where outcome is one of
+            SUCCESS, BAD_RESPONSE, RETRYABLE or FATAL
+        """
+        attempt = call.attempt
+        try:
+            completion = future.result()
+        except TransportError as e:
+            error_msg = str(e)
+            if e.fatal:
+                logger.error(error_msg)
+                return None, self.FATAL, error_msg
+            logger.warning(f"{error_msg} ({endpoint.name}), attempt {attempt + 1}/{self.max_retries}")
+            return None, self.RETRYABLE, error_msg
+
+        if completion.text is None:
+            error_msg = "LLM API response missing choices"
+            logger.error(f"{error_msg}")
+            return None, self.BAD_RESPONSE, error_msg
+
+        if call.stream:
+            if completion.completion_tokens:
+                metrics.completion_tokens = completion.completion_tokens
+        else:
+            metrics.first_token_at = completion.finished_at
+            metrics.completion_tokens = completion.completion_tokens
+        metrics.finished_at = completion.finished_at
+        metrics.streamed = call.stream
+
+        corrected_text = completion.text.strip()
+        if not corrected_text:
+            error_msg = "LLM API returned empty response"
+            logger.warning(error_msg)
+            return None, self.BAD_RESPONSE, error_msg
+
+        logger.debug("LLM polishing completed successfully (length: %d)", len(corrected_text))
+        return corrected_text, self.SUCCESS, ""
+
+    def _record_call(self, metrics: CallMetrics):
+        with self._call_stats_lock:
+            self._recent_calls.append((metrics.ttft, metrics.latency, metrics.tokens_per_second))
+            self._call_totals["calls"] += 1
+            self._call_totals["completion_tokens"] += metrics.completion_tokens
+            if metrics.streamed:
+                self._call_totals["streamed_calls"] += 1
+
+    def call_stats(self) -> Dict:
+        """TTFT, latency and throughput of recent successful LLM calls"""
+        with self._call_stats_lock:
+            recent = list(self._recent_calls)
+            stats = dict(self._call_totals)
+            stats["deadline"] = dict(self._deadline_stats)
+        ttfts = [r[0] for r in recent if r[0] is not None]
+        latencies = [r[1] for r in recent if r[1] is not None]
+        rates = [r[2] for r in recent if r[2] is not None]
+        stats["window"] = len(recent)
+        stats["ttft_ms"] = {
+            "p50": round(percentile(ttfts, 50) * 1000, 1),
+            "p90": round(percentile(ttfts, 90) * 1000, 1),
+        }
+        stats["latency_ms"] = {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p90": round(percentile(latencies, 90) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        }
+        stats["avg_tokens_per_second"] = round(sum(rates) / len(rates), 1) if rates else None
+        return stats
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Async LLM Transport
+Sends chat completions from a dedicated asyncio event loop thread, so the
+threads that ask for a completion only wait on a future. All endpoints
+share one keep-alive connection pool (HTTP/2 when the h2 package is
+installed) and a global semaphore bounds the requests in flight.
+
+Backends, in order of preference ("auto"):
+- openai: AsyncOpenAI clients on the shared httpx pool
+- httpx: plain OpenAI-compatible HTTP on the shared pool (no SDK needed)
+- requests: a pooled requests.Session on worker threads (no httpx needed)
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+try:
+    import openai
+    OPENAI_SDK_AVAILABLE = True
+except ImportError:
+    openai = None
+    OPENAI_SDK_AVAILABLE = False
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+AUTH_ERROR = "LLM API authentication failed: Invalid API key or base URL"
+RATE_LIMIT_ERROR = "LLM API rate limit exceeded (429)"
+
+
+class TransportError(Exception):
+    """A failed request; fatal errors (e.g. authentication) are not worth retrying"""
+
+    def __init__(self, message: str, fatal: bool = False):
+        super().__init__(message)
+        self.fatal = fatal
+
+
+class Completion:
+    """Result of one chat completion request"""
+
+    def __init__(self, text: Optional[str], completion_tokens: int, finished_at: float):
+        self.text = text  # None when the response had no choices
+        self.completion_tokens = completion_tokens
+        self.finished_at = finished_at
+
+
+def _status_error(status: int, body: str) -> TransportError:
+    if status in (401, 403):
+        return TransportError(AUTH_ERROR, fatal=True)
+    if status == 429:
+        return TransportError(RATE_LIMIT_ERROR)
+    return TransportError(f"LLM API error: Error code: {status} - {body[:200]}")
+
+
+def _chunk_delta(payload: Dict) -> Optional[str]:
+    choices = payload.get("choices") or []
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content")
+
+
+def _usage_tokens(payload: Dict) -> int:
+    usage = payload.get("usage") or {}
+    return usage.get("completion_tokens") or 0
+
+
+class LLMTransport:
+    """Event loop thread, shared connection pool and in-flight limit for LLM requests"""
+
+    def __init__(self, endpoints: List, config: Dict, max_in_flight: int, timeout: float):
+        """
+        Args:
+            endpoints: LLMEndpoint objects requests will be sent to
+            config: Transport configuration with keys:
+                - backend: "auto", "openai", "httpx" or "requests"
+                - http2: bool, use HTTP/2 when the h2 package is installed
+                - max_connections: int, connections in the shared pool
+                - max_keepalive_connections: int, idle connections kept open
+                - keepalive_expiry: float, seconds an idle connection is kept
+            max_in_flight: Requests allowed in flight at once across all endpoints
+            timeout: Default request timeout in seconds
+        """
+        self.timeout = timeout
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_connections = max(1, int(config.get("max_connections", 20)))
+        self.max_keepalive = max(0, int(config.get("max_keepalive_connections", 10)))
+        self.keepalive_expiry = float(config.get("keepalive_expiry", 30))
+        self.backend = self._choose_backend(config.get("backend", "auto"))
+        self.http2 = bool(config.get("http2", True)) and HTTP2_AVAILABLE and httpx is not None \
+            and self.backend != "requests"
+        self.shared_pool = httpx is not None or self.backend == "requests"
+
+        self._endpoints = list(endpoints)
+        self._sdk_clients = {}
+        self._http = None
+        self._session = None
+        self._blocking_pool = None
+        self._semaphore = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "failures": 0, "in_flight": 0, "waiting": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="llm-transport", daemon=True)
+        self._thread.start()
+        self.run(self._setup()).result()
+        logger.info(
+            f"LLM transport ready - backend: {self.backend}, http2: {self.http2}, "
+            f"shared pool: {self.shared_pool}, max in flight: {self.max_in_flight}"
+        )
+
+    @staticmethod
+    def _choose_backend(requested: str) -> str:
+        available = {
+            "openai": OPENAI_SDK_AVAILABLE,
+            "httpx": httpx is not None,
+            "requests": True,
+        }
+        if requested != "auto":
+            if available.get(requested):
+                return requested
+            logger.warning(f"LLM transport backend {requested!r} is not available, choosing automatically")
+        for backend in ("openai", "httpx", "requests"):
+            if available[backend]:
+                return backend
+        return "requests"
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def run(self, coro) -> Future:
+        """Schedule a coroutine on the transport loop"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if self.backend == "requests":
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=len(self._endpoints) or 1, pool_maxsize=self.max_connections
+            )
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._blocking_pool = ThreadPoolExecutor(
+                max_workers=self.max_in_flight, thread_name_prefix="llm-http"
+            )
+            return
+
+        if httpx is not None:
+            self._http = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+        if self.backend == "openai":
+            for endpoint in self._endpoints:
+                self._sdk_clients[endpoint.name] = self._sdk_client(endpoint)
+
+    def _sdk_client(self, endpoint):
+        kwargs = {
+            "api_key": endpoint.api_key,
+            "base_url": endpoint.api_url,
+            "timeout": self.timeout,
+            "max_retries": 0,  # Retries are scheduled by LLMService
+        }
+        if self._http is None:
+            return openai.AsyncOpenAI(**kwargs)
+        try:
+            return openai.AsyncOpenAI(http_client=self._http, **kwargs)
+        except TypeError as e:
+            # SDK builds that bundle their own HTTP client reject ours
+            if self.shared_pool:
+                logger.warning(f"OpenAI SDK does not accept the shared connection pool ({e}), "
+                               "using its own pool per endpoint")
+            self.shared_pool = False
+            return openai.AsyncOpenAI(**kwargs)
+
+    def chat(
+        self,
+        endpoint,
+        messages: List[Dict],
+        max_tokens: int,
+        temperature: Optional[float] = None,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ) -> Future:
+        """
+        Send one chat completion
+
+        Args:
+            endpoint: LLMEndpoint to send to
+            messages: Chat messages
+            max_tokens: Output token budget
+            temperature: Sampling temperature (omitted when None)
+            stream: Stream the completion; on_delta receives each text delta
+            timeout: Request timeout in seconds (defaults to the transport timeout)
+            on_delta: Called on the transport thread with each streamed delta
+
+        Returns:
+            Future resolving to a Completion, or raising TransportError
+        """
+        body = {"model": endpoint.model, "messages": messages, "max_tokens": max_tokens, "stream": stream}
+        if temperature is not None:
+            body["temperature"] = temperature
+        return self.run(self._chat(endpoint, body, timeout or self.timeout, on_delta))
+
+    async def _chat(self, endpoint, body: Dict, timeout: float, on_delta) -> Completion:
+        with self._stats_lock:
+            self._stats["waiting"] += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            with self._stats_lock:
+                self._stats["waiting"] -= 1
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+        try:
+            if self.backend == "openai":
+                return await self._chat_sdk(endpoint, body, timeout, on_delta)
+            if self.backend == "httpx":
+                return await self._chat_httpx(endpoint, body, timeout, on_delta)
+            return await self._loop.run_in_executor(
+                self._blocking_pool, self._chat_requests, endpoint, body, timeout, on_delta
+            )
+        except TransportError:
+            with self._stats_lock:
+                self._stats["failures"] += 1
+            raise
+        finally:
+            self._semaphore.release()
+            with self._stats_lock:
+                self._stats["in_flight"] -= 1
+
+    async def _chat_sdk(self, endpoint, body: Dict, timeout: float, on_delta) -> Completion:
+        client = self._sdk_clients[endpoint.name]
+        try:
+            response = await client.chat.completions.create(timeout=timeout, **body)
+            if body["stream"]:
+                parts = []
+                tokens = 0
+                async for chunk in response:
+                    usage = getattr(chunk, "usage", None)
+                    if usage is not None and getattr(usage, "completion_tokens", None):
+                        tokens = usage.completion_tokens
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        if on_delta is not None:
+                            on_delta(delta)
+                return Completion("".join(parts), tokens, time.monotonic())
+
+            if not response.choices:
+                return Completion(None, 0, time.monotonic())
+            usage = getattr(response, "usage", None)
+            return Completion(
+                response.choices[0].message.content or "",
+                getattr(usage, "completion_tokens", None) or 0,
+                time.monotonic(),
+            )
+        except openai.AuthenticationError:
+            raise TransportError(AUTH_ERROR, fatal=True)
+        except openai.RateLimitError:
+            raise TransportError(RATE_LIMIT_ERROR)
+        except openai.APIConnectionError as e:
+            raise TransportError(f"LLM API connection error: {str(e)}")
+        except openai.APIError as e:
+            raise TransportError(f"LLM API error: {str(e)}")
+
+    def _url(self, endpoint) -> str:
+        return endpoint.api_url.rstrip("/") + "/chat/completions"
+
+    def _headers(self, endpoint) -> Dict:
+        return {"Authorization": f"Bearer {endpoint.api_key}", "Content-Type": "application/json"}
+
+    async def _chat_httpx(self, endpoint, body: Dict, timeout: float, on_delta) -> Completion:
+        url, headers = self._url(endpoint), self._headers(endpoint)
+        try:
+            if not body["stream"]:
+                response = await self._http.post(url, json=body, headers=headers, timeout=timeout)
+                if response.status_code >= 400:
+                    raise _status_error(response.status_code, response.text)
+                return self._parse_reply(response.json())
+
+            async with self._http.stream("POST", url, json=body, headers=headers, timeout=timeout) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise _status_error(response.status_code, response.text)
+                parts = []
+                tokens = 0
+                async for line in response.aiter_lines():
+                    tokens = self._stream_line(line, parts, on_delta) or tokens
+                return Completion("".join(parts), tokens, time.monotonic())
+        except httpx.HTTPError as e:
+            raise TransportError(f"LLM API connection error: {str(e) or type(e).__name__}")
+        except ValueError as e:
+            raise TransportError(f"LLM API error: invalid response ({e})")
+
+    def _chat_requests(self, endpoint, body: Dict, timeout: float, on_delta) -> Completion:
+        url, headers = self._url(endpoint), self._headers(endpoint)
+        try:
+            with self._session.post(url, json=body, headers=headers, timeout=timeout,
+                                    stream=body["stream"]) as response:
+                if response.status_code >= 400:
+                    raise _status_error(response.status_code, response.text)
+                if not body["stream"]:
+                    return self._parse_reply(response.json())
+                parts = []
+                tokens = 0
+                for line in response.iter_lines(decode_unicode=True):
+                    tokens = self._stream_line(line, parts, on_delta) or tokens
+                return Completion("".join(parts), tokens, time.monotonic())
+        except requests.RequestException as e:
+            raise TransportError(f"LLM API connection error: {str(e)}")
+        except ValueError as e:
+            raise TransportError(f"LLM API error: invalid response ({e})")
+
+    @staticmethod
+    def _parse_reply(payload: Dict) -> Completion:
+        choices = payload.get("choices") or []
+        if not choices:
+            return Completion(None, 0, time.monotonic())
+        text = (choices[0].get("message") or {}).get("content") or ""
+        return Completion(text, _usage_tokens(payload), time.monotonic())
+
+    @staticmethod
+    def _stream_line(line: str, parts: List[str], on_delta) -> int:
+        """Handle one server-sent event line; returns completion tokens if it reports usage"""
+        if not line or not line.startswith("data:"):
+            return 0
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            return 0
+        payload = json.loads(data)
+        delta = _chunk_delta(payload)
+        if delta:
+            parts.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+        return _usage_tokens(payload)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["backend"] = self.backend
+        stats["http2"] = self.http2
+        stats["shared_pool"] = self.shared_pool
+        stats["max_in_flight"] = self.max_in_flight
+        return stats
+
+    def close(self):
+        """Close the connection pool and stop the loop thread"""
+        async def _close():
+            if self._http is not None:
+                await self._http.aclose()
+            if self._session is not None:
+                self._session.close()
+
+        try:
+            self.run(_close()).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Closing LLM transport failed: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._blocking_pool is not None:
+            self._blocking_pool.shutdown(wait=False)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mock OpenAI-compatible LLM Server
+Local stand-in for the chat-completions API used by LLMService, for offline
+benchmarking of the polish pipeline (latency, retries, rate limits)
+
+Usage:
+    python mock_llm_server.py --port 8001 --latency lognormal:-1.2,0.4 \\
+        --tokens-per-second 80 --rate-429 0.05 --rate-5xx 0.02 --seed 42
+
+Then point the server's llm section at it:
+    "api_url": "http://127.0.0.1:8001/v1", "api_key": "mock", "enabled": true
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, Response, jsonify, request
+
+from polish_batcher import BATCH_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Prefix LLMService puts in front of the transcript in the user message
+POLISH_PREFIX = "Please polish and correct this text:\n\n"
+
+# Deterministic "polishing": common homophone mis-recognitions of software terms
+DEFAULT_CORRECTIONS = {
+    "派森": "Python",
+    "吉特": "Git",
+    "杰森": "JSON",
+    "道克": "Docker",
+    "库伯内特斯": "Kubernetes",
+    "瑞迪斯": "Redis",
+    "浦尔瑞奎斯特": "pull request",
+    "提交代马": "提交代码",
+    "运形测试": "运行测试",
+    "接口文当": "接口文档",
+}
+
+_CJK_RE = re.compile(r"[㐀-鿿]")
+_TOKEN_RE = re.compile(r"[㐀-鿿]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_㐀-鿿]")
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count: one per CJK char, word or punctuation mark"""
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into streamable pieces, keeping whitespace attached"""
+    return re.findall(r"\s*(?:[㐀-鿿]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_㐀-鿿])", text)
+
+
+def polish(text: str, corrections: Dict[str, str]) -> str:
+    """Deterministically 'polish' text: apply corrections and fix final punctuation"""
+    result = text.strip()
+    for wrong, right in corrections.items():
+        result = result.replace(wrong, right)
+    if result and result[-1] not in "。！？.!?":
+        result += "。" if _CJK_RE.search(result) else "."
+    return result
+
+
+def build_reply(content: str, corrections: Dict[str, str]) -> str:
+    """Reply to a user message: a JSON array for batched requests, otherwise the polished text"""
+    if content.startswith(BATCH_PREFIX):
+        try:
+            items = json.loads(content[len(BATCH_PREFIX):])
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            return json.dumps([polish(str(item), corrections) for item in items], ensure_ascii=False)
+    return polish(content, corrections)
+
+
+class LatencyDistribution:
+    """
+    Latency sampler parsed from a spec string (seconds):
+        fixed:0.3 | uniform:0.1,0.5 | normal:0.3,0.05 | lognormal:mu,sigma | exponential:mean
+    """
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, spec: str, rng: random.Random):
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        if self.kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        self.spec = spec
+        self.rng = rng
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0] if p else 0.0
+        elif self.kind == "uniform":
+            value = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = self.rng.lognormvariate(p[0], p[1])
+        else:
+            value = self.rng.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+class TokenBucket:
+    """Token bucket used for requests-per-minute and tokens-per-minute limits"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def try_consume(self, amount: float) -> Tuple[bool, float]:
+        """Returns (allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if amount <= self.tokens:
+            self.tokens -= amount
+            return True, 0.0
+        return False, (amount - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class MockLLMState:
+    """Fault/latency configuration and counters, adjustable at runtime"""
+
+    def __init__(self, args):
+        self.lock = threading.Lock()
+        self.rng = random.Random(args.seed)
+        self.corrections = dict(DEFAULT_CORRECTIONS)
+        self.stats = {
+            "requests": 0,
+            "streamed": 0,
+            "succeeded": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self.configure(
+            {
+                "latency": args.latency,
+                "tokens_per_second": args.tokens_per_second,
+                "rate_429": args.rate_429,
+                "rate_5xx": args.rate_5xx,
+                "rpm_limit": args.rpm_limit,
+                "tpm_limit": args.tpm_limit,
+            }
+        )
+
+    def configure(self, options: Dict):
+        with self.lock:
+            if "latency" in options:
+                self.latency = LatencyDistribution(options["latency"], self.rng)
+            if "tokens_per_second" in options:
+                self.tokens_per_second = float(options["tokens_per_second"] or 0)
+            if "rate_429" in options:
+                self.rate_429 = float(options["rate_429"])
+            if "rate_5xx" in options:
+                self.rate_5xx = float(options["rate_5xx"])
+            if "rpm_limit" in options:
+                rpm = options["rpm_limit"]
+                self.rpm_bucket = TokenBucket(rpm) if rpm else None
+            if "tpm_limit" in options:
+                tpm = options["tpm_limit"]
+                self.tpm_bucket = TokenBucket(tpm) if tpm else None
+            if "corrections" in options:
+                self.corrections = dict(options["corrections"])
+
+    def describe(self) -> Dict:
+        with self.lock:
+            return {
+                "latency": self.latency.spec,
+                "tokens_per_second": self.tokens_per_second,
+                "rate_429": self.rate_429,
+                "rate_5xx": self.rate_5xx,
+                "rpm_limit": self.rpm_bucket.capacity if self.rpm_bucket else None,
+                "tpm_limit": self.tpm_bucket.capacity if self.tpm_bucket else None,
+                "stats": dict(self.stats),
+            }
+
+    def admit(self, prompt_tokens: int) -> Optional[Tuple[int, str, float]]:
+        """Decide whether a request fails; returns (status, message, retry_after) or None"""
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.rpm_bucket is not None:
+                allowed, retry_after = self.rpm_bucket.try_consume(1)
+                if not allowed:
+                    self.stats["rate_limited"] += 1
+                    return 429, "Rate limit reached for requests per minute", retry_after
+            if self.tpm_bucket is not None:
+                allowed, retry_after = self.tpm_bucket.try_consume(prompt_tokens)
+                if not allowed:
+                    self.stats["rate_limited"] += 1
+                    return 429, "Rate limit reached for tokens per minute", retry_after
+            roll = self.rng.random()
+            if roll < self.rate_429:
+                self.stats["rate_limited"] += 1
+                return 429, "Injected rate limit", 1.0
+            if roll < self.rate_429 + self.rate_5xx:
+                self.stats["server_errors"] += 1
+                return self.rng.choice((500, 502, 503)), "Injected server error", 0.0
+            return None
+
+    def sample_latency(self) -> float:
+        with self.lock:
+            return self.latency.sample()
+
+    def record_success(self, prompt_tokens: int, completion_tokens: int, streamed: bool):
+        with self.lock:
+            self.stats["succeeded"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            if streamed:
+                self.stats["streamed"] += 1
+
+
+def extract_user_text(messages: List[Dict]) -> str:
+    """Get the transcript out of the last user message"""
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            if content.startswith(POLISH_PREFIX):
+                content = content[len(POLISH_PREFIX):]
+            return content
+    return ""
+
+
+def create_app(state: MockLLMState) -> Flask:
+    app = Flask(__name__)
+
+    def error_response(status: int, message: str, retry_after: float):
+        error_type = "rate_limit_error" if status == 429 else "server_error"
+        response = jsonify({"error": {"message": message, "type": error_type, "code": status}})
+        response.status_code = status
+        if retry_after:
+            response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    @app.route("/v1/models", methods=["GET"])
+    def list_models():
+        return jsonify({"object": "list", "data": [{"id": "mock-polish", "object": "model"}]})
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        payload = request.get_json(force=True, silent=True) or {}
+        messages = payload.get("messages", [])
+        model_name = payload.get("model", "mock-polish")
+        max_tokens = int(payload.get("max_tokens") or 2000)
+        stream = bool(payload.get("stream", False))
+
+        prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages if isinstance(m.get("content"), str))
+        failure = state.admit(prompt_tokens)
+        if failure is not None:
+            # Faults still cost some latency, like a real gateway would
+            time.sleep(min(state.sample_latency(), 0.2))
+            return error_response(*failure)
+
+        with state.lock:
+            corrections = dict(state.corrections)
+        output = build_reply(extract_user_text(messages), corrections)
+        pieces = split_tokens(output)
+        finish_reason = "stop"
+        if len(pieces) > max_tokens:
+            pieces = pieces[:max_tokens]
+            finish_reason = "length"
+        output = "".join(pieces)
+        completion_tokens = len(pieces)
+
+        first_token_delay = state.sample_latency()
+        per_token = 1.0 / state.tokens_per_second if state.tokens_per_second > 0 else 0.0
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not stream:
+            time.sleep(first_token_delay + per_token * completion_tokens)
+            state.record_success(prompt_tokens, completion_tokens, streamed=False)
+            return jsonify(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model_name,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": output},
+                            "finish_reason": finish_reason,
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }
+            )
+
+        def chunk(delta: Dict, reason: Optional[str] = None) -> str:
+            body = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model_name,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+            }
+            return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+        def generate():
+            time.sleep(first_token_delay)
+            yield chunk({"role": "assistant", "content": ""})
+            for piece in pieces:
+                if per_token:
+                    time.sleep(per_token)
+                yield chunk({"content": piece})
+            yield chunk({}, finish_reason)
+            yield "data: [DONE]\n\n"
+            state.record_success(prompt_tokens, completion_tokens, streamed=True)
+
+        return Response(generate(), mimetype="text/event-stream")
+
+    @app.route("/mock/config", methods=["GET", "POST"])
+    def mock_config():
+        """Inspect or change latency/fault injection at runtime"""
+        if request.method == "POST":
+            try:
+                state.configure(request.get_json(force=True) or {})
+            except (ValueError, IndexError, TypeError) as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+        return jsonify(state.describe())
+
+    return app
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1", help="Listen address")
+    parser.add_argument("--port", type=int, default=8001, help="Listen port")
+    parser.add_argument(
+        "--latency",
+        default="fixed:0.3",
+        help="Time-to-first-token distribution: fixed:S | uniform:A,B | normal:MU,SD | "
+        "lognormal:MU,SIGMA | exponential:MEAN (seconds)",
+    )
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=50.0, help="Output token rate (0 = instant)"
+    )
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of an injected 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Probability of an injected 5xx")
+    parser.add_argument("--rpm-limit", type=float, default=0, help="Requests per minute before 429 (0 = unlimited)")
+    parser.add_argument("--tpm-limit", type=float, default=0, help="Prompt tokens per minute before 429 (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    return parser
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = build_arg_parser().parse_args()
+    state = MockLLMState(args)
+    app = create_app(state)
+    logger.info(f"Mock LLM server listening on http://{args.host}:{args.port}/v1 - {state.describe()}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline Stages for the Transcription Server
+Each stage owns a bounded worker pool with its own concurrency limit,
+admission queue and queue-depth / latency metrics. Tasks may carry a cost
+(e.g. seconds of speech) so admission can also bound the queued work.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StageFullError(Exception):
+    """Raised when a stage's workers and queue are all occupied"""
+
+
+class PipelineStage:
+    """Bounded worker pool with queue-depth and latency metrics"""
+
+    def __init__(self, name: str, max_workers: int, queue_size: int, max_queued_cost: float = 0.0):
+        """
+        Args:
+            name: Stage name used in thread names and metrics
+            max_workers: Maximum tasks executing concurrently
+            queue_size: Maximum tasks waiting for a worker; further submits are rejected
+            max_queued_cost: Maximum total cost of waiting tasks (0 for no limit);
+                a task is always admitted when nothing is waiting
+        """
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.queue_size = max(0, int(queue_size))
+        self.max_queued_cost = max(0.0, float(max_queued_cost or 0))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._peak_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_service = 0.0
+        self._queued_cost = 0.0
+        self._active_cost = 0.0
+        self._total_cost = 0.0
+
+    def submit(self, fn: Callable, *args, cost: float = 0.0, **kwargs) -> Future:
+        """
+        Submit a task to the stage
+
+        Args:
+            fn: Task function, called with the remaining arguments
+            cost: Work estimate of the task counted against max_queued_cost
+                (consumed by the stage, not passed to fn)
+
+        Raises:
+            StageFullError: if max_workers + queue_size tasks are already admitted,
+                or the waiting tasks' cost would exceed max_queued_cost
+        """
+        with self._lock:
+            if self._queued + self._active >= self.max_workers + self.queue_size:
+                self._rejected += 1
+                raise StageFullError(
+                    f"{self.name} stage full ({self._active} active, {self._queued} queued)"
+                )
+            if (
+                self.max_queued_cost
+                and self._queued > 0
+                and self._queued_cost + cost > self.max_queued_cost
+            ):
+                self._rejected += 1
+                raise StageFullError(
+                    f"{self.name} stage full ({self._queued_cost:.1f} queued cost, "
+                    f"limit {self.max_queued_cost:.1f})"
+                )
+            self._queued += 1
+            self._queued_cost += cost
+            self._submitted += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+
+        enqueued_at = time.monotonic()
+        return self._executor.submit(self._run, enqueued_at, cost, fn, args, kwargs)
+
+    def _run(self, enqueued_at: float, cost: float, fn: Callable, args, kwargs):
+        started_at = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._queued_cost -= cost
+            self._active_cost += cost
+            self._total_wait += started_at - enqueued_at
+
+        succeeded = False
+        try:
+            result = fn(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._active_cost -= cost
+                self._total_cost += cost
+                self._total_service += time.monotonic() - started_at
+                if succeeded:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._queued
+
+    def active(self) -> int:
+        with self._lock:
+            return self._active
+
+    def is_saturated(self) -> bool:
+        """True when a new submit would be rejected"""
+        with self._lock:
+            return self._queued + self._active >= self.max_workers + self.queue_size
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            finished = self._completed + self._failed
+            started = finished + self._active
+            return {
+                "max_workers": self.max_workers,
+                "queue_size": self.queue_size,
+                "queue_depth": self._queued,
+                "peak_queue_depth": self._peak_queued,
+                "active": self._active,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 1) if started else 0.0,
+                "avg_service_ms": round(self._total_service / finished * 1000, 1) if finished else 0.0,
+                "queued_cost": round(self._queued_cost, 2),
+                "active_cost": round(self._active_cost, 2),
+                "max_queued_cost": self.max_queued_cost,
+                "total_cost": round(self._total_cost, 1),
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
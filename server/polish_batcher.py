@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cross-request LLM Batching
+Collects short texts submitted within a small window and polishes them in a
+single chat completion (a JSON array in, a JSON array out), so the long
+system prompt and the per-request latency / rate-limit cost are paid once
+per batch instead of once per phrase. If the reply cannot be parsed back
+into one result per item, every item falls back to its own request.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from llm_metrics import CallMetrics
+
+logger = logging.getLogger(__name__)
+
+# User message prefix for batched requests; the JSON array of texts follows
+BATCH_PREFIX = (
+    "Polish and correct each item of the following JSON array independently. "
+    "Reply with only a JSON array of the corrected strings, in the same order "
+    "and with the same number of items:\n\n"
+)
+
+
+def build_batch_prompt(texts: List[str]) -> str:
+    return BATCH_PREFIX + json.dumps(texts, ensure_ascii=False)
+
+
+def parse_batch_reply(reply: str, expected: int) -> Optional[List[str]]:
+    """Parse a batched reply; None unless it is a JSON array of `expected` non-empty strings"""
+    if not reply:
+        return None
+    start = reply.find("[")
+    end = reply.rfind("]")
+    if start < 0 or end <= start:
+        return None
+    try:
+        items = json.loads(reply[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(items, list) or len(items) != expected:
+        return None
+    if not all(isinstance(item, str) and item.strip() for item in items):
+        return None
+    return [item.strip() for item in items]
+
+
+class BatchItem:
+    """One text waiting in the batch window"""
+
+    def __init__(self, text: str, future: Future, metrics: CallMetrics, deadline: Optional[float] = None):
+        self.text = text
+        self.future = future
+        self.metrics = metrics
+        self.deadline = deadline
+
+
+class PolishBatcher:
+    """Groups short polish requests from concurrent transcriptions into one LLM call"""
+
+    def __init__(self, llm_service, config: Dict):
+        """
+        Args:
+            llm_service: LLMService that sends the batched and fallback requests
+            config: Batching configuration with keys:
+                - enabled: bool
+                - max_chars: int, only texts up to this length are batched
+                - max_batch: int, a batch is sent as soon as it has this many items
+                - window_ms: float, how long the first item waits for others
+                - tokens_per_char: float, output token budget per input character
+        """
+        self.llm_service = llm_service
+        self.enabled = config.get("enabled", False)
+        self.max_chars = max(1, int(config.get("max_chars", 60)))
+        self.max_batch = max(2, int(config.get("max_batch", 8)))
+        self.window = max(0.0, float(config.get("window_ms", 30))) / 1000.0
+        self.tokens_per_char = float(config.get("tokens_per_char", 1.5))
+
+        self._cond = threading.Condition()
+        self._pending: List[BatchItem] = []
+        self._window_started = None
+        self._stats = {
+            "items": 0,
+            "batches": 0,
+            "single_flushes": 0,
+            "parse_failures": 0,
+            "fallback_items": 0,
+            "batch_failures": 0,
+        }
+
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+            self._thread.start()
+
+    def accepts(self, text: str) -> bool:
+        return self.enabled and len(text) <= self.max_chars
+
+    def submit(self, text: str, future: Future, metrics: CallMetrics,
+               deadline: Optional[float] = None) -> Future:
+        """
+        Queue a text for the next batch; the future resolves to (text, success, error)
+
+        The batched request uses the earliest deadline of its items.
+        """
+        batch = None
+        with self._cond:
+            self._pending.append(BatchItem(text, future, metrics, deadline))
+            self._stats["items"] += 1
+            if len(self._pending) >= self.max_batch:
+                batch = self._take_locked()
+            elif len(self._pending) == 1:
+                self._window_started = time.monotonic()
+                self._cond.notify()
+        if batch:
+            self._send(batch)
+        return future
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        batches = stats["batches"]
+        batched_items = stats["items"] - stats["single_flushes"] - stats["pending"]
+        stats["avg_batch_size"] = round(batched_items / batches, 2) if batches else 0.0
+        stats["llm_calls_saved"] = max(0, batched_items - batches - stats["fallback_items"])
+        return stats
+
+    def _take_locked(self) -> List[BatchItem]:
+        batch = self._pending
+        self._pending = []
+        self._window_started = None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                remaining = self._window_started + self.window - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                batch = self._take_locked()
+            try:
+                self._send(batch)
+            except Exception as e:
+                logger.error(f"LLM batch dispatch failed: {e}", exc_info=True)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_result((None, False, f"LLM batch dispatch failed: {e}"))
+
+    def _send(self, batch: List[BatchItem]):
+        if len(batch) == 1:
+            with self._cond:
+                self._stats["single_flushes"] += 1
+            self._send_single(batch[0])
+            return
+
+        texts = [item.text for item in batch]
+        total_chars = sum(len(t) for t in texts)
+        # Room for the JSON quoting and separators of every item
+        budget = int(math.ceil(total_chars * self.tokens_per_char)) + 8 * len(texts) + 16
+        with self._cond:
+            self._stats["batches"] += 1
+        logger.info(f"Sending batched LLM request ({len(batch)} items, {total_chars} chars)")
+
+        deadlines = [item.deadline for item in batch if item.deadline is not None]
+        batch_metrics = CallMetrics()
+        future = self.llm_service.complete_async(
+            build_batch_prompt(texts), budget, batch_metrics, min(deadlines) if deadlines else None
+        )
+        future.add_done_callback(lambda f: self._on_batch_done(batch, f, batch_metrics))
+
+    def _send_single(self, item: BatchItem):
+        single = self.llm_service.polish_text_async(
+            item.text, metrics=item.metrics, batch=False, deadline=item.deadline
+        )
+        single.add_done_callback(lambda f: item.future.set_result(f.result()))
+
+    def _on_batch_done(self, batch: List[BatchItem], future: Future, batch_metrics: CallMetrics):
+        reply, success, error_msg = future.result()
+        if not success:
+            with self._cond:
+                self._stats["batch_failures"] += 1
+            for item in batch:
+                item.future.set_result((None, False, error_msg))
+            return
+
+        results = parse_batch_reply(reply, len(batch))
+        if results is None:
+            logger.warning(f"Could not parse batched LLM reply ({len(batch)} items), falling back to single requests")
+            with self._cond:
+                self._stats["parse_failures"] += 1
+                self._stats["fallback_items"] += len(batch)
+            for item in batch:
+                self._send_single(item)
+            return
+
+        cache = self.llm_service.cache
+        for item, polished in zip(batch, results):
+            metrics = item.metrics
+            metrics.first_token_at = batch_metrics.first_token_at
+            metrics.finished_at = batch_metrics.finished_at
+            metrics.streamed = batch_metrics.streamed
+            metrics.attempts = batch_metrics.attempts
+            metrics.completion_tokens = int(math.ceil(batch_metrics.completion_tokens / len(batch)))
+            if cache is not None:
+                cache.put(item.text, polished)
+            item.future.set_result((polished, True, ""))
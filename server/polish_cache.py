@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Polish Result Cache
+In-memory LRU in front of an on-disk SQLite tier shared by all worker processes.
+Entries are keyed by normalized input text, model, system prompt hash and
+temperature, so changing the system prompt invalidates them automatically.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Only full stops: "?" and "!" change what the text means ("你去吗？" vs "你去吗。")
+_TRAILING_PUNCT = "。. "
+# Bumped when normalize_text changes, so entries stored under older keys are dropped
+_KEY_VERSION = 2
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache lookup: NFKC, collapsed whitespace, no trailing full stop"""
+    normalized = unicodedata.normalize("NFKC", text or "")
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip()
+    return normalized.rstrip(_TRAILING_PUNCT)
+
+
+class PolishCache:
+    """Two-tier (memory LRU + SQLite) cache of LLM polish results"""
+
+    def __init__(
+        self,
+        model: str,
+        system_prompt: str,
+        temperature: float,
+        memory_entries: int = 1024,
+        sqlite_path: Optional[str] = None,
+        max_entries: int = 50000,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        """
+        Args:
+            model: LLM model name (part of the cache key)
+            system_prompt: System prompt; its hash is part of the cache key
+            temperature: Sampling temperature (part of the cache key)
+            memory_entries: Size of the in-memory LRU front
+            sqlite_path: SQLite database file; None disables the disk tier
+            max_entries: Size cap of the SQLite tier (least recently used evicted first)
+            ttl_seconds: Entry lifetime in both tiers
+        """
+        self.model = model
+        self.temperature = temperature
+        prompt_key = f"{_KEY_VERSION}\x00{system_prompt or ''}"
+        self.prompt_hash = hashlib.sha256(prompt_key.encode("utf-8")).hexdigest()[:16]
+        self.memory_entries = max(0, int(memory_entries))
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+
+        self._memory = OrderedDict()  # key -> (polished_text, created_at)
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._disk_count = 0
+        if sqlite_path:
+            try:
+                self._open_db(sqlite_path)
+            except sqlite3.Error as e:
+                logger.warning(f"Polish cache SQLite tier disabled ({sqlite_path}): {e}")
+                self._db = None
+
+    def _open_db(self, sqlite_path: str):
+        directory = os.path.dirname(sqlite_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(sqlite_path, timeout=5, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS polish_cache (
+                key TEXT PRIMARY KEY,
+                prompt_hash TEXT NOT NULL,
+                polished TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_polish_cache_access ON polish_cache(last_access)")
+        # Entries written under another system prompt can never hit again
+        cursor = self._db.execute("DELETE FROM polish_cache WHERE prompt_hash != ?", (self.prompt_hash,))
+        if cursor.rowcount:
+            logger.info(f"Polish cache: removed {cursor.rowcount} entries from a previous system prompt")
+        self._db.execute("DELETE FROM polish_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM polish_cache").fetchone()[0]
+        logger.info(f"Polish cache SQLite tier ready: {sqlite_path} ({self._disk_count} entries)")
+
+    def make_key(self, text: str) -> str:
+        raw = f"{self.model}\x00{self.prompt_hash}\x00{self.temperature}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[str]:
+        """Look up a polished result; None on miss"""
+        key = self.make_key(text)
+        now = time.time()
+
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                polished, created_at = item
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return polished
+                del self._memory[key]
+
+        if self._db is not None:
+            row = None
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT polished, created_at FROM polish_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] <= self.ttl:
+                        self._db.execute("UPDATE polish_cache SET last_access = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                    elif row is not None:
+                        self._db.execute("DELETE FROM polish_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                        row = None
+            except sqlite3.Error as e:
+                logger.warning(f"Polish cache lookup failed: {e}")
+                row = None
+
+            if row is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                    self._remember_locked(key, row[0], row[1])
+                return row[0]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, text: str, polished: str):
+        """Store a polished result in both tiers"""
+        if not polished:
+            return
+        key = self.make_key(text)
+        now = time.time()
+
+        with self._lock:
+            self._stats["stores"] += 1
+            self._remember_locked(key, polished, now)
+
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                cursor = self._db.execute(
+                    "INSERT OR REPLACE INTO polish_cache (key, prompt_hash, polished, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, self.prompt_hash, polished, now, now),
+                )
+                self._disk_count += cursor.rowcount
+                if self._disk_count > self.max_entries:
+                    self._evict_disk_locked()
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Polish cache store failed: {e}")
+
+    def _remember_locked(self, key: str, polished: str, created_at: float):
+        if self.memory_entries == 0:
+            return
+        self._memory[key] = (polished, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk_locked(self):
+        """Drop expired entries, then least recently used ones down to 90% of the cap"""
+        self._db.execute("DELETE FROM polish_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM polish_cache").fetchone()[0]
+        target = int(self.max_entries * 0.9)
+        if count > target:
+            self._db.execute(
+                "DELETE FROM polish_cache WHERE key IN "
+                "(SELECT key FROM polish_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - target,),
+            )
+            with self._lock:
+                self._stats["evictions"] += count - target
+            count = target
+        self._disk_count = count
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["disk_entries"] = self._disk_count if self._db is not None else None
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
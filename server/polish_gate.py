@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Confidence-gated LLM Polishing
+Uses faster-whisper segment statistics (avg_logprob, no_speech_prob,
+compression_ratio) to decide whether a transcript needs the LLM at all,
+and which segments should be sent when only part of it is uncertain
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Languages written without spaces between segments
+NO_SPACE_LANGUAGES = {"zh", "ja", "ko", "yue", "th", "lo", "my", "bo"}
+
+
+def join_segment_texts(texts: List[str], language: Optional[str]) -> str:
+    """Join segment texts the way the language is written"""
+    separator = "" if (language or "").split("-")[0] in NO_SPACE_LANGUAGES else " "
+    return separator.join(t for t in texts if t).strip()
+
+
+class GateDecision:
+    """Result of gating one transcript"""
+
+    SKIP_DISABLED = "disabled"
+    SKIP_SHORT = "skip_short"
+    SKIP_CONFIDENT = "skip_confident"
+    PARTIAL = "partial"
+    FULL = "full"
+
+    def __init__(self, decision: str, low_runs: Optional[List[Tuple[int, int]]] = None):
+        """
+        Args:
+            decision: One of the decision constants
+            low_runs: For PARTIAL, [start, end) index ranges of contiguous low-confidence segments
+        """
+        self.decision = decision
+        self.low_runs = low_runs or []
+
+    @property
+    def skips_llm(self) -> bool:
+        return self.decision in (self.SKIP_SHORT, self.SKIP_CONFIDENT)
+
+
+class PolishGate:
+    """Decides which transcripts (and segments) are worth an LLM round trip"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: Gating configuration with keys:
+                - enabled: bool
+                - min_chars: int, transcripts shorter than this skip the LLM
+                - min_avg_logprob: float, segments below this are low confidence
+                - max_no_speech_prob: float, segments above this are low confidence
+                - max_compression_ratio: float, segments above this are low confidence
+                - partial: bool, polish only low-confidence segments when some are confident
+                - max_partial_share: float, above this share of low-confidence
+                  characters the whole text is polished in one call instead
+        """
+        self.enabled = config.get("enabled", False)
+        self.min_chars = config.get("min_chars", 6)
+        self.min_avg_logprob = config.get("min_avg_logprob", -0.5)
+        self.max_no_speech_prob = config.get("max_no_speech_prob", 0.5)
+        self.max_compression_ratio = config.get("max_compression_ratio", 2.4)
+        self.partial = config.get("partial", True)
+        self.max_partial_share = config.get("max_partial_share", 0.6)
+
+        self._lock = threading.Lock()
+        self._llm_latency_ewma = None
+        self._stats = {
+            "requests": 0,
+            "skipped_short": 0,
+            "skipped_confident": 0,
+            "partial": 0,
+            "full": 0,
+            "segments_total": 0,
+            "segments_polished": 0,
+            "llm_calls_made": 0,
+            "llm_calls_avoided": 0,
+            "estimated_latency_saved_ms": 0.0,
+        }
+
+    def is_low_confidence(self, segment: Dict) -> bool:
+        """Check one segment's decoder statistics against the thresholds"""
+        avg_logprob = segment.get("avg_logprob")
+        no_speech_prob = segment.get("no_speech_prob")
+        compression_ratio = segment.get("compression_ratio")
+        if avg_logprob is None and no_speech_prob is None and compression_ratio is None:
+            # No statistics available: be conservative
+            return True
+        if avg_logprob is not None and avg_logprob < self.min_avg_logprob:
+            return True
+        if no_speech_prob is not None and no_speech_prob > self.max_no_speech_prob:
+            return True
+        if compression_ratio is not None and compression_ratio > self.max_compression_ratio:
+            return True
+        return False
+
+    def plan(self, segments: List[Dict], text: str) -> GateDecision:
+        """Decide how a transcript should be polished"""
+        if not self.enabled:
+            return GateDecision(GateDecision.SKIP_DISABLED)
+
+        if len(text.strip()) < self.min_chars:
+            return GateDecision(GateDecision.SKIP_SHORT)
+
+        low = [self.is_low_confidence(segment) for segment in segments]
+        if segments and not any(low):
+            return GateDecision(GateDecision.SKIP_CONFIDENT)
+
+        if not self.partial or not segments or all(low):
+            return GateDecision(GateDecision.FULL)
+
+        low_chars = sum(len(s.get("text", "")) for s, is_low in zip(segments, low) if is_low)
+        total_chars = sum(len(s.get("text", "")) for s in segments) or 1
+        if low_chars / total_chars > self.max_partial_share:
+            return GateDecision(GateDecision.FULL)
+
+        runs = []
+        start = None
+        for index, is_low in enumerate(low + [False]):
+            if is_low and start is None:
+                start = index
+            elif not is_low and start is not None:
+                runs.append((start, index))
+                start = None
+        return GateDecision(GateDecision.PARTIAL, runs)
+
+    def record(self, decision: GateDecision, segment_count: int, llm_calls: int = 0,
+               polished_segments: int = 0, llm_latency: Optional[float] = None):
+        """
+        Record a gating outcome
+
+        llm_latency is the wall time spent in LLM calls for FULL/PARTIAL
+        decisions (partial runs are sent in parallel); it feeds the latency
+        estimate used for skipped requests.
+        """
+        if decision.decision == GateDecision.SKIP_DISABLED:
+            return
+
+        with self._lock:
+            stats = self._stats
+            stats["requests"] += 1
+            stats["segments_total"] += segment_count
+            stats["segments_polished"] += polished_segments
+            stats["llm_calls_made"] += llm_calls
+
+            if not decision.skips_llm and llm_latency is not None:
+                if self._llm_latency_ewma is None:
+                    self._llm_latency_ewma = llm_latency
+                else:
+                    self._llm_latency_ewma = 0.8 * self._llm_latency_ewma + 0.2 * llm_latency
+
+            if decision.skips_llm:
+                stats["llm_calls_avoided"] += 1
+                stats["skipped_short" if decision.decision == GateDecision.SKIP_SHORT else "skipped_confident"] += 1
+                if self._llm_latency_ewma is not None:
+                    stats["estimated_latency_saved_ms"] += self._llm_latency_ewma * 1000
+            elif decision.decision == GateDecision.PARTIAL:
+                stats["partial"] += 1
+            else:
+                stats["full"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            ewma = self._llm_latency_ewma
+        requests = stats["requests"]
+        stats["llm_avoided_share"] = round(stats["llm_calls_avoided"] / requests, 3) if requests else 0.0
+        stats["estimated_latency_saved_ms"] = round(stats["estimated_latency_saved_ms"], 1)
+        stats["avg_llm_latency_ms"] = round(ewma * 1000, 1) if ewma is not None else None
+        return stats
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deferred Polish Registry
+Tracks LLM polish jobs whose raw transcript was already returned to the
+client, so the polished text can be fetched later by polish_id
+(long-poll, SSE or callback). Callbacks are only sent to URLs matching a
+configured allowlist, so clients cannot make the server POST to arbitrary
+(internal or metadata) addresses.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class PolishEntry:
+    """State of one deferred polish job"""
+
+    def __init__(self, polish_id: str, request_id: str, original_text: str, callback_url: Optional[str]):
+        self.polish_id = polish_id
+        self.request_id = request_id
+        self.original_text = original_text
+        self.callback_url = callback_url
+        self.created_at = time.monotonic()
+        self.completed_at = None
+        self.status = "pending"
+        self.text = None
+        self.llm_used = False
+        self.llm_error = None
+        self.llm_gate = None
+        self.timings = None
+        self.done = threading.Event()
+        # Streamed LLM output: ("delta", text) events, ("reset", None) when a retry restarts it
+        self.events: List[Tuple[str, Optional[str]]] = []
+        self._changed = threading.Condition()
+
+    def add_delta(self, delta: Optional[str]):
+        """Record a streamed text delta (None discards the deltas so far)"""
+        with self._changed:
+            self.events.append(("delta", delta) if delta is not None else ("reset", None))
+            self._changed.notify_all()
+
+    def wait_events(self, cursor: int, timeout: float) -> Tuple[List[Tuple[str, Optional[str]]], bool]:
+        """
+        Wait for stream events after cursor
+
+        Returns:
+            Tuple of (new_events, done)
+        """
+        with self._changed:
+            if len(self.events) <= cursor and not self.done.is_set():
+                self._changed.wait(timeout)
+            return self.events[cursor:], self.done.is_set()
+
+    def finish(self):
+        with self._changed:
+            self.done.set()
+            self._changed.notify_all()
+
+    def to_dict(self) -> Dict:
+        return {
+            "success": True,
+            "polish_id": self.polish_id,
+            "request_id": self.request_id,
+            "status": self.status,
+            "text": self.text if self.text is not None else self.original_text,
+            "original_text": self.original_text,
+            "llm_used": self.llm_used,
+            "llm_error": self.llm_error,
+            "llm_gate": self.llm_gate,
+            "timings": self.timings,
+        }
+
+
+class PolishRegistry:
+    """In-process registry of deferred polish jobs with TTL eviction"""
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 10000,
+                 callback_allowlist: Optional[Sequence[str]] = None):
+        """
+        Args:
+            ttl: Seconds a job is kept after creation
+            max_entries: Upper bound on tracked jobs; oldest are evicted first
+            callback_allowlist: Hosts ("hooks.example.com") or URL prefixes
+                ("https://hooks.example.com/polish/") callbacks may be sent to;
+                empty disables callbacks
+        """
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.callback_hosts = set()
+        self.callback_prefixes = []
+        for allowed in callback_allowlist or []:
+            if "://" in allowed:
+                prefix = urlsplit(allowed)
+                self.callback_prefixes.append((prefix.scheme.lower(), prefix.netloc.lower(), prefix.path or "/"))
+            elif allowed:
+                self.callback_hosts.add(allowed.lower())
+        self._entries: Dict[str, PolishEntry] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def callbacks_enabled(self) -> bool:
+        return bool(self.callback_hosts or self.callback_prefixes)
+
+    def callback_allowed(self, url: str) -> bool:
+        """Whether a callback URL is an http(s) URL on the allowlist"""
+        try:
+            parts = urlsplit(url)
+            hostname = parts.hostname
+        except ValueError:
+            return False
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not hostname:
+            return False
+        if hostname in self.callback_hosts:
+            return True
+        netloc = parts.netloc.lower()
+        path = parts.path or "/"
+        return any(
+            scheme == prefix_scheme and netloc == prefix_netloc and path.startswith(prefix_path)
+            for prefix_scheme, prefix_netloc, prefix_path in self.callback_prefixes
+        )
+
+    def create(self, request_id: str, original_text: str, callback_url: Optional[str] = None) -> PolishEntry:
+        entry = PolishEntry(uuid.uuid4().hex, request_id, original_text, callback_url)
+        with self._lock:
+            self._evict_locked()
+            self._entries[entry.polish_id] = entry
+        return entry
+
+    def get(self, polish_id: str) -> Optional[PolishEntry]:
+        with self._lock:
+            return self._entries.get(polish_id)
+
+    def complete(self, polish_id: str, text: Optional[str], llm_used: bool, llm_error: Optional[str],
+                 timings: Optional[Dict] = None, llm_gate: Optional[str] = None):
+        """
+        Record the outcome of a job
+
+        The status is "done" when the LLM polished the text, "failed" when an
+        error kept it from doing so, and "skipped" when no LLM call was made
+        (confidence gate or lexicon); text is then the unpolished transcript.
+        """
+        entry = self.get(polish_id)
+        if entry is None:
+            logger.debug("Deferred polish %s expired before completion", polish_id)
+            return None
+        entry.text = text
+        entry.llm_used = llm_used
+        entry.llm_error = llm_error
+        entry.llm_gate = llm_gate
+        entry.timings = timings
+        if llm_used:
+            entry.status = "done"
+        else:
+            entry.status = "failed" if llm_error else "skipped"
+        entry.completed_at = time.monotonic()
+        entry.finish()
+        return entry
+
+    def wait(self, polish_id: str, timeout: float) -> Optional[PolishEntry]:
+        """Block until the job completes or timeout expires; None if unknown"""
+        entry = self.get(polish_id)
+        if entry is not None:
+            entry.done.wait(max(0.0, timeout))
+        return entry
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = sum(1 for e in self._entries.values() if not e.done.is_set())
+            return {"tracked": len(self._entries), "pending": pending, "ttl_seconds": self.ttl}
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        expired = [pid for pid, e in self._entries.items() if now - e.created_at > self.ttl]
+        for pid in expired:
+            del self._entries[pid]
+        overflow = len(self._entries) - self.max_entries + 1
+        if overflow > 0:
+            for pid in list(self._entries)[:overflow]:
+                del self._entries[pid]
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asynchronous Request Logging
+Log records from the transcription threads are put on a bounded queue and
+written by one dedicated thread, so file and console I/O (and the handler
+locks) stay off the request hot path; when the queue is full records are
+dropped and counted instead of blocking. Each request is logged as one
+summary line, optionally as a JSON object, and transcripts are only
+included for a sampled, rate-limited share of requests.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+summary_logger = logging.getLogger("request_summary")
+
+# Standard LogRecord attributes; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed through `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLog:
+    """Root logger setup and the per-request summary line"""
+
+    def __init__(self):
+        self.format = "text"
+        self.handler: Optional[DroppingQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+        self.transcript_sample_rate = 0.0
+        self.transcripts_per_minute = 0.0
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"summaries": 0, "transcripts_logged": 0, "transcripts_suppressed": 0}
+
+    def configure(self, config: Dict, handlers: List[logging.Handler], level: str = "INFO"):
+        """
+        Route the root logger through a queue (or directly to handlers)
+
+        Args:
+            config: Logging configuration with keys:
+                - async: bool, write records from a dedicated thread
+                - queue_size: int, records buffered for that thread; more are dropped
+                - format: "text" or "json" (one JSON object per line)
+                - transcript_sample_rate: float in [0, 1], share of requests whose
+                  transcript is included in the summary line
+                - transcripts_per_minute: float, at most this many transcripts are logged
+            handlers: File/console handlers that finally write the records
+            level: Root log level
+        """
+        root_logger = logging.getLogger()
+        previous = list(self.listener.handlers) if self.listener is not None else list(root_logger.handlers)
+        self.stop()
+        for handler in previous:
+            handler.close()
+
+        self.format = config.get("format", "text")
+        if self.format == "json":
+            for handler in handlers:
+                handler.setFormatter(JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S"))
+        self.transcript_sample_rate = min(1.0, max(0.0, float(config.get("transcript_sample_rate", 0.1))))
+        self.transcripts_per_minute = max(0.0, float(config.get("transcripts_per_minute", 30)))
+        self._tokens = self.transcripts_per_minute
+
+        root_logger.setLevel(level)
+        root_logger.handlers.clear()
+        self.handler = None
+        if config.get("async", True):
+            self.handler = DroppingQueueHandler(queue.Queue(max(1, int(config.get("queue_size", 10000)))))
+            self.listener = QueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            root_logger.addHandler(self.handler)
+        else:
+            for handler in handlers:
+                root_logger.addHandler(handler)
+
+    def stop(self):
+        """Flush the queue and stop the writer thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _take_transcript(self) -> bool:
+        """Whether this request's transcript is logged (sampled, then rate-limited)"""
+        if random.random() >= self.transcript_sample_rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.transcripts_per_minute,
+                self._tokens + (now - self._refilled) * self.transcripts_per_minute / 60,
+            )
+            self._refilled = now
+            if self._tokens < 1:
+                self._stats["transcripts_suppressed"] += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def summary(self, result: Dict):
+        """Log one line summarizing a finished request"""
+        if not summary_logger.isEnabledFor(logging.INFO):
+            return
+        fields = {
+            "request_id": result.get("request_id"),
+            "success": result.get("success"),
+            "audio_s": round(result.get("duration") or 0.0, 2),
+            "language": result.get("language"),
+            "segments": len(result.get("segments") or []),
+            "chars": len(result.get("text") or ""),
+            "decode_profile": result.get("decode_profile"),
+            "llm_used": result.get("llm_used"),
+            "llm_gate": result.get("llm_gate"),
+            "processing_ms": round((result.get("processing_time") or 0.0) * 1000, 1),
+            "timings": dict(result.get("timings", {})),
+        }
+        for key in ("error", "llm_error", "text_status"):
+            if result.get(key):
+                fields[key] = result[key]
+        if "session" in result:
+            fields["session_id"] = result["session"].get("session_id")
+        if result.get("text") and self._take_transcript():
+            fields["text"] = result["text"]
+            if result.get("original_text") not in (None, result["text"]):
+                fields["original_text"] = result["original_text"]
+            with self._lock:
+                self._stats["transcripts_logged"] += 1
+        with self._lock:
+            self._stats["summaries"] += 1
+
+        if self.format == "json":
+            summary_logger.info("request finished", extra=fields)
+        else:
+            summary_logger.info(f"Request finished: {json.dumps(fields, ensure_ascii=False, default=str)}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["format"] = self.format
+        stats["async"] = self.listener is not None
+        if self.handler is not None:
+            stats["queued"] = self.handler.queue.qsize()
+            stats["dropped"] = self.handler.dropped
+        return stats
+
+
+request_log = RequestLog()
+atexit.register(request_log.stop)
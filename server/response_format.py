@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Response Serialization
+Transcription results are serialized with orjson when it is installed
+(NumPy scalars and arrays included) and the standard json module otherwise.
+Callers can ask for a subset of the top-level result fields (fields= or the
+X-Response-Fields header), so a live chunk that only reads the text gets a
+few hundred bytes instead of every segment. The time spent serializing is
+added to the result's timings.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Set, Union
+
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Always returned, so callers can tell success from failure whatever they select
+REQUIRED_FIELDS = ("success", "error", "request_id")
+
+
+def _default(value):
+    """NumPy values for the standard json module (orjson handles them natively)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def parse_fields(fields: Optional[Union[str, list]]) -> Optional[Set[str]]:
+    """Requested top-level fields from "a,b,c" or a list; None selects everything"""
+    if not fields:
+        return None
+    names = fields.split(",") if isinstance(fields, str) else fields
+    selected = {str(name).strip() for name in names if str(name).strip()}
+    return selected or None
+
+
+class ResponseEncoder:
+    """JSON responses with optional field selection and serialization timing"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: Response configuration with keys:
+                - serializer: "auto" (orjson when installed), "orjson" or "json"
+        """
+        serializer = config.get("serializer", "auto")
+        if serializer == "orjson" and not ORJSON_AVAILABLE:
+            logger.warning("orjson is not installed, responses use the json module")
+        self.serializer = "orjson" if serializer in ("auto", "orjson") and ORJSON_AVAILABLE else "json"
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "responses": 0,
+            "selected_responses": 0,
+            "bytes": 0,
+            "serialize_seconds": 0.0,
+        }
+
+    def dumps(self, value) -> bytes:
+        if self.serializer == "orjson":
+            return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, ensure_ascii=False, default=_default).encode("utf-8")
+
+    def encode(self, result: Dict, fields: Optional[Union[str, list]] = None) -> bytes:
+        """
+        Serialize a result
+
+        Args:
+            result: Result dict; its timings get serialize_ms (also when they are not selected)
+            fields: Top-level fields to return (comma-separated or list), None for all
+        """
+        selected = parse_fields(fields)
+        if selected is not None:
+            body = {key: value for key, value in result.items() if key in selected or key in REQUIRED_FIELDS}
+        else:
+            body = dict(result)
+
+        started = time.perf_counter()
+        body.pop("timings", None)
+        data = self.dumps(body)
+        elapsed = time.perf_counter() - started
+        timings = result.get("timings")
+        if timings is not None:
+            timings["serialize_ms"] = round(elapsed * 1000, 3)
+            if selected is None or "timings" in selected:
+                # Timings are serialized last so they can include the time spent on the rest
+                separator = b"," if len(data) > 2 else b""
+                data = data[:-1] + separator + b'"timings":' + self.dumps(timings) + b"}"
+
+        with self._lock:
+            stats = self._stats
+            stats["responses"] += 1
+            stats["bytes"] += len(data)
+            stats["serialize_seconds"] += elapsed
+            if selected is not None:
+                stats["selected_responses"] += 1
+        return data
+
+    def response(self, result: Dict, fields: Optional[Union[str, list]] = None, status: int = 200) -> Response:
+        """JSON response for a result (see encode)"""
+        return Response(self.encode(result, fields), status=status, mimetype="application/json")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        responses = stats["responses"]
+        serialize_seconds = stats.pop("serialize_seconds")
+        stats["serializer"] = self.serializer
+        stats["avg_bytes"] = round(stats.pop("bytes") / responses) if responses else 0
+        stats["avg_serialize_ms"] = round(serialize_seconds / responses * 1000, 3) if responses else 0.0
+        return stats
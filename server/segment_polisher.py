@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segment-level LLM Polishing
+Groups Whisper segments into sentence-sized chunks while the decoder is
+still producing them and sends each chunk to the LLM right away, so
+polishing overlaps decoding instead of starting after the last segment.
+Chunks are polished with bounded parallelism and stitched back in order.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from llm_service import CallMetrics
+from polish_gate import GateDecision, join_segment_texts
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = "。！？.!?…"
+
+
+class SegmentPolisher:
+    """Configuration, token budgeting and metrics shared by chunked polish jobs"""
+
+    def __init__(self, llm_service, config: Dict, gate=None):
+        """
+        Args:
+            llm_service: LLMService used for the chunk requests
+            config: Chunking configuration with keys:
+                - enabled: bool
+                - min_chars: int, a chunk may close at a sentence end once it has this many characters
+                - max_chars: int, a chunk is closed once it reaches this many characters
+                - max_segments: int, a chunk is closed once it has this many segments
+                - max_parallel: int, in-flight chunk requests per transcript
+                - tokens_per_char: float, output token budget per input character
+                - token_margin: int, extra output tokens added to every chunk budget
+            gate: Optional PolishGate applied to each chunk
+        """
+        self.llm_service = llm_service
+        self.gate = gate
+        self.enabled = config.get("enabled", False)
+        self.min_chars = max(1, int(config.get("min_chars", 40)))
+        self.max_chars = max(self.min_chars, int(config.get("max_chars", 200)))
+        self.max_segments = max(1, int(config.get("max_segments", 8)))
+        self.max_parallel = max(1, int(config.get("max_parallel", 3)))
+        self.tokens_per_char = float(config.get("tokens_per_char", 1.5))
+        self.token_margin = max(0, int(config.get("token_margin", 32)))
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "chunks": 0,
+            "chunks_polished": 0,
+            "chunks_skipped": 0,
+            "chunks_failed": 0,
+            "llm_ms_overlapped": 0.0,
+            "tail_ms_total": 0.0,
+        }
+
+    def token_budget(self, text: str) -> int:
+        """Output token budget for a chunk, sized from its input length"""
+        return int(math.ceil(len(text) * self.tokens_per_char)) + self.token_margin
+
+    def start(self, language: Optional[str], deadline: Optional[float] = None) -> "ChunkedPolishJob":
+        return ChunkedPolishJob(self, language, deadline)
+
+    def record(self, job: "ChunkedPolishJob"):
+        with self._lock:
+            stats = self._stats
+            stats["requests"] += 1
+            stats["chunks"] += len(job.chunks)
+            stats["chunks_polished"] += job.polished_count
+            stats["chunks_skipped"] += job.skipped_count
+            stats["chunks_failed"] += job.failed_count
+            stats["llm_ms_overlapped"] += job.overlapped_ms
+            stats["tail_ms_total"] += job.tail_ms
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        stats["llm_ms_overlapped"] = round(stats["llm_ms_overlapped"], 1)
+        stats["avg_tail_ms"] = round(stats.pop("tail_ms_total") / requests, 1) if requests else 0.0
+        return stats
+
+
+class PolishChunk:
+    """One group of consecutive segments polished in a single request"""
+
+    def __init__(self, start: int, end: int, text: str):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.decision = None
+        self.polished = None
+        self.error = None
+        self.submitted_at = None
+        self.finished_at = None
+
+
+class ChunkedPolishJob:
+    """
+    Polishing of one transcript, fed segment by segment during decoding
+
+    add_segment() is called from the transcription thread for every decoded
+    segment and close() after the last one; wait() blocks (in the LLM stage)
+    until every chunk is polished and returns the stitched text.
+    """
+
+    def __init__(self, polisher: SegmentPolisher, language: Optional[str],
+                 deadline: Optional[float] = None):
+        self.polisher = polisher
+        self.language = language
+        self.deadline = deadline
+        self.segments: List[Dict] = []
+        self.chunks: List[PolishChunk] = []
+        self.call_metrics: List[CallMetrics] = []
+        self.polished_count = 0
+        self.skipped_count = 0
+        self.failed_count = 0
+        self.overlapped_ms = 0.0
+        self.tail_ms = 0.0
+
+        self._chunk_start = 0
+        self._chunk_chars = 0
+        self._closed = False
+        self._decoded_at = None
+        self._lock = threading.Lock()
+        self._waiting = deque()
+        self._in_flight = 0
+        self._done = threading.Event()
+
+    def add_segment(self, segment: Dict):
+        """Add a decoded segment; closes the current chunk at a sentence end or size limit"""
+        self.segments.append(segment)
+        text = segment.get("text", "")
+        self._chunk_chars += len(text)
+
+        count = len(self.segments) - self._chunk_start
+        at_sentence_end = text.endswith(tuple(SENTENCE_END)) and self._chunk_chars >= self.polisher.min_chars
+        if at_sentence_end or self._chunk_chars >= self.polisher.max_chars or count >= self.polisher.max_segments:
+            self._close_chunk()
+
+    def close(self):
+        """Mark decoding finished and send the remaining segments"""
+        self._close_chunk()
+        with self._lock:
+            self._closed = True
+            self._decoded_at = time.monotonic()
+            finished = self._in_flight == 0 and not self._waiting
+        if finished:
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Tuple[Optional[str], bool, str]:
+        """
+        Wait for all chunks and stitch the result in segment order
+
+        Returns:
+            Tuple of (stitched_text, success, error_message); success is True
+            when at least one chunk was polished
+        """
+        if not self._done.wait(timeout):
+            return None, False, "Chunked LLM polishing timed out"
+
+        pieces = []
+        errors = []
+        last_finished = self._decoded_at
+        for chunk in self.chunks:
+            if chunk.polished:
+                pieces.append(chunk.polished)
+            else:
+                pieces.append(chunk.text)
+                if chunk.error:
+                    errors.append(chunk.error)
+            if chunk.submitted_at is not None:
+                overlap_end = min(chunk.finished_at, self._decoded_at)
+                self.overlapped_ms += max(0.0, overlap_end - chunk.submitted_at) * 1000
+                last_finished = max(last_finished, chunk.finished_at)
+        self.tail_ms = max(0.0, last_finished - self._decoded_at) * 1000
+        self.polisher.record(self)
+
+        if self.polished_count:
+            return join_segment_texts(pieces, self.language), True, ""
+        return None, False, "; ".join(errors) or "LLM polishing failed"
+
+    @property
+    def skipped_llm(self) -> bool:
+        """True when the gate skipped every chunk"""
+        return bool(self.chunks) and self.skipped_count == len(self.chunks)
+
+    def gate_decision(self) -> GateDecision:
+        """Transcript-level gate decision summarizing the chunk decisions"""
+        if self.polisher.gate is None or not self.polisher.gate.enabled:
+            return GateDecision(GateDecision.SKIP_DISABLED)
+        if self.skipped_llm:
+            short = all(c.decision == GateDecision.SKIP_SHORT for c in self.chunks)
+            return GateDecision(GateDecision.SKIP_SHORT if short else GateDecision.SKIP_CONFIDENT)
+        if self.skipped_count:
+            return GateDecision(GateDecision.PARTIAL)
+        return GateDecision(GateDecision.FULL)
+
+    def summary(self) -> Dict:
+        return {
+            "chunks": len(self.chunks),
+            "polished": self.polished_count,
+            "skipped": self.skipped_count,
+            "failed": self.failed_count,
+            "overlapped_ms": round(self.overlapped_ms, 1),
+            "tail_ms": round(self.tail_ms, 1),
+        }
+
+    def _close_chunk(self):
+        end = len(self.segments)
+        if end == self._chunk_start:
+            return
+        texts = [s.get("text", "") for s in self.segments[self._chunk_start:end]]
+        chunk = PolishChunk(self._chunk_start, end, join_segment_texts(texts, self.language))
+        self.chunks.append(chunk)
+        self._chunk_start = end
+        self._chunk_chars = 0
+
+        gate = self.polisher.gate
+        if gate is not None and gate.enabled:
+            chunk.decision = gate.plan(self.segments[chunk.start:chunk.end], chunk.text).decision
+        if not chunk.text or chunk.decision in (GateDecision.SKIP_SHORT, GateDecision.SKIP_CONFIDENT):
+            self.skipped_count += 1
+            return
+
+        with self._lock:
+            self._waiting.append(chunk)
+        self._pump()
+
+    def _pump(self):
+        """Send waiting chunks while fewer than max_parallel are in flight"""
+        while True:
+            with self._lock:
+                if not self._waiting or self._in_flight >= self.polisher.max_parallel:
+                    return
+                chunk = self._waiting.popleft()
+                self._in_flight += 1
+            chunk.submitted_at = time.monotonic()
+            metrics = CallMetrics()
+            self.call_metrics.append(metrics)
+            future = self.polisher.llm_service.polish_text_async(
+                chunk.text, self.polisher.token_budget(chunk.text), metrics=metrics, deadline=self.deadline
+            )
+            future.add_done_callback(lambda f, c=chunk: self._on_chunk_done(c, f))
+
+    def _on_chunk_done(self, chunk: PolishChunk, future):
+        chunk.finished_at = time.monotonic()
+        try:
+            polished, success, error_msg = future.result()
+        except Exception as e:
+            polished, success, error_msg = None, False, f"LLM polishing error: {e}"
+
+        with self._lock:
+            if success and polished:
+                chunk.polished = polished
+                self.polished_count += 1
+            else:
+                chunk.error = error_msg
+                self.failed_count += 1
+            self._in_flight -= 1
+        self._pump()
+
+        with self._lock:
+            finished = self._closed and self._in_flight == 0 and not self._waiting
+        if finished:
+            self._done.set()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VAD Pre-pass
+Finds speech in an uploaded clip before it is queued for a model slot,
+keeps only the speech regions (plus padding) and maps timestamps of the
+trimmed audio back to the original clip. Fully silent clips never reach
+the model. Uses faster-whisper's Silero VAD when it is available and a
+frame-energy detector otherwise. Long clips can also be split at silence
+into chunks that are decoded in parallel.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    SILERO_AVAILABLE = True
+except ImportError:
+    SILERO_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+class TrimResult:
+    """Speech regions of one clip and the trimmed audio"""
+
+    def __init__(self, audio: np.ndarray, regions: List[Tuple[int, int]], total_samples: int, elapsed: float,
+                 trimmed: bool = True):
+        """
+        Args:
+            audio: Concatenated speech regions
+            regions: [start, end) sample ranges of the original clip that were kept
+            total_samples: Length of the original clip
+            elapsed: Seconds spent detecting speech
+            trimmed: False when the regions are contiguous and silence was kept
+                (the model should still run its own VAD)
+        """
+        self.audio = audio
+        self.regions = regions
+        self.trimmed = trimmed
+        self.features = None  # precomputed log-mel of audio (live sessions), passed to the model
+        self.total_seconds = total_samples / SAMPLE_RATE
+        self.speech_seconds = sum(end - start for start, end in regions) / SAMPLE_RATE
+        self.elapsed = elapsed
+
+    @property
+    def silent(self) -> bool:
+        return not self.regions
+
+    def restore_time(self, seconds: float) -> float:
+        """Map a time in the trimmed audio back to the original clip"""
+        offset = seconds * SAMPLE_RATE
+        for start, end in self.regions:
+            length = end - start
+            if offset <= length:
+                return (start + offset) / SAMPLE_RATE
+            offset -= length
+        return self.total_seconds if not self.regions else self.regions[-1][1] / SAMPLE_RATE
+
+    def shifted(self, offset: int) -> "TrimResult":
+        """The same audio with its regions moved by offset samples (e.g. from window to session time)"""
+        total_samples = int(round(self.total_seconds * SAMPLE_RATE)) + offset
+        regions = [(start + offset, end + offset) for start, end in self.regions]
+        return TrimResult(self.audio, regions, total_samples, self.elapsed, trimmed=self.trimmed)
+
+    def summary(self) -> Dict:
+        return {
+            "total_seconds": round(self.total_seconds, 2),
+            "speech_seconds": round(self.speech_seconds, 2),
+            "speech_ratio": round(self.speech_seconds / self.total_seconds, 3) if self.total_seconds else 0.0,
+            "regions": len(self.regions),
+            "vad_ms": round(self.elapsed * 1000, 1),
+        }
+
+
+class SpeechTrimmer:
+    """Detects speech and trims silence ahead of the transcription stage"""
+
+    def __init__(self, config: Dict):
+        """
+        Args:
+            config: VAD configuration with keys:
+                - enabled: bool
+                - backend: "auto", "silero" (faster-whisper's VAD) or "energy"
+                - threshold: float, Silero speech probability threshold
+                - energy_threshold_db: float, frame level (dBFS) counted as speech by the energy detector
+                - min_speech_duration_ms: int, shorter speech bursts are dropped
+                - min_silence_duration_ms: int, shorter pauses do not split speech regions
+                - speech_pad_ms: int, padding kept around each speech region
+                - min_audio_seconds: float, shorter clips are passed through untouched
+        """
+        self.enabled = config.get("enabled", False)
+        backend = config.get("backend", "auto")
+        if backend == "silero" and not SILERO_AVAILABLE:
+            logger.warning("faster-whisper VAD not available, using the energy detector")
+        self.backend = "silero" if backend in ("auto", "silero") and SILERO_AVAILABLE else "energy"
+        self.threshold = float(config.get("threshold", 0.5))
+        self.energy_threshold_db = float(config.get("energy_threshold_db", -45))
+        self.min_speech_ms = int(config.get("min_speech_duration_ms", 250))
+        self.min_silence_ms = int(config.get("min_silence_duration_ms", 500))
+        self.speech_pad_ms = int(config.get("speech_pad_ms", 200))
+        self.min_audio_seconds = float(config.get("min_audio_seconds", 1.0))
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "silent_requests": 0,
+            "passthrough_requests": 0,
+            "audio_seconds": 0.0,
+            "speech_seconds": 0.0,
+            "vad_seconds": 0.0,
+        }
+
+    def trim(self, audio: np.ndarray) -> Optional[TrimResult]:
+        """
+        Detect speech and keep only the speech regions
+
+        Returns:
+            TrimResult, or None when the clip is too short to be worth trimming
+        """
+        if len(audio) < self.min_audio_seconds * SAMPLE_RATE:
+            with self._lock:
+                self._stats["passthrough_requests"] += 1
+            return None
+
+        started = time.perf_counter()
+        regions = self.detect(audio)
+        if regions:
+            trimmed = np.concatenate([audio[start:end] for start, end in regions])
+        else:
+            trimmed = audio[:0]
+        result = TrimResult(trimmed, regions, len(audio), time.perf_counter() - started)
+
+        with self._lock:
+            stats = self._stats
+            stats["requests"] += 1
+            stats["audio_seconds"] += result.total_seconds
+            stats["speech_seconds"] += result.speech_seconds
+            stats["vad_seconds"] += result.elapsed
+            if result.silent:
+                stats["silent_requests"] += 1
+        return result
+
+    def detect(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """Padded speech regions as [start, end) sample ranges"""
+        if self.backend == "silero":
+            regions = self._silero_regions(audio)
+        else:
+            regions = self._energy_regions(audio)
+        return self._pad_and_merge(regions, len(audio))
+
+    def split(self, audio: np.ndarray, trim: Optional[TrimResult], chunk_seconds: float) -> List[TrimResult]:
+        """
+        Split a clip at silence into chunks of at least chunk_seconds of audio
+        (the last one may be shorter)
+
+        With a trim result the chunks hold its speech regions; without one the
+        clip is cut at the middle of its pauses and silence is kept. Speech
+        regions longer than 1.5x chunk_seconds are cut at their quietest frame.
+        Timestamps of every chunk map back to the original clip.
+        """
+        started = time.perf_counter()
+        if trim is not None:
+            regions = list(trim.regions)
+        else:
+            detected = self.detect(audio)
+            cuts = [(end + next_start) // 2 for (_, end), (next_start, _) in zip(detected, detected[1:])]
+            bounds = [0] + cuts + [len(audio)]
+            regions = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+        target = int(chunk_seconds * SAMPLE_RATE)
+        groups = []
+        current = []
+        current_length = 0
+        for start, end in regions:
+            while end - start > target * 1.5:
+                cut = self._quietest_sample(audio, start + target * 3 // 4, start + target)
+                if current:
+                    groups.append(current)
+                    current, current_length = [], 0
+                groups.append([(start, cut)])
+                start = cut
+            current.append((start, end))
+            current_length += end - start
+            if current_length >= target:
+                groups.append(current)
+                current, current_length = [], 0
+        if current:
+            # A short remainder joins the previous chunk rather than costing a slot of its own
+            if groups and current_length < target // 2:
+                groups[-1].extend(current)
+            else:
+                groups.append(current)
+
+        elapsed = (time.perf_counter() - started) / max(1, len(groups))
+        return [
+            TrimResult(
+                np.concatenate([audio[start:end] for start, end in group]),
+                group,
+                len(audio),
+                elapsed,
+                trimmed=trim is not None and trim.trimmed,
+            )
+            for group in groups
+        ]
+
+    @staticmethod
+    def _quietest_sample(audio: np.ndarray, low: int, high: int) -> int:
+        """Start of the lowest-energy 30ms frame in [low, high)"""
+        frame = int(SAMPLE_RATE * 0.03)
+        count = (high - low) // frame
+        if count <= 0:
+            return high
+        frames = audio[low:low + count * frame].astype(np.float32).reshape(count, frame)
+        return low + int(np.argmin(np.mean(frames * frames, axis=1))) * frame
+
+    def _silero_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        # Padding and merging are done here so both detectors behave the same
+        options = VadOptions(
+            threshold=self.threshold,
+            min_speech_duration_ms=self.min_speech_ms,
+            min_silence_duration_ms=self.min_silence_ms,
+            speech_pad_ms=0,
+        )
+        return [(ts["start"], ts["end"]) for ts in get_speech_timestamps(audio, options)]
+
+    def _energy_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """Speech regions from 30ms frame RMS levels"""
+        frame = int(SAMPLE_RATE * 0.03)
+        count = len(audio) // frame
+        if count == 0:
+            return []
+        frames = audio[:count * frame].astype(np.float32).reshape(count, frame)
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        voiced = 20 * np.log10(rms) > self.energy_threshold_db
+
+        # Edges of voiced runs
+        padded = np.concatenate(([False], voiced, [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        regions = [(start * frame, end * frame) for start, end in zip(edges[::2], edges[1::2])]
+
+        # Bridge short pauses, then drop short bursts
+        min_silence = self.min_silence_ms * SAMPLE_RATE // 1000
+        bridged = []
+        for start, end in regions:
+            if bridged and start - bridged[-1][1] < min_silence:
+                bridged[-1] = (bridged[-1][0], end)
+            else:
+                bridged.append((start, end))
+        min_speech = self.min_speech_ms * SAMPLE_RATE // 1000
+        return [(start, end) for start, end in bridged if end - start >= min_speech]
+
+    def _pad_and_merge(self, regions: List[Tuple[int, int]], length: int) -> List[Tuple[int, int]]:
+        pad = self.speech_pad_ms * SAMPLE_RATE // 1000
+        merged = []
+        for start, end in regions:
+            start, end = max(0, start - pad), min(length, end + pad)
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        audio_seconds = stats["audio_seconds"]
+        stats["backend"] = self.backend
+        stats["speech_ratio"] = round(stats["speech_seconds"] / audio_seconds, 3) if audio_seconds else 0.0
+        stats["avg_vad_ms"] = round(stats.pop("vad_seconds") / requests * 1000, 1) if requests else 0.0
+        stats["audio_seconds"] = round(audio_seconds, 1)
+        stats["speech_seconds"] = round(stats["speech_seconds"], 1)
+        return stats
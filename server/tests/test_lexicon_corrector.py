@@ -0,0 +1,34 @@
+import pytest
+
+from lexicon_corrector import LexiconCorrector
+
+
+def corrector(**config) -> LexiconCorrector:
+    return LexiconCorrector({"enabled": True, "path": "config/lexicon.json", **config})
+
+
+@pytest.mark.parametrize("text", [
+    "好多可爱的小猫",
+    "我要到课堂上课",
+    "他是个刀客",
+    "派对上森林里",
+    "加油哇",
+])
+def test_common_words_are_not_rewritten(text):
+    assert corrector().correct(text) == (text, 0)
+
+
+def test_variants_are_matched_literally():
+    assert corrector().correct("我用派森写了个道克镜像") == ("我用Python写了个Docker镜像", 2)
+
+
+def test_explicit_pinyin_readings_match_homophones():
+    pytest.importorskip("pypinyin")
+    text, count = corrector().correct("部署到库博内特斯集群")
+    assert (text, count) == ("部署到Kubernetes集群", 1)
+
+
+def test_short_pinyin_readings_are_ignored():
+    pytest.importorskip("pypinyin")
+    lexicon = corrector(terms={"Docker": {"variants": ["道克"], "pinyin": ["dao ke"]}})
+    assert lexicon.correct("他是个刀客") == ("他是个刀客", 0)
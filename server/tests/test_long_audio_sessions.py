@@ -0,0 +1,42 @@
+import numpy as np
+
+from chunked_transcription import LongAudioSplitter
+from live_sessions import LiveSessionStore
+from speech_trimmer import SAMPLE_RATE, SpeechTrimmer
+
+
+def speech_with_pauses(seconds: int) -> np.ndarray:
+    """Noise "speech" with a 1 s pause every 10 s, so the splitter has silence to cut at"""
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(seconds * SAMPLE_RATE) * 0.1).astype(np.float32)
+    for start in range(9, seconds, 10):
+        audio[start * SAMPLE_RATE:(start + 1) * SAMPLE_RATE] = 0.0
+    return audio
+
+
+def test_final_pass_window_is_split_in_session_time():
+    recording = speech_with_pauses(100)
+    stored = 10 * SAMPLE_RATE
+    store = LiveSessionStore({"context_seconds": 0.5})
+    assert store.live_pass("s", 0, recording[:stored], decode=False) is not None
+
+    final_pass = store.final_pass("s", stored, recording[stored:])
+    window = final_pass.window
+    splitter = LongAudioSplitter(
+        SpeechTrimmer({"backend": "energy"}),
+        {"enabled": True, "min_audio_seconds": 60, "chunk_seconds": 20, "max_parallel": 4},
+    )
+    chunks = splitter.plan_window(window, free_slots=4)
+
+    assert chunks is not None and len(chunks) > 1
+    assert sum(len(chunk.audio) for chunk in chunks) == len(window.audio) == len(recording)
+    # Regions are contiguous in session time and each chunk holds exactly that audio
+    assert chunks[0].regions[0][0] == window.regions[0][0]
+    assert chunks[-1].regions[-1][1] == len(recording)
+    for chunk in chunks:
+        assert chunk.total_seconds == len(recording) / SAMPLE_RATE
+        audio = np.concatenate([recording[start:end] for start, end in chunk.regions])
+        np.testing.assert_array_equal(chunk.audio, audio)
+    # Chunk timestamps map back to session time
+    second = chunks[1]
+    assert second.restore_time(0.0) == second.regions[0][0] / SAMPLE_RATE > 0
@@ -0,0 +1,14 @@
+from polish_cache import PolishCache, normalize_text
+
+
+def test_full_stops_and_whitespace_do_not_change_the_key():
+    assert normalize_text(" 你去吗。 ") == normalize_text("你去吗") == "你去吗"
+    assert normalize_text("hello  world.") == "hello world"
+
+
+def test_terminal_question_and_exclamation_marks_are_kept():
+    cache = PolishCache("model", "prompt", 0.3)
+    cache.put("你去吗？", "你去吗？")
+    assert cache.get("你去吗？") == "你去吗？"
+    assert cache.get("你去吗。") is None
+    assert cache.get("你去吗！") is None
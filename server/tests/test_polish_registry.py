@@ -0,0 +1,41 @@
+import pytest
+
+from polish_registry import PolishRegistry
+
+
+def test_callbacks_are_disabled_by_default():
+    registry = PolishRegistry()
+    assert not registry.callbacks_enabled
+    assert not registry.callback_allowed("https://hooks.example.com/polish")
+
+
+@pytest.mark.parametrize("url, allowed", [
+    ("https://hooks.example.com/anything", True),
+    ("http://HOOKS.example.com:8080/x", True),
+    ("https://app.example.com/polish/done", True),
+    ("https://app.example.com/admin", False),
+    ("http://app.example.com/polish/done", False),
+    ("https://app.example.com@169.254.169.254/polish/", False),
+    ("https://hooks.example.com.evil.org/", False),
+    ("http://169.254.169.254/latest/meta-data/", False),
+    ("http://localhost:5000/api/health", False),
+    ("file:///etc/passwd", False),
+    ("hooks.example.com/polish", False),
+])
+def test_callback_allowlist(url, allowed):
+    registry = PolishRegistry(callback_allowlist=["hooks.example.com", "https://app.example.com/polish/"])
+    assert registry.callback_allowed(url) is allowed
+
+
+def test_completion_status():
+    registry = PolishRegistry()
+    polished, skipped, failed = (registry.create("req", "派森") for _ in range(3))
+
+    registry.complete(polished.polish_id, "Python。", True, None)
+    registry.complete(skipped.polish_id, "Python", False, None, llm_gate="skip_lexicon")
+    registry.complete(failed.polish_id, None, False, "LLM stage overloaded")
+
+    assert (polished.status, polished.to_dict()["text"]) == ("done", "Python。")
+    assert skipped.to_dict()["status"] == "skipped"
+    assert skipped.to_dict()["text"] == "Python" and skipped.to_dict()["llm_gate"] == "skip_lexicon"
+    assert (failed.status, failed.to_dict()["text"]) == ("failed", "派森")
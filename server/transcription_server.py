@@ -150,7 +150,7 @@ def _setup_cuda_env_early():
 # 在导入 faster_whisper 前设置环境
 _setup_cuda_env_early()
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import logging
@@ -162,14 +162,36 @@ import threading
 import queue
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import gc
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 import socket
-from llm_service import LLMService
+import requests
+from lexicon_corrector import LexiconCorrector
+from llm_service import CallMetrics, LLMService
+from pipeline import PipelineStage, StageFullError
+from polish_registry import PolishRegistry
+from request_log import request_log
+from response_format import ResponseEncoder
+from polish_gate import GateDecision, PolishGate, join_segment_texts
+from segment_polisher import SegmentPolisher
+from chunked_transcription import ChunkedTranscription, LongAudioSplitter, run_chunk
+from decode_profiles import DecodeProfiles, UnknownProfileError
+from incremental_features import FeatureInjector, IncrementalFeatures
+from language_cache import LanguageCache, LanguageIdentifier
+from live_sessions import LiveSessionStore
+from speech_trimmer import SAMPLE_RATE, SpeechTrimmer
+from two_pass import DraftTranscriber
+from user_profiles import UnknownUserProfileError, UserProfiles
 
 # Configure logging
-def setup_logging():
-    """Configure application logging with file and console handlers"""
+def setup_logging(log_config=None, level="INFO"):
+    """
+    Configure application logging with file and console handlers
+
+    Until the configuration is loaded records are written synchronously; with
+    logging.async they are written by a dedicated thread (see request_log)
+    """
     import os
     from logging.handlers import RotatingFileHandler
 
@@ -192,26 +214,20 @@ def setup_logging():
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5
     )
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
 
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
 
-    # Configure root logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-
-    # Remove existing handlers to avoid duplicates
-    root_logger.handlers.clear()
+    # Configure root logger (replaces existing handlers to avoid duplicates)
+    request_log.configure(log_config or {"async": False}, [file_handler, console_handler], level)
+    # httpx logs every LLM request at INFO; the request summary already covers them
+    logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    # Add handlers
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-
-    return root_logger
+    return logging.getLogger()
 
 # Setup logging
 setup_logging()
@@ -222,10 +238,28 @@ app = Flask(__name__)
 # Global variables
 transcription_queue = queue.Queue(maxsize=100)  # 请求队列
 active_transcriptions = 0  # 活跃转写计数
-transcription_executor = None  # 线程池
+transcription_stage = None  # 转写阶段（占用模型槽位）
+llm_stage = None  # LLM后处理阶段（独立线程池，不占用模型槽位）
+vad_stage = None  # VAD预处理阶段（裁剪静音，不占用模型槽位）
+speech_trimmer = None  # 服务端VAD，转写前去掉静音
+long_audio_splitter = None  # 长音频按静音切分后并行转写
+live_sessions = None  # 实时转写会话（保存分块音频和已确认结果）
+decode_profiles = None  # 命名的解码参数组合（beam/温度/VAD），请求按名称选择
+draft_transcriber = None  # 两遍转写的小模型（先返回草稿）
+draft_stage = None  # 草稿转写阶段（不占用大模型槽位）
+draft_profile = None  # 草稿使用的解码配置
+language_identifier = None  # 小模型语言识别（只看开头几秒）
+language_id_stage = None  # 小模型语言识别阶段（限制并发，满载时改由主模型检测）
+language_cache = None  # 按客户端缓存检测到的语言，多次一致后固定
+user_profiles = None  # 用户/团队的热词提示配置（启动时加载并分词）
+response_encoder = None  # 响应序列化（orjson）和字段选择
+polish_registry = None  # 延迟润色任务（先返回原文，润色结果稍后获取）
 model = None
 config = None
 llm_service = None  # LLM服务实例
+polish_gate = None  # 基于置信度的LLM润色门控
+segment_polisher = None  # 边解码边按片段组润色
+lexicon_corrector = None  # 领域词表同音词纠错（LLM之前或替代LLM）
 lock = threading.Lock()
 
 
@@ -391,12 +425,14 @@ def load_config():
             "log_level": "INFO",
         }
 
+    # 按配置切换为异步日志（专用写入线程）和请求摘要格式
+    setup_logging(config.get("logging", {}), str(config.get("log_level", "INFO")).upper())
     return config
 
 
 # Initialize Whisper model
 def initialize_model():
-    global model
+    global model, draft_transcriber, language_identifier
     logger.info(f"Loading Whisper model: {config['model_size']}")
     logger.info(f"Device: {config['device']}, Compute type: {config['compute_type']}")
 
@@ -404,10 +440,12 @@ def initialize_model():
         model_size = config["model_size"]
         # 优先使用Systran的Faster Whisper模型
         logger.info(f"Attempting to load Systran Faster Whisper model: {model_size}")
+        # num_workers>1 才能让多个转写线程（含长音频分块）真正并行解码
         model = WhisperModel(
             model_size,
             device=config["device"],
             compute_type=config["compute_type"],
+            num_workers=config.get("model_num_workers", 1),
             local_files_only=False,
         )
         logger.info("Systran Faster Whisper model loaded successfully")
@@ -424,7 +462,10 @@ def initialize_model():
         logger.info("Falling back to base model")
         try:
             model = WhisperModel(
-                "base", device=config["device"], compute_type=config["compute_type"]
+                "base",
+                device=config["device"],
+                compute_type=config["compute_type"],
+                num_workers=config.get("model_num_workers", 1),
             )
             logger.info("Base model loaded as fallback")
 
@@ -440,13 +481,29 @@ def initialize_model():
             )
             raise fallback_error
 
+    # 实时会话的增量log-mel特征通过包装模型的特征提取器注入
+    features_config = config.get("live_sessions", {}).get("incremental_features", {})
+    if features_config.get("enabled", False) and getattr(model, "feature_extractor", None) is not None:
+        model.feature_extractor = FeatureInjector(model.feature_extractor)
+
+    # 两遍转写：小模型先给出草稿，大模型给出最终结果
+    draft_transcriber = DraftTranscriber(config.get("two_pass", {}), config["device"], config["compute_type"])
+
+    # 语言检测缓存可选用小模型做语言识别
+    language_identifier = LanguageIdentifier(
+        config.get("language_cache", {}).get("language_id", {}), config["device"], config["compute_type"]
+    )
+
 
 # Initialize LLM Service
 def initialize_llm_service():
-    global llm_service
+    global llm_service, polish_gate, segment_polisher, lexicon_corrector
     try:
+        lexicon_corrector = LexiconCorrector(config.get("lexicon", {}))
         llm_config = config.get("llm", {})
         llm_service = LLMService(llm_config)
+        polish_gate = PolishGate(llm_config.get("gating", {}))
+        segment_polisher = SegmentPolisher(llm_service, llm_config.get("chunking", {}), polish_gate)
 
         # Validate configuration
         is_valid, error_msg = llm_service.validate_config()
@@ -622,7 +679,8 @@ class TranscriptionService:
 
     @staticmethod
     def transcribe_audio_async(
-        audio_data, language=None, initial_prompt=None, request_id=None
+        audio_data, language=None, initial_prompt=None, request_id=None, deadline=None, trim=None,
+        polish_segments=True, profile=None,
     ):
         """
         异步音频转写
@@ -630,8 +688,14 @@ class TranscriptionService:
         Args:
             audio_data: 音频数据
             language: 语言代码
-            initial_prompt: 初始提示
+            initial_prompt: 初始提示（文本，或实时会话上下文的 token 列表）
             request_id: 请求ID
+            deadline: 请求截止时间（time.monotonic()），传给边解码边润色的LLM请求
+            trim: VAD预处理结果（TrimResult）或长音频切分出的分块；提供时只转写
+                其中的音频，片段时间戳映射回原始音频
+            polish_segments: 是否允许边解码边润色（长音频分块转写时关闭，
+                拼接后整体润色）
+            profile: 解码参数（DecodeProfile），None 时使用默认配置
 
         Returns:
             dict: 转写结果
@@ -645,83 +709,97 @@ class TranscriptionService:
                     language = config.get("language")
                 if initial_prompt is None:
                     initial_prompt = config.get("initial_prompt")
+                if profile is None:
+                    profile = decode_profiles.default
 
-                logger.info(
-                    f"Starting transcription (ID: {request_id}, language: {language})"
+                logger.debug(
+                    "Starting transcription (ID: %s, language: %s, profile: %s)", request_id, language, profile.name
                 )
 
-                # 执行转写
-                segments, info = model.transcribe(
-                    audio_data,
-                    task="transcribe",
-                    beam_size=5,
-                    language=language,
-                    temperature=0.0,
-                    initial_prompt=initial_prompt,
-                    vad_filter=True,
-                    vad_parameters=dict(min_silence_duration_ms=500),
-                    condition_on_previous_text=False,
-                )
+                # 已经过VAD裁剪的音频不再让模型重复做VAD
+                if trim is not None:
+                    audio_data = trim.audio
+                # 实时会话窗口可带有增量计算的log-mel特征，此时模型不再做VAD（VAD会改变音频）
+                features = trim.features if trim is not None else None
+                vad_filter = (trim is None or not trim.trimmed) and features is None
+
+                # 未指定语言时显式检测（与 transcribe() 内部的检测相同），以便统计检测耗时
+                detected_probability = None
+                if (
+                    language is None
+                    and language_cache is not None
+                    and language_cache.enabled
+                    and hasattr(model, "detect_language")
+                ):
+                    detect_started = time.perf_counter()
+                    language, detected_probability, _ = model.detect_language(audio_data[: 30 * SAMPLE_RATE])
+                    language_cache.record_detection(time.perf_counter() - detect_started, "model")
+
+                decode_started = time.perf_counter()
+                if features is not None:
+                    feature_context = model.feature_extractor.provide(audio_data, features)
+                else:
+                    feature_context = nullcontext()
+
+                # 执行转写（特征在 transcribe() 调用内计算，生成片段时不再需要）
+                with feature_context:
+                    segments, info = model.transcribe(
+                        audio_data,
+                        task="transcribe",
+                        language=language,
+                        initial_prompt=initial_prompt,
+                        **profile.transcribe_options(vad_filter),
+                    )
+
+                # 启用分段润色时，边解码边把片段组提交给LLM
+                polish_job = None
+                if (
+                    polish_segments
+                    and segment_polisher is not None
+                    and segment_polisher.enabled
+                    and llm_service is not None
+                    and llm_service.is_enabled()
+                    and not (lexicon_corrector is not None and lexicon_corrector.replaces_llm)
+                ):
+                    polish_job = segment_polisher.start(info.language, deadline)
+
+                # 启用词表纠错时，逐片段替换领域术语的同音误识别
+                lexicon_pass = None
+                if lexicon_corrector is not None and lexicon_corrector.enabled:
+                    lexicon_pass = lexicon_corrector.start()
 
                 # 收集所有片段
                 segment_list = []
                 full_text = ""
+                asr_text = ""
 
                 for segment in segments:
+                    segment_text = segment.text
+                    asr_text += segment_text
+                    if lexicon_pass is not None:
+                        segment_text = lexicon_pass.correct(segment_text)
+                    segment_start, segment_end = segment.start, segment.end
+                    if trim is not None:
+                        segment_start = round(trim.restore_time(segment_start), 3)
+                        segment_end = round(trim.restore_time(segment_end), 3)
                     segment_data = {
-                        "start": segment.start,
-                        "end": segment.end,
-                        "text": segment.text.strip(),
+                        "start": segment_start,
+                        "end": segment_end,
+                        "text": segment_text.strip(),
+                        "avg_logprob": getattr(segment, "avg_logprob", None),
+                        "no_speech_prob": getattr(segment, "no_speech_prob", None),
+                        "compression_ratio": getattr(segment, "compression_ratio", None),
                     }
                     segment_list.append(segment_data)
-                    full_text += segment.text
-
-                # Try to polish text with LLM if enabled
-                polished_text = full_text.strip()
-                llm_used = False
-                llm_error = None
-
-                if llm_service and llm_service.is_enabled():
-                    original_text = full_text.strip()
-                    logger.info(
-                        f"Attempting to polish text with LLM (ID: {request_id})"
-                    )
-                    logger.info(
-                        f"Original text before LLM (ID: {request_id}): {original_text}"
-                    )
-
-                    polished_result, success, error_msg = llm_service.polish_text(
-                        original_text
-                    )
+                    full_text += segment_text
+                    if polish_job is not None:
+                        polish_job.add_segment(segment_data)
 
-                    if success and polished_result:
-                        polished_text = polished_result
-                        llm_used = True
-                        logger.info(
-                            f"Text polished successfully by LLM (ID: {request_id})"
-                        )
-                        logger.info(
-                            f"Polished text after LLM (ID: {request_id}): {polished_text}"
-                        )
-
-                        # Log comparison if text changed
-                        if original_text != polished_text:
-                            logger.info(
-                                f"LLM text comparison (ID: {request_id}):\n"
-                                f"  [BEFORE]: {original_text}\n"
-                                f"  [AFTER]:  {polished_text}"
-                            )
-                        else:
-                            logger.info(
-                                f"LLM did not change the text (ID: {request_id})"
-                            )
-                    else:
-                        # LLM failed, use original text
-                        logger.warning(
-                            f"LLM polishing failed for request {request_id}: {error_msg}. "
-                            "Using original text as fallback."
-                        )
-                        llm_error = error_msg
+                if polish_job is not None:
+                    polish_job.close()
+                # 解码在遍历片段时进行，到这里才结束
+                decode_seconds = time.perf_counter() - decode_started
+                decode_profiles.record(profile, len(audio_data) / SAMPLE_RATE, decode_seconds)
 
                 result = {
                     "success": True,
@@ -729,18 +807,37 @@ class TranscriptionService:
                     "language": info.language,
                     "language_probability": info.language_probability,
                     "segments": segment_list,
-                    "text": polished_text,
+                    "text": full_text.strip(),
                     "original_text": full_text.strip(),  # 保存原始文本供参考
-                    "llm_used": llm_used,
-                    "llm_error": llm_error if llm_error else None,
+                    "llm_used": False,
+                    "llm_error": None,
                     "duration": info.duration if hasattr(info, "duration") else None,
                     "processing_time": None,  # 将在外部计算
+                    "decode_profile": profile.name,
+                    "timings": {"decode_ms": round(decode_seconds * 1000, 1)},
                 }
-
-                logger.info(
-                    f"Transcription completed (ID: {request_id}): {len(segment_list)} segments, "
-                    f"LLM polished: {llm_used}"
-                )
+                if detected_probability is not None:
+                    # 指定语言后模型报告的概率恒为1，这里使用检测时的概率
+                    result["language_probability"] = detected_probability
+                if polish_job is not None:
+                    # 内部字段，由后处理阶段取出，不会返回给客户端
+                    result["_polish_job"] = polish_job
+                if trim is not None:
+                    # duration 保持为原始音频时长，speech_duration 为实际送入模型的语音时长
+                    result["duration"] = trim.total_seconds
+                if trim is not None and trim.trimmed:
+                    result["speech_duration"] = round(trim.speech_seconds, 3)
+                    result["vad"] = trim.summary()
+                    result["timings"]["vad_ms"] = result["vad"]["vad_ms"]
+                if lexicon_pass is not None:
+                    lexicon_summary = lexicon_pass.finish()
+                    result["lexicon_corrections"] = lexicon_summary["corrections"]
+                    result["timings"]["lexicon_ms"] = lexicon_summary["match_ms"]
+                    if lexicon_summary["corrections"]:
+                        # original_text 为送入LLM的文本（已纠错），asr_text 为模型原始输出
+                        result["asr_text"] = asr_text.strip()
+
+                logger.debug("Transcription completed (ID: %s): %d segments", request_id, len(segment_list))
                 return result
 
             except Exception as e:
@@ -749,6 +846,200 @@ class TranscriptionService:
                 )
                 return {"success": False, "request_id": request_id, "error": str(e)}
 
+    @staticmethod
+    def polish_result(result, request_id=None, polish_job=None, on_delta=None, deadline=None):
+        """
+        使用LLM润色转写结果
+
+        在转写线程池之外调用（模型槽位已释放），LLM重试的退避等待由
+        LLMService的定时器调度，不会占用转写线程。
+
+        启用置信度门控时：高置信度或过短的文本跳过LLM；部分片段置信度低时
+        只润色这些片段（连续的低置信度片段合并为一次请求，并行发送）。
+
+        传入 polish_job 时，各片段组已在解码过程中提交给LLM，这里只等待
+        剩余的片段组完成并按顺序拼接。
+
+        LLM首个token耗时、总耗时和生成速度写入 result["timings"]。
+
+        传入 deadline 时，LLM请求的超时和重试不会超过剩余时间，剩余时间
+        不足 llm.deadline.min_budget_seconds 时直接跳过LLM返回原文。
+
+        Args:
+            result: transcribe_audio_async 返回的转写结果
+            request_id: 请求ID
+            polish_job: 解码时创建的 ChunkedPolishJob（可选）
+            on_delta: 流式输出回调（仅整段润色时转发，参见 LLMService.polish_text_async）
+            deadline: 请求截止时间（time.monotonic()），None 表示不限制
+
+        Returns:
+            dict: 更新后的转写结果
+        """
+        if not result.get("success") or not llm_service or not llm_service.is_enabled():
+            return result
+
+        original_text = result.get("original_text", "")
+        if not original_text:
+            return result
+
+        if lexicon_corrector is not None and lexicon_corrector.replaces_llm:
+            lexicon_corrector.record_llm_avoided()
+            result["llm_gate"] = "skip_lexicon"
+            logger.debug("LLM skipped, lexicon correction replaces it (ID: %s)", request_id)
+            return result
+
+        if deadline is not None:
+            result.setdefault("timings", {})["llm_budget_ms"] = round(
+                max(0.0, deadline - time.monotonic()) * 1000, 1
+            )
+
+        segments = result.get("segments", [])
+        if polish_job is not None:
+            return TranscriptionService._finish_chunked_polish(result, polish_job, request_id, deadline)
+
+        if polish_gate is not None:
+            decision = polish_gate.plan(segments, original_text)
+        else:
+            decision = GateDecision(GateDecision.SKIP_DISABLED)
+
+        if decision.decision != GateDecision.SKIP_DISABLED:
+            result["llm_gate"] = decision.decision
+        if decision.skips_llm:
+            polish_gate.record(decision, len(segments))
+            logger.debug("LLM skipped by confidence gate (ID: %s): %s", request_id, decision.decision)
+            return result
+
+        logger.debug("Attempting to polish text with LLM (ID: %s)", request_id)
+        logger.debug("Original text before LLM (ID: %s): %s", request_id, original_text)
+
+        llm_start = time.time()
+        call_metrics = []
+        if decision.decision == GateDecision.PARTIAL:
+            polished_result, success, error_msg = TranscriptionService._polish_segment_runs(
+                segments, decision.low_runs, result.get("language"), call_metrics, deadline
+            )
+            llm_calls = len(decision.low_runs)
+            polished_segments = sum(end - start for start, end in decision.low_runs)
+        else:
+            call_metrics.append(CallMetrics())
+            polished_result, success, error_msg = llm_service.polish_text(
+                original_text, on_delta=on_delta, metrics=call_metrics[0], deadline=deadline
+            )
+            llm_calls = 1
+            polished_segments = len(segments)
+        record_llm_timings(result, call_metrics, request_id)
+
+        if polish_gate is not None:
+            polish_gate.record(
+                decision, len(segments), llm_calls, polished_segments, time.time() - llm_start
+            )
+
+        return TranscriptionService._apply_polish(
+            result, polished_result, success, error_msg, request_id
+        )
+
+    @staticmethod
+    def _finish_chunked_polish(result, polish_job, request_id, deadline=None):
+        """等待解码期间提交的片段组润色完成，并记录门控统计"""
+        llm_start = time.time()
+        wait_timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        polished_result, success, error_msg = polish_job.wait(wait_timeout)
+        result["llm_chunks"] = polish_job.summary()
+        record_llm_timings(result, polish_job.call_metrics, request_id)
+
+        decision = polish_job.gate_decision()
+        if decision.decision != GateDecision.SKIP_DISABLED:
+            result["llm_gate"] = decision.decision
+            polished_segments = sum(
+                c.end - c.start for c in polish_job.chunks if c.submitted_at is not None
+            )
+            polish_gate.record(
+                decision,
+                len(polish_job.segments),
+                len(polish_job.chunks) - polish_job.skipped_count,
+                polished_segments,
+                None if decision.skips_llm else time.time() - llm_start,
+            )
+        if polish_job.skipped_llm:
+            logger.debug("LLM skipped by confidence gate (ID: %s): %s", request_id, decision.decision)
+            return result
+
+        logger.debug("Chunked LLM polishing finished (ID: %s): %s", request_id, result["llm_chunks"])
+        return TranscriptionService._apply_polish(
+            result, polished_result, success, error_msg, request_id
+        )
+
+    @staticmethod
+    def _apply_polish(result, polished_result, success, error_msg, request_id):
+        """写入润色结果；失败时保留原始文本并记录错误"""
+        original_text = result.get("original_text", "")
+        if success and polished_result:
+            result["text"] = polished_result
+            result["llm_used"] = True
+            if result.get("asr_text") is not None and lexicon_corrector is not None:
+                lexicon_corrector.record_llm_result(original_text, polished_result)
+            logger.debug("Text polished successfully by LLM (ID: %s)", request_id)
+            logger.debug("Polished text after LLM (ID: %s): %s", request_id, polished_result)
+
+            # Log comparison if text changed
+            if original_text != polished_result:
+                logger.debug(
+                    "LLM text comparison (ID: %s):\n  [BEFORE]: %s\n  [AFTER]:  %s",
+                    request_id, original_text, polished_result,
+                )
+            else:
+                logger.debug("LLM did not change the text (ID: %s)", request_id)
+        else:
+            # LLM failed, use original text
+            logger.warning(
+                f"LLM polishing failed for request {request_id}: {error_msg}. "
+                "Using original text as fallback."
+            )
+            result["llm_error"] = error_msg
+
+        return result
+
+    @staticmethod
+    def _polish_segment_runs(segments, runs, language, call_metrics=None, deadline=None):
+        """
+        并行润色低置信度片段，并按原顺序拼接
+
+        Args:
+            segments: 片段列表
+            runs: 低置信度连续片段的 [start, end) 下标范围
+            language: 语言代码（决定拼接时是否加空格）
+            call_metrics: 可选列表，追加每次LLM调用的 CallMetrics
+            deadline: 请求截止时间（time.monotonic()）
+
+        Returns:
+            Tuple of (stitched_text, success, error_message)
+        """
+        pieces = [segment.get("text", "") for segment in segments]
+        futures = []
+        for start, end in runs:
+            metrics = CallMetrics()
+            if call_metrics is not None:
+                call_metrics.append(metrics)
+            text = join_segment_texts(pieces[start:end], language)
+            futures.append(
+                (start, end, llm_service.polish_text_async(text, metrics=metrics, deadline=deadline))
+            )
+
+        errors = []
+        polished_any = False
+        for start, end, future in futures:
+            polished, success, error_msg = future.result()
+            if success and polished:
+                pieces[start:end] = [polished] + [""] * (end - start - 1)
+                polished_any = True
+            else:
+                errors.append(error_msg)
+
+        stitched = join_segment_texts(pieces, language)
+        if polished_any:
+            return stitched, True, ""
+        return None, False, "; ".join(e for e in errors if e) or "LLM polishing failed"
+
 
 def process_queued_transcription():
     """处理队列中的转写请求"""
@@ -772,6 +1063,9 @@ def process_queued_transcription():
                 result = TranscriptionService.transcribe_audio_async(
                     audio_data, language, initial_prompt, request_id
                 )
+                result = TranscriptionService.polish_result(
+                    result, request_id, result.pop("_polish_job", None)
+                )
                 result["processing_time"] = time.time() - start_time
 
                 # 设置结果
@@ -793,12 +1087,70 @@ def process_queued_transcription():
 
 def start_transcription_workers():
     """启动转写工作线程"""
-    global transcription_executor
+    global transcription_stage, llm_stage, vad_stage, speech_trimmer, long_audio_splitter, live_sessions
+    global polish_registry, decode_profiles, draft_stage, draft_profile, language_cache, user_profiles
+    global response_encoder, language_id_stage
     max_workers = config.get("max_concurrent_transcriptions", 8)
+    pipeline_config = config.get("pipeline", {})
+
+    # 排队音频总时长（有VAD时为语音时长）超过上限时拒绝新请求
+    transcription_stage = PipelineStage(
+        "transcription",
+        max_workers,
+        config.get("queue_size", 100),
+        max_queued_cost=pipeline_config.get("max_queued_audio_seconds", 0),
+    )
 
-    transcription_executor = ThreadPoolExecutor(
-        max_workers=max_workers, thread_name_prefix="transcription"
+    llm_stage = PipelineStage(
+        "llm",
+        pipeline_config.get("llm_workers", 8),
+        pipeline_config.get("llm_queue_size", 64),
+    )
+    polish_registry = PolishRegistry(
+        ttl=pipeline_config.get("deferred_polish_ttl", 300),
+        callback_allowlist=pipeline_config.get("polish_callback_allowlist", []),
     )
+    decode_profiles = DecodeProfiles(config.get("decode_profiles", {}))
+    response_encoder = ResponseEncoder(config.get("response", {}))
+
+    vad_config = config.get("vad", {})
+    speech_trimmer = SpeechTrimmer(vad_config)
+    vad_stage = None
+    if speech_trimmer.enabled:
+        vad_stage = PipelineStage(
+            "vad", vad_config.get("workers", 2), vad_config.get("queue_size", 32)
+        )
+        logger.info(f"VAD pre-pass enabled (backend: {speech_trimmer.backend})")
+    long_audio_splitter = LongAudioSplitter(speech_trimmer, config.get("long_audio", {}))
+    session_config = config.get("live_sessions", {})
+    features = None
+    if isinstance(getattr(model, "feature_extractor", None), FeatureInjector):
+        features = IncrementalFeatures(model.feature_extractor, session_config.get("incremental_features", {}))
+    # 会话上下文以 token 保存，每个已确认片段只分词一次
+    tokenizer = getattr(model, "hf_tokenizer", None)
+    tokenize = (lambda text: tokenizer.encode(text, add_special_tokens=False).ids) if tokenizer is not None else None
+    live_sessions = LiveSessionStore(session_config, features, tokenize)
+    user_profiles = UserProfiles(config.get("user_profiles", {}), tokenize)
+    language_cache = LanguageCache(config.get("language_cache", {}), language_identifier)
+    language_id_stage = None
+    if language_cache.enabled and language_cache.identifier is not None:
+        language_id_config = config.get("language_cache", {}).get("language_id", {})
+        language_id_stage = PipelineStage(
+            "language_id", language_id_config.get("workers", 2), language_id_config.get("queue_size", 16)
+        )
+
+    draft_stage = None
+    if draft_transcriber is not None and draft_transcriber.enabled:
+        two_pass_config = config.get("two_pass", {})
+        draft_stage = PipelineStage(
+            "draft", two_pass_config.get("workers", 2), two_pass_config.get("queue_size", 16)
+        )
+        try:
+            draft_profile = decode_profiles.resolve(two_pass_config.get("profile", "live-fast"))
+        except UnknownProfileError as e:
+            logger.warning(f"{e}; drafts use the default decode profile")
+            draft_profile = decode_profiles.default
+        logger.info(f"Two-pass transcription enabled (draft model: {draft_transcriber.model_size})")
 
     # 启动多个工作线程
     for i in range(max_workers):
@@ -808,7 +1160,409 @@ def start_transcription_workers():
         worker.daemon = True
         worker.start()
 
-    logger.info(f"Started {max_workers} transcription workers")
+    logger.info(
+        f"Started {max_workers} transcription workers, "
+        f"{llm_stage.max_workers} LLM post-processing workers"
+    )
+
+
+def start_deferred_polish(result, request_id, callback_url=None, polish_job=None, stream_tokens=False):
+    """提交延迟润色任务，返回附带 polish_id 的原始结果"""
+    if not result.get("original_text"):
+        return result
+
+    entry = polish_registry.create(request_id, result["original_text"], callback_url)
+    try:
+        llm_stage.submit(
+            run_deferred_polish, dict(result), request_id, entry.polish_id, polish_job, stream_tokens
+        )
+    except StageFullError as e:
+        logger.warning(f"LLM stage overloaded, skipping polish (ID: {request_id}): {e}")
+        polish_registry.complete(entry.polish_id, None, False, "LLM stage overloaded")
+        result["llm_error"] = "LLM stage overloaded"
+        return result
+
+    result["polish_id"] = entry.polish_id
+    result["polish_status"] = "pending"
+    return result
+
+
+def callback_rejected_error():
+    """回调地址不在白名单（或回调未启用）时返回给客户端的错误信息"""
+    if not polish_registry.callbacks_enabled:
+        return "Polish callbacks are disabled (pipeline.polish_callback_allowlist is empty)"
+    return "Polish callback URL is not in pipeline.polish_callback_allowlist"
+
+
+def run_deferred_polish(result, request_id, polish_id, polish_job=None, stream_tokens=False):
+    """
+    在LLM阶段执行延迟润色，完成后通知等待方和回调地址
+
+    stream_tokens=True（或 llm.stream 开启）时，LLM 流式输出的文本片段
+    会写入任务记录，供 /api/polish/<polish_id>/events?tokens=1 转发。
+    """
+    on_delta = None
+    entry = polish_registry.get(polish_id)
+    if entry is not None and (stream_tokens or llm_service.stream):
+        on_delta = entry.add_delta
+
+    polished = TranscriptionService.polish_result(result, request_id, polish_job, on_delta)
+    # 未调用LLM（门控或词表跳过）时 text 是未润色但已做词表纠错的文本
+    entry = polish_registry.complete(
+        polish_id,
+        polished.get("text"),
+        polished.get("llm_used", False),
+        polished.get("llm_error"),
+        polished.get("timings"),
+        polished.get("llm_gate"),
+    )
+    if entry is not None and entry.callback_url:
+        try:
+            # 不跟随重定向，避免绕过回调白名单
+            requests.post(entry.callback_url, json=entry.to_dict(), timeout=5, allow_redirects=False)
+        except Exception as e:
+            logger.warning(f"Polish callback failed (ID: {request_id}, url: {entry.callback_url}): {e}")
+
+
+def prepare_audio(audio_array, request_id):
+    """
+    VAD预处理：在占用模型槽位之前找出语音区间
+
+    返回 TrimResult；未启用VAD、音频过短、VAD阶段满载或出错时返回 None，
+    此时按原音频转写（模型内部仍做VAD）。
+    """
+    if vad_stage is None:
+        return None
+    try:
+        return vad_stage.submit(speech_trimmer.trim, audio_array).result()
+    except StageFullError:
+        logger.warning(f"VAD stage overloaded, transcribing untrimmed audio (ID: {request_id})")
+    except Exception as e:
+        logger.warning(f"VAD pre-pass failed, transcribing untrimmed audio (ID: {request_id}): {e}")
+    return None
+
+
+def silent_result(request_id, language, trim):
+    """完全静音的音频直接返回空结果，不占用模型槽位"""
+    logger.debug("No speech detected, skipping transcription (ID: %s)", request_id)
+    return {
+        "success": True,
+        "request_id": request_id,
+        "language": language or config.get("language"),
+        "language_probability": None,
+        "segments": [],
+        "text": "",
+        "original_text": "",
+        "llm_used": False,
+        "llm_error": None,
+        "duration": trim.total_seconds,
+        "speech_duration": 0.0,
+        "vad": trim.summary(),
+        "timings": {"vad_ms": round(trim.elapsed * 1000, 1)},
+        "processing_time": None,
+    }
+
+
+def audio_cost(audio_array, trim):
+    """转写阶段准入用的工作量：语音时长（秒），无VAD结果时为音频总时长"""
+    if trim is not None:
+        return trim.speech_seconds
+    return len(audio_array) / SAMPLE_RATE
+
+
+def submit_transcription(audio_array, language, initial_prompt, request_id, deadline, trim, profile=None,
+                         session_window=False):
+    """
+    提交转写任务，返回可调用 result(timeout) 的对象
+
+    语音足够长且有空闲转写槽位时，按静音边界切分为多个分块并行转写，
+    结果按顺序拼接（时间戳为原始音频中的时间）；否则整段转写。
+
+    session_window 为 True 时 trim 是实时会话窗口：其音频从窗口起点开始，
+    而片段区间是会话时间，audio_array 只是上传的分块或尾部，因此按窗口
+    音频切分，分块时间戳映射回会话时间。
+
+    Raises:
+        StageFullError: 转写阶段满载
+    """
+    free_slots = (
+        transcription_stage.max_workers - transcription_stage.active() - transcription_stage.queue_depth()
+    )
+    if session_window:
+        chunks = long_audio_splitter.plan_window(trim, free_slots)
+    else:
+        chunks = long_audio_splitter.plan(audio_array, trim, free_slots)
+    if chunks is None:
+        return transcription_stage.submit(
+            TranscriptionService.transcribe_audio_async,
+            audio_array,
+            language,
+            initial_prompt,
+            request_id,
+            deadline,
+            trim,
+            True,
+            profile,
+            cost=audio_cost(audio_array, trim),
+        )
+
+    logger.debug("Splitting long audio into %d chunks (ID: %s)", len(chunks), request_id)
+    futures = []
+    try:
+        for index, chunk in enumerate(chunks):
+            futures.append(
+                transcription_stage.submit(
+                    run_chunk,
+                    TranscriptionService.transcribe_audio_async,
+                    None,
+                    language,
+                    initial_prompt,
+                    f"{request_id}#{index}",
+                    deadline,
+                    chunk,
+                    False,
+                    profile,
+                    cost=chunk.speech_seconds,
+                )
+            )
+    except StageFullError:
+        for future in futures:
+            future.cancel()
+        raise
+    return ChunkedTranscription(futures, chunks, request_id, trim, long_audio_splitter)
+
+
+def finish_stage_timings(result, start_time, transcribed_time):
+    """记录各阶段耗时（转写阶段含排队时间）"""
+    now = time.time()
+    timings = result.setdefault("timings", {})
+    timings["transcription_ms"] = round((transcribed_time - start_time) * 1000, 1)
+    timings["postprocess_ms"] = round((now - transcribed_time) * 1000, 1)
+    result["processing_time"] = now - start_time
+
+
+def send_result(result, response_fields=None):
+    """序列化结果并写请求摘要日志（在序列化之后写，摘要包含 serialize_ms）"""
+    response = response_encoder.response(result, response_fields)
+    # 每个请求只写一行摘要日志（转写文本按采样率和速率限制记录）
+    request_log.summary(result)
+    return response
+
+
+def record_llm_timings(result, call_metrics, request_id=None):
+    """把LLM调用的首token耗时、总耗时和生成速度写入 timings"""
+    if not call_metrics:
+        return
+    summary = CallMetrics.merge(call_metrics)
+    if not summary["llm_calls"]:
+        return
+    timings = result.setdefault("timings", {})
+    for key in ("llm_ttft_ms", "llm_ms", "llm_tokens_per_second", "llm_completion_tokens"):
+        timings[key] = summary[key]
+    logger.debug(
+        "LLM timings (ID: %s): calls=%s, streamed=%s, ttft=%sms, total=%sms, tokens=%s, tokens/s=%s",
+        request_id, summary["llm_calls"], summary["llm_streamed"], summary["llm_ttft_ms"],
+        summary["llm_ms"], summary["llm_completion_tokens"], summary["llm_tokens_per_second"],
+    )
+
+
+def request_deadline(received_at, deadline_ms=None):
+    """
+    计算请求截止时间（time.monotonic()）
+
+    预算取客户端给出的 deadline_ms（JSON字段或 X-Deadline-Ms 请求头，从服务端
+    收到请求时起算），否则使用 llm.deadline.default_seconds；再减去返回响应的
+    预留时间 reserve_seconds。预算为 0 或未配置时返回 None（不限制）。
+    """
+    deadline_config = config.get("llm", {}).get("deadline", {})
+    budget = deadline_config.get("default_seconds", 55)
+    if deadline_ms not in (None, ""):
+        try:
+            budget = float(deadline_ms) / 1000.0
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid deadline_ms: {deadline_ms!r}")
+    if not budget or budget <= 0:
+        return None
+    return received_at + budget - deadline_config.get("reserve_seconds", 0.2)
+
+
+def run_postprocessing(result, request_id, timeout, deferred=False, callback_url=None, stream_tokens=False,
+                       deadline=None):
+    """
+    在LLM后处理阶段润色转写结果
+
+    转写阶段在收集完片段后即释放模型槽位；LLM润色在独立的有界线程池中进行，
+    后处理阶段满载或超时时直接返回原始文本。
+
+    deferred=True 时立即返回原始文本和 polish_id，润色结果通过
+    /api/polish/<polish_id>（长轮询）、/api/polish/<polish_id>/events（SSE）
+    或 callback_url 回调获取；stream_tokens=True 时 SSE 还会转发LLM的流式输出。
+
+    deadline 为请求截止时间（time.monotonic()）：同步润色最多等待到截止时间，
+    LLM请求的超时和重试也受其限制；延迟润色不受请求截止时间限制。
+    """
+    polish_job = result.pop("_polish_job", None)
+    if not result.get("success") or not llm_service or not llm_service.is_enabled():
+        return result
+
+    if lexicon_corrector is not None and lexicon_corrector.replaces_llm:
+        return TranscriptionService.polish_result(result, request_id)
+
+    if deferred:
+        return start_deferred_polish(result, request_id, callback_url, polish_job, stream_tokens)
+
+    if deadline is not None:
+        skip_reason = llm_service.deadline_error(deadline)
+        if skip_reason is not None:
+            result["llm_error"] = skip_reason
+            return result
+        timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+
+    try:
+        future = llm_stage.submit(
+            TranscriptionService.polish_result, dict(result), request_id, polish_job, None, deadline
+        )
+    except StageFullError as e:
+        logger.warning(f"LLM stage overloaded, skipping polish (ID: {request_id}): {e}")
+        result["llm_error"] = "LLM stage overloaded"
+        return result
+
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        logger.warning(f"LLM stage timed out (ID: {request_id}), using original text")
+        result["llm_error"] = "LLM stage timeout"
+        return result
+
+
+def client_key_of(data, headers, remote_addr):
+    """语言缓存按客户端区分：client_id 字段、X-Client-Id 请求头，否则为客户端IP"""
+    return data.get("client_id") or headers.get("X-Client-Id") or remote_addr or "unknown"
+
+
+def resolve_language(language, client_key, audio_array, trim, request_id):
+    """
+    确定请求的语言及其来源
+
+    请求或配置指定了语言时不检测。否则先查客户端的语言缓存（已固定的语言
+    直接使用），再在语言识别阶段用小模型对开头几秒做语言识别（置信度足够时
+    使用；阶段满载或超时则跳过），都没有时由主模型检测。
+
+    Returns:
+        Tuple of (language or None, source, language_id_ms)；source 为 "request"、
+        "cache"、"language_id"、"model"，未启用语言缓存时为 None；language_id_ms
+        为小模型语言识别耗时（含排队），未运行时为 None
+    """
+    if language:
+        return language, "request", None
+    if language_cache is None or not language_cache.enabled or config.get("language"):
+        return None, None, None
+
+    cached = language_cache.lookup(client_key)
+    if cached:
+        return cached, "cache", None
+    if language_id_stage is None:
+        return None, "model", None
+
+    started = time.perf_counter()
+    try:
+        future = language_id_stage.submit(language_cache.identify, trim.audio if trim is not None else audio_array)
+        identified = future.result(timeout=language_cache.identifier.timeout)
+    except StageFullError:
+        logger.warning(f"Language ID stage overloaded, detecting with the main model (ID: {request_id})")
+        identified = None
+    except Exception as e:
+        logger.warning(f"Language ID failed, detecting with the main model (ID: {request_id}): {e!r}")
+        identified = None
+    language_id_ms = round((time.perf_counter() - started) * 1000, 1)
+    if identified is not None:
+        detected, probability = identified
+        language_cache.observe(client_key, detected, probability)
+        if probability >= language_cache.min_probability:
+            return detected, "language_id", language_id_ms
+    return None, "model", language_id_ms
+
+
+def note_language(result, client_key, language_source, language_id_ms=None):
+    """主模型检测出的语言计入客户端的语言缓存，并在结果中标明语言来源和语言识别耗时"""
+    if language_id_ms is not None:
+        result.setdefault("timings", {})["language_id_ms"] = language_id_ms
+    if not language_source or not result.get("success"):
+        return
+    if language_source == "model":
+        language_cache.observe(client_key, result.get("language"), result.get("language_probability"))
+    result["language_source"] = language_source
+
+
+def wants_two_pass(data, headers, audio_array, trim):
+    """请求是否使用两遍转写（two_pass 字段或 X-Two-Pass: 1，且音频足够长）"""
+    if draft_stage is None:
+        return False
+    requested = bool(data.get("two_pass")) or headers.get("X-Two-Pass") == "1"
+    return requested and draft_transcriber.wants_draft(audio_array, trim)
+
+
+def stream_two_pass(future, audio_array, language, draft_prompt, request_id, trim, start_time,
+                    client_key=None, language_source=None, language_id_ms=None, **postprocess):
+    """
+    两遍转写：通过 Server-Sent Events 依次推送小模型草稿和最终结果
+
+    大模型转写已提交，草稿在独立的草稿阶段同时生成。先推送 event: draft
+    （草稿超过 two_pass.timeout_seconds、草稿阶段满载、草稿为空或最终结果
+    已先完成时不推送），再推送经过后处理的 event: final。数据中的 text_status
+    标明 "draft" 或 "final"，final 的 draft_changed 表示最终文本是否与草稿不同。
+
+    draft_prompt 为草稿模型的文本提示（主模型的 token 提示不能用于分词器不同的
+    草稿模型）。client_key/language_source/language_id_ms 用于语言缓存（见
+    resolve_language），postprocess 为传给 run_postprocessing 的润色参数。
+    """
+    try:
+        draft_future = draft_stage.submit(
+            draft_transcriber.transcribe, audio_array, language, draft_prompt, trim, draft_profile
+        )
+    except StageFullError:
+        logger.warning(f"Draft stage overloaded, sending the final result only (ID: {request_id})")
+        draft_future = None
+
+    def generate():
+        draft = None
+        if draft_future is not None:
+            try:
+                draft = draft_future.result(timeout=draft_transcriber.timeout)
+            except Exception as e:
+                draft_future.cancel()
+                logger.warning(f"Draft transcription skipped (ID: {request_id}): {e!r}")
+        draft_seconds = None
+        if draft is not None and draft["text"] and not future.done():
+            draft["request_id"] = request_id
+            draft_seconds = time.time() - start_time
+            yield f"event: draft\ndata: {response_encoder.dumps(draft).decode('utf-8')}\n\n"
+
+        timeout = config.get("timeout", 600)
+        try:
+            result = future.result(timeout=timeout)
+            transcribed_time = time.time()
+            note_language(result, client_key, language_source, language_id_ms)
+            result = run_postprocessing(result, request_id, timeout, **postprocess)
+            finish_stage_timings(result, start_time, transcribed_time)
+        except Exception as e:
+            logger.error(f"Transcription timeout or error (ID: {request_id}): {e}")
+            result = {"success": False, "request_id": request_id, "error": f"Transcription failed: {str(e)}"}
+        if result["success"]:
+            app.successful_requests = getattr(app, "successful_requests", 0) + 1
+        else:
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+
+        result["text_status"] = "final"
+        changed = draft_seconds is not None and result.get("text", "") != draft["text"]
+        if draft_seconds is not None:
+            result["draft_changed"] = changed
+        draft_transcriber.record(draft_seconds, time.time() - start_time, changed)
+        data = response_encoder.encode(result).decode("utf-8")
+        request_log.summary(result)
+        yield f"event: final\ndata: {data}\n\n"
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 # API Routes
@@ -855,8 +1609,10 @@ def health_check():
                 "model": config["model_size"],
                 "device": config["device"],
                 "timestamp": datetime.now().isoformat(),
-                "queue_size": transcription_queue.qsize(),
-                "active_transcriptions": active_transcriptions,
+                "queue_size": transcription_stage.queue_depth(),
+                "active_transcriptions": transcription_stage.active(),
+                "llm_queue_size": llm_stage.queue_depth(),
+                "active_llm_requests": llm_stage.active(),
                 "max_concurrent": config.get("max_concurrent_transcriptions", 8),
                 "worker_count": config.get("workers", 1),
                 "model_loaded": model is not None,
@@ -887,6 +1643,9 @@ def get_config():
                     "max_concurrent_transcriptions", 8
                 ),
                 "queue_size": config.get("queue_size", 100),
+                "decode_profiles": {name: p.to_dict() for name, p in decode_profiles.profiles.items()},
+                "default_decode_profile": decode_profiles.default.name,
+                "user_profiles": {name: p.to_dict() for name, p in user_profiles.profiles.items()},
             }
         )
     except Exception as e:
@@ -911,6 +1670,67 @@ def get_status():
         return jsonify({"status": "error", "error": str(e), "success": False}), 500
 
 
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """各处理阶段的队列深度和延迟统计"""
+    try:
+        ensure_initialized()
+
+        metrics = {
+            "timestamp": datetime.now().isoformat(),
+            "requests": {
+                "total": getattr(app, "total_requests", 0),
+                "successful": getattr(app, "successful_requests", 0),
+                "failed": getattr(app, "failed_requests", 0),
+            },
+            "stages": {
+                "transcription": transcription_stage.metrics(),
+                "llm": llm_stage.metrics(),
+            },
+            "deferred_polish": polish_registry.stats(),
+            "decode_profiles": decode_profiles.stats(),
+            "logging": request_log.stats(),
+            "responses": response_encoder.stats(),
+        }
+        if language_cache is not None and language_cache.enabled:
+            metrics["language_cache"] = language_cache.stats()
+        if user_profiles is not None and user_profiles.enabled:
+            metrics["user_profiles"] = user_profiles.stats()
+        if vad_stage is not None:
+            metrics["stages"]["vad"] = vad_stage.metrics()
+            metrics["vad"] = speech_trimmer.stats()
+        if language_id_stage is not None:
+            metrics["stages"]["language_id"] = language_id_stage.metrics()
+        if draft_stage is not None:
+            metrics["stages"]["draft"] = draft_stage.metrics()
+            metrics["two_pass"] = draft_transcriber.stats()
+        if long_audio_splitter is not None and long_audio_splitter.enabled:
+            metrics["long_audio"] = long_audio_splitter.stats()
+        if live_sessions is not None and live_sessions.enabled:
+            metrics["live_sessions"] = live_sessions.stats()
+        if llm_service is not None and llm_service.is_enabled():
+            metrics["llm"] = {"circuit_breaker": llm_service.breaker.snapshot()}
+            if llm_service.cache is not None:
+                metrics["llm"]["cache"] = llm_service.cache.stats()
+            metrics["llm"]["calls"] = llm_service.call_stats()
+            metrics["llm"]["endpoints"] = llm_service.endpoints.stats()
+            metrics["llm"]["health"] = llm_service.health.stats()
+            metrics["llm"]["transport"] = llm_service.transport.stats()
+            if llm_service.batcher is not None:
+                metrics["llm"]["batching"] = llm_service.batcher.stats()
+            if polish_gate is not None and polish_gate.enabled:
+                metrics["llm"]["gating"] = polish_gate.stats()
+            if segment_polisher is not None and segment_polisher.enabled:
+                metrics["llm"]["chunking"] = segment_polisher.stats()
+        if lexicon_corrector is not None and lexicon_corrector.enabled:
+            metrics["lexicon"] = lexicon_corrector.stats()
+
+        return jsonify(metrics)
+    except Exception as e:
+        logger.error(f"Metrics collection failed with error: {str(e)}", exc_info=True)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route("/api/transcribe", methods=["POST"])
 def transcribe():
     """音频转写端点（支持队列管理）"""
@@ -919,6 +1739,7 @@ def transcribe():
     try:
         # 确保配置和���型已初始化
         ensure_initialized()
+        received_at = time.monotonic()
 
         # 统计请求
         app.total_requests = getattr(app, "total_requests", 0) + 1
@@ -946,48 +1767,171 @@ def transcribe():
         # 获取可选参数
         language = data.get("language")
         initial_prompt = data.get("initial_prompt")
+        polish_mode = data.get("polish_mode") or request.headers.get("X-Polish-Mode")
+        polish_callback = data.get("polish_callback_url") or request.headers.get("X-Polish-Callback")
+        if polish_callback and not polish_registry.callback_allowed(polish_callback):
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return jsonify({"success": False, "error": callback_rejected_error()}), 400
+        polish_stream = bool(data.get("polish_stream")) or request.headers.get("X-Polish-Stream") == "1"
+        # 只返回调用方需要的字段（如实时分块只需要 text 和 session）
+        response_fields = (
+            data.get("fields") or request.args.get("fields") or request.headers.get("X-Response-Fields")
+        )
+        try:
+            profile = decode_profiles.resolve(data.get("decode_profile") or request.headers.get("X-Decode-Profile"))
+        except UnknownProfileError as e:
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return jsonify({"success": False, "error": str(e), "decode_profiles": decode_profiles.names}), 400
+        try:
+            user_profile = user_profiles.resolve(data.get("user_profile") or request.headers.get("X-Profile"))
+        except UnknownUserProfileError as e:
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return jsonify({"success": False, "error": str(e)}), 400
+        # 草稿模型的分词器可能与主模型不同，只接收文本提示
+        draft_prompt = initial_prompt
+        if initial_prompt is None and user_profile is not None:
+            # 用户配置的提示已在启动时用主模型分词，直接使用 token
+            initial_prompt = user_profile.prompt
+            draft_prompt = user_profile.text
+        # 截止时间只约束同步润色；延迟润色在响应返回后进行
+        deadline = None
+        if polish_mode != "deferred":
+            deadline = request_deadline(
+                received_at, data.get("deadline_ms", request.headers.get("X-Deadline-Ms"))
+            )
 
-        logger.info(
-            f"Received transcription request (ID: {request_id}): audio length {len(audio_array)} samples"
+        logger.debug(
+            "Received transcription request (ID: %s): audio length %d samples", request_id, len(audio_array)
         )
 
-        # 检查并发限制
-        max_concurrent = config.get("max_concurrent_transcriptions", 8)
-        if active_transcriptions >= max_concurrent:
-            # 检查队列是否已满
-            if transcription_queue.full():
-                app.failed_requests = getattr(app, "failed_requests", 0) + 1
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Server overloaded - too many concurrent requests",
-                            "queue_size": transcription_queue.qsize(),
-                            "active_transcriptions": active_transcriptions,
-                        }
-                    ),
-                    503,
+        # 实时转写会话：直播分块和最终转写都只解码会话中尚未确认的音频
+        live_pass = final_pass = None
+        session_id = data.get("session_id")
+        if session_id and live_sessions is not None and live_sessions.enabled:
+            session_offset = int(data.get("session_offset", 0))
+            if data.get("session_final"):
+                final_pass = live_sessions.final_pass(session_id, session_offset, audio_array)
+                if final_pass is None:
+                    # 本进程没有该会话的完整音频，由客户端重新发送整段录音
+                    app.failed_requests = getattr(app, "failed_requests", 0) + 1
+                    return (
+                        jsonify(
+                            {
+                                "success": False,
+                                "request_id": request_id,
+                                "error": "Live session unavailable, send the whole recording",
+                                "session_expired": True,
+                            }
+                        ),
+                        409,
+                    )
+            else:
+                live_pass = live_sessions.live_pass(
+                    session_id, session_offset, audio_array, decode=not data.get("store_only")
                 )
-
-        # 提交到异步处理
-        future = transcription_executor.submit(
-            TranscriptionService.transcribe_audio_async,
-            audio_array,
-            language,
-            initial_prompt,
-            request_id,
+                if live_pass is not None and live_pass.window is None:
+                    # 只保存音频（静音分块，或该会话正在解码，下一次解码会包含这段音频）
+                    app.successful_requests = getattr(app, "successful_requests", 0) + 1
+                    return response_encoder.response(
+                        {
+                            "success": True,
+                            "request_id": request_id,
+                            "text": "",
+                            "segments": [],
+                            "session": live_pass.summary(),
+                        },
+                        response_fields,
+                    )
+        session_pass = live_pass or final_pass
+
+        # 提交到转写阶段（工作线程和队列都已满时拒绝）
+        start_time = time.time()
+        if session_pass is not None:
+            trim = session_pass.window
+            # 服务器端保存的会话上下文（已分词），接在请求或配置的初始提示之后
+            base_prompt = initial_prompt if initial_prompt is not None else config.get("initial_prompt")
+            initial_prompt = session_pass.prompt(base_prompt) or initial_prompt
+        else:
+            trim = prepare_audio(audio_array, request_id)
+        if trim is not None and trim.silent:
+            result = silent_result(request_id, language, trim)
+            finish_stage_timings(result, start_time, time.time())
+            app.successful_requests = getattr(app, "successful_requests", 0) + 1
+            return send_result(result, response_fields)
+        # 未指定语言时使用该客户端已固定的语言或小模型语言识别的结果
+        client_key = client_key_of(data, request.headers, request.remote_addr)
+        language, language_source, language_id_ms = resolve_language(
+            language, client_key, audio_array, trim, request_id
         )
+        try:
+            future = submit_transcription(
+                audio_array, language, initial_prompt, request_id, deadline, trim, profile,
+                session_window=session_pass is not None,
+            )
+        except StageFullError:
+            if live_pass is not None:
+                live_pass.finish(None)
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Server overloaded - too many concurrent requests",
+                        "queue_size": transcription_stage.queue_depth(),
+                        "active_transcriptions": transcription_stage.active(),
+                    }
+                ),
+                503,
+            )
+
+        # 两遍转写：小模型草稿先推送，最终结果随后在同一响应流中推送
+        if session_pass is None and wants_two_pass(data, request.headers, audio_array, trim):
+            return stream_two_pass(
+                future,
+                audio_array,
+                language,
+                draft_prompt,
+                request_id,
+                trim,
+                start_time,
+                client_key=client_key,
+                language_source=language_source,
+                language_id_ms=language_id_ms,
+                deferred=polish_mode == "deferred",
+                callback_url=polish_callback,
+                stream_tokens=polish_stream,
+                deadline=deadline,
+            )
 
         # 等待结果（带超时）
         timeout = config.get("timeout", 600)
         try:
             result = future.result(timeout=timeout)
+            transcribed_time = time.time()
+            note_language(result, client_key, language_source, language_id_ms)
+            if live_pass is not None:
+                result = live_pass.finish(result)
+            elif final_pass is not None:
+                result = final_pass.merge(result)
+            # 模型槽位已释放，LLM润色在独立的后处理阶段进行
+            result = run_postprocessing(
+                result,
+                request_id,
+                timeout,
+                deferred=polish_mode == "deferred",
+                callback_url=polish_callback,
+                stream_tokens=polish_stream,
+                deadline=deadline,
+            )
+            finish_stage_timings(result, start_time, transcribed_time)
             if result["success"]:
                 app.successful_requests = getattr(app, "successful_requests", 0) + 1
             else:
                 app.failed_requests = getattr(app, "failed_requests", 0) + 1
-            return jsonify(result)
+            return send_result(result, response_fields)
         except Exception as e:
+            if live_pass is not None:
+                live_pass.finish(None)
             app.failed_requests = getattr(app, "failed_requests", 0) + 1
             logger.error(f"Transcription timeout or error (ID: {request_id}): {e}")
             return (
@@ -1015,12 +1959,37 @@ def transcribe_binary():
     try:
         # 确保配置和模型已初始化
         ensure_initialized()
+        received_at = time.monotonic()
 
         app.total_requests = getattr(app, "total_requests", 0) + 1
 
         # 获取参数
         language = request.headers.get("X-Language")
         initial_prompt = request.headers.get("X-Initial-Prompt")
+        polish_mode = request.headers.get("X-Polish-Mode")
+        polish_callback = request.headers.get("X-Polish-Callback")
+        if polish_callback and not polish_registry.callback_allowed(polish_callback):
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return jsonify({"success": False, "error": callback_rejected_error()}), 400
+        polish_stream = request.headers.get("X-Polish-Stream") == "1"
+        response_fields = request.args.get("fields") or request.headers.get("X-Response-Fields")
+        try:
+            profile = decode_profiles.resolve(request.headers.get("X-Decode-Profile"))
+        except UnknownProfileError as e:
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return jsonify({"success": False, "error": str(e), "decode_profiles": decode_profiles.names}), 400
+        try:
+            user_profile = user_profiles.resolve(request.headers.get("X-Profile"))
+        except UnknownUserProfileError as e:
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return jsonify({"success": False, "error": str(e)}), 400
+        draft_prompt = initial_prompt
+        if initial_prompt is None and user_profile is not None:
+            initial_prompt = user_profile.prompt
+            draft_prompt = user_profile.text
+        deadline = None
+        if polish_mode != "deferred":
+            deadline = request_deadline(received_at, request.headers.get("X-Deadline-Ms"))
 
         # 读取二进制音频数据
         audio_bytes = request.data
@@ -1035,45 +2004,81 @@ def transcribe_binary():
 
         request_id = f"bin_{int(time.time() * 1000)}"
 
-        logger.info(
-            f"Received binary transcription request (ID: {request_id}): audio length {len(audio_array)} samples"
+        logger.debug(
+            "Received binary transcription request (ID: %s): audio length %d samples", request_id, len(audio_array)
         )
 
-        # 检查并发限制
-        max_concurrent = config.get("max_concurrent_transcriptions", 8)
-        if active_transcriptions >= max_concurrent:
-            if transcription_queue.full():
-                app.failed_requests = getattr(app, "failed_requests", 0) + 1
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Server overloaded - too many concurrent requests",
-                            "queue_size": transcription_queue.qsize(),
-                            "active_transcriptions": active_transcriptions,
-                        }
-                    ),
-                    503,
-                )
-
-        # 异步处理
-        future = transcription_executor.submit(
-            TranscriptionService.transcribe_audio_async,
-            audio_array,
-            language,
-            initial_prompt,
-            request_id,
+        # 提交到转写阶段（工作线程和队列都已满时拒绝）
+        start_time = time.time()
+        trim = prepare_audio(audio_array, request_id)
+        if trim is not None and trim.silent:
+            result = silent_result(request_id, language, trim)
+            finish_stage_timings(result, start_time, time.time())
+            app.successful_requests = getattr(app, "successful_requests", 0) + 1
+            return send_result(result, response_fields)
+        # 未指定语言时使用该客户端已固定的语言或小模型语言识别的结果
+        client_key = client_key_of({}, request.headers, request.remote_addr)
+        language, language_source, language_id_ms = resolve_language(
+            language, client_key, audio_array, trim, request_id
         )
+        try:
+            future = submit_transcription(
+                audio_array, language, initial_prompt, request_id, deadline, trim, profile
+            )
+        except StageFullError:
+            app.failed_requests = getattr(app, "failed_requests", 0) + 1
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Server overloaded - too many concurrent requests",
+                        "queue_size": transcription_stage.queue_depth(),
+                        "active_transcriptions": transcription_stage.active(),
+                    }
+                ),
+                503,
+            )
+
+        if wants_two_pass({}, request.headers, audio_array, trim):
+            return stream_two_pass(
+                future,
+                audio_array,
+                language,
+                draft_prompt,
+                request_id,
+                trim,
+                start_time,
+                client_key=client_key,
+                language_source=language_source,
+                language_id_ms=language_id_ms,
+                deferred=polish_mode == "deferred",
+                callback_url=polish_callback,
+                stream_tokens=polish_stream,
+                deadline=deadline,
+            )
 
         # 等待结果
         timeout = config.get("timeout", 600)
         try:
             result = future.result(timeout=timeout)
+            transcribed_time = time.time()
+            note_language(result, client_key, language_source, language_id_ms)
+            # 模型槽位已释放，LLM润色在独立的后处理阶段进行
+            result = run_postprocessing(
+                result,
+                request_id,
+                timeout,
+                deferred=polish_mode == "deferred",
+                callback_url=polish_callback,
+                stream_tokens=polish_stream,
+                deadline=deadline,
+            )
+            finish_stage_timings(result, start_time, transcribed_time)
             if result["success"]:
                 app.successful_requests = getattr(app, "successful_requests", 0) + 1
             else:
                 app.failed_requests = getattr(app, "failed_requests", 0) + 1
-            return jsonify(result)
+            return send_result(result, response_fields)
         except Exception as e:
             app.failed_requests = getattr(app, "failed_requests", 0) + 1
             return (
@@ -1095,9 +2100,72 @@ def transcribe_binary():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/api/polish/<polish_id>", methods=["GET"])
+def get_polish_result(polish_id):
+    """获取延迟润色结果（长轮询：?wait=秒数）"""
+    try:
+        ensure_initialized()
+
+        wait = min(max(request.args.get("wait", 0, type=float), 0.0), 60.0)
+        entry = polish_registry.wait(polish_id, wait)
+        if entry is None:
+            return jsonify({"success": False, "error": "Unknown or expired polish_id"}), 404
+
+        return jsonify(entry.to_dict())
+    except Exception as e:
+        logger.error(f"Polish lookup failed: {str(e)}", exc_info=True)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/api/polish/<polish_id>/events", methods=["GET"])
+def stream_polish_result(polish_id):
+    """
+    通过 Server-Sent Events 推送延迟润色结果
+
+    ?tokens=1 时先逐段推送LLM流式输出（event: delta；重试时 event: reset
+    表示丢弃已收到的片段），最后推送 event: polished。
+    """
+    ensure_initialized()
+
+    entry = polish_registry.get(polish_id)
+    if entry is None:
+        return jsonify({"success": False, "error": "Unknown or expired polish_id"}), 404
+    forward_tokens = request.args.get("tokens") == "1"
+
+    def generate():
+        deadline = time.time() + polish_registry.ttl
+        cursor = 0
+        while True:
+            if forward_tokens:
+                events, done = entry.wait_events(cursor, 15)
+                cursor += len(events)
+                for kind, text in events:
+                    payload = json.dumps({"text": text} if text is not None else {}, ensure_ascii=False)
+                    yield f"event: {kind}\ndata: {payload}\n\n"
+                if events and not done:
+                    continue
+            else:
+                done = entry.done.wait(15)
+            if done:
+                break
+            if time.time() > deadline:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            yield ": keepalive\n\n"
+        payload = json.dumps(entry.to_dict(), ensure_ascii=False)
+        yield f"event: polished\ndata: {payload}\n\n"
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @app.route("/api/llm/health", methods=["GET"])
 def llm_health_check():
-    """LLM服务健康检查端点"""
+    """
+    LLM服务健康检查端点
+
+    根据近期真实润色请求的成功率判断；空闲时使用缓存的探测结果
+    （后台探测，限频并带TTL），不会为每次检查发送一次LLM请求。
+    """
     try:
         ensure_initialized()
 
@@ -1139,34 +2207,21 @@ def llm_health_check():
                 400,
             )
 
-        # Check API health
-        is_healthy, status_msg = llm_service.health_check()
-        if is_healthy:
-            return (
-                jsonify(
-                    {
-                        "status": "healthy",
-                        "message": status_msg,
-                        "model": llm_service.model,
-                        "api_url": llm_service.api_url,
-                        "success": True,
-                    }
-                ),
-                200,
-            )
-        else:
-            return (
-                jsonify(
-                    {
-                        "status": "unhealthy",
-                        "message": status_msg,
-                        "model": llm_service.model,
-                        "api_url": llm_service.api_url,
-                        "success": False,
-                    }
-                ),
-                503,
-            )
+        # 健康状态来自近期真实调用或缓存的探测结果，不会阻塞
+        health = llm_service.health_status()
+        is_healthy = health["state"] != "unhealthy"
+        payload = dict(health)
+        payload.pop("state")
+        payload.update(
+            {
+                "status": health["state"],
+                "model": llm_service.model,
+                "api_url": llm_service.api_url,
+                "circuit_breaker": llm_service.breaker.snapshot(),
+                "success": is_healthy,
+            }
+        )
+        return jsonify(payload), 200 if is_healthy else 503
 
     except Exception as e:
         logger.error(f"LLM health check failed: {str(e)}", exc_info=True)
@@ -1194,7 +2249,7 @@ def internal_error(error):
 
 def ensure_initialized():
     """确保在worker进程中模型和配置已初始化"""
-    global config, model, transcription_executor, llm_service
+    global config, model, llm_service
     if config is None or model is None:
         logger.info("Initializing model and config in worker process...")
         # 也在 worker 进程中设置 CUDA 环境
@@ -1204,7 +2259,7 @@ def ensure_initialized():
         initialize_llm_service()
 
         # 确保转写工作线程已启动
-        if transcription_executor is None:
+        if transcription_stage is None:
             start_transcription_workers()
 
         logger.info("Worker process initialization completed")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Two-Pass Draft Transcription
+For interactive dictation a small Whisper model (tiny/base) transcribes the
+clip while the configured model works on the final transcript. The draft
+is sent to the client as soon as it is ready and the final text follows
+on the same response stream, so the client can show text within a few
+hundred milliseconds and replace it only when the final text differs.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from decode_profiles import DecodeProfile
+from speech_trimmer import SAMPLE_RATE, TrimResult
+
+logger = logging.getLogger(__name__)
+
+
+class DraftTranscriber:
+    """Small model producing draft transcripts ahead of the final pass"""
+
+    def __init__(self, config: Dict, device: str, compute_type: str):
+        """
+        Args:
+            config: Two-pass configuration with keys:
+                - enabled: bool
+                - draft_model: str, small Whisper model for drafts (tiny, base)
+                - device / compute_type: str, defaults to the main model's
+                - num_workers: int, faster-whisper workers of the draft model
+                - workers / queue_size: int, draft stage size
+                - profile: str, decode profile for drafts
+                - timeout_seconds: float, drafts slower than this are not sent
+                - min_audio_seconds: float, shorter clips skip the draft
+            device: Device of the main model
+            compute_type: Compute type of the main model
+        """
+        self.enabled = config.get("enabled", False)
+        self.model_size = config.get("draft_model", "tiny")
+        self.timeout = float(config.get("timeout_seconds", 5.0))
+        self.min_audio_seconds = float(config.get("min_audio_seconds", 1.0))
+        self.model = None
+
+        if self.enabled:
+            try:
+                self.model = WhisperModel(
+                    self.model_size,
+                    device=config.get("device", device),
+                    compute_type=config.get("compute_type", compute_type),
+                    num_workers=config.get("num_workers", 1),
+                )
+                logger.info(f"Draft model loaded: {self.model_size}")
+            except Exception as e:
+                logger.error(f"Failed to load draft model {self.model_size}, two-pass disabled: {e}")
+                self.enabled = False
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "drafts_sent": 0,
+            "drafts_skipped": 0,
+            "final_changed": 0,
+            "draft_seconds": 0.0,
+            "final_seconds": 0.0,
+        }
+
+    def wants_draft(self, audio: np.ndarray, trim: Optional[TrimResult]) -> bool:
+        seconds = trim.speech_seconds if trim is not None else len(audio) / SAMPLE_RATE
+        return self.enabled and seconds >= self.min_audio_seconds
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str], initial_prompt: Optional[str],
+                   trim: Optional[TrimResult], profile: DecodeProfile) -> Dict:
+        """
+        Draft transcript of a clip
+
+        Args:
+            audio: Original clip
+            initial_prompt: Text prompt; token ids of the main model would not match
+                a draft model with another tokenizer
+            trim: VAD pre-pass result; when given only its audio is decoded
+                and timestamps are mapped back to the clip
+            profile: Decoding options (usually greedy)
+        """
+        started = time.perf_counter()
+        audio_data = trim.audio if trim is not None else audio
+        vad_filter = trim is None or not trim.trimmed
+        segments, info = self.model.transcribe(
+            audio_data,
+            task="transcribe",
+            language=language,
+            initial_prompt=initial_prompt,
+            **profile.transcribe_options(vad_filter),
+        )
+
+        segment_list = []
+        text = ""
+        for segment in segments:
+            start, end = segment.start, segment.end
+            if trim is not None:
+                start, end = round(trim.restore_time(start), 3), round(trim.restore_time(end), 3)
+            segment_list.append({"start": start, "end": end, "text": segment.text.strip()})
+            text += segment.text
+        text = text.strip()
+
+        return {
+            "success": True,
+            "text_status": "draft",
+            "language": info.language,
+            "segments": segment_list,
+            "text": text,
+            "draft_model": self.model_size,
+            "timings": {"draft_ms": round((time.perf_counter() - started) * 1000, 1)},
+        }
+
+    def record(self, draft_seconds: Optional[float], final_seconds: float, changed: bool):
+        """
+        Record one two-pass request
+
+        Args:
+            draft_seconds: Time until the draft was sent, None when it was skipped
+            final_seconds: Time until the final result was sent
+            changed: Whether the final text differs from the draft
+        """
+        with self._lock:
+            stats = self._stats
+            stats["requests"] += 1
+            stats["final_seconds"] += final_seconds
+            if draft_seconds is None:
+                stats["drafts_skipped"] += 1
+                return
+            stats["drafts_sent"] += 1
+            stats["draft_seconds"] += draft_seconds
+            if changed:
+                stats["final_changed"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        sent = stats["drafts_sent"]
+        requests = stats["requests"]
+        draft_seconds = stats.pop("draft_seconds")
+        final_seconds = stats.pop("final_seconds")
+        stats["draft_model"] = self.model_size
+        stats["avg_draft_ms"] = round(draft_seconds / sent * 1000, 1) if sent else 0.0
+        stats["avg_final_ms"] = round(final_seconds / requests * 1000, 1) if requests else 0.0
+        # Share of sent drafts the client had to replace
+        stats["changed_share"] = round(stats["final_changed"] / sent, 3) if sent else 0.0
+        return stats
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User Prompt Profiles
+Per-user or per-team vocabulary biasing: each profile lists hotwords (project
+names, product terms) and a prompt template, stored in a JSON file that is
+read once at startup. The decoding prompt of every profile is built and
+tokenized once and kept in memory, so a request only names its profile
+(X-Profile header) instead of sending a long prompt the model would encode
+again.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class UnknownUserProfileError(ValueError):
+    """Raised when a request names a user profile that is not configured"""
+
+
+class UserProfile:
+    """Hotwords and prompt template of one profile, with the prompt pre-tokenized"""
+
+    def __init__(self, name: str, entry: Dict, tokenize: Optional[Callable[[str], List[int]]], max_tokens: int):
+        """
+        Args:
+            name: Profile name
+            entry: Profile definition with keys:
+                - hotwords: list of str, terms the model should recognize
+                - prompt: str, prompt template; "{hotwords}" is replaced by the
+                  hotword list, which is otherwise appended to the prompt
+                - separator: str, between hotwords (default "、")
+            tokenize: Text to Whisper token ids; None keeps the prompt as text
+            max_tokens: The prompt keeps its first max_tokens tokens
+
+        Raises:
+            ValueError: The entry is malformed or yields an empty prompt
+        """
+        hotwords = entry.get("hotwords", [])
+        if not isinstance(hotwords, list) or not all(isinstance(word, str) for word in hotwords):
+            raise ValueError("hotwords must be a list of strings")
+        template = entry.get("prompt", "")
+        if not isinstance(template, str):
+            raise ValueError("prompt must be a string")
+
+        words = entry.get("separator", "、").join(word.strip() for word in hotwords if word.strip())
+        if "{hotwords}" in template:
+            text = template.replace("{hotwords}", words)
+        else:
+            text = f"{template} {words}" if template and words else template or words
+        text = text.strip()
+        if not text:
+            raise ValueError("profile has neither hotwords nor a prompt")
+
+        self.name = name
+        self.hotwords = hotwords
+        self.text = text
+        self.tokens = None
+        if tokenize is not None:
+            # Encoded like faster-whisper encodes a text prompt; hotwords at the start are kept
+            self.tokens = tokenize(" " + text)[:max_tokens]
+
+    @property
+    def prompt(self) -> Union[str, List[int]]:
+        """Decoding prompt: token ids when a tokenizer was available, otherwise text"""
+        return self.tokens if self.tokens is not None else self.text
+
+    def to_dict(self) -> Dict:
+        return {
+            "hotwords": len(self.hotwords),
+            "prompt_tokens": len(self.tokens) if self.tokens is not None else None,
+        }
+
+
+class UserProfiles:
+    """Prompt profiles loaded once from disk, selected per request by name"""
+
+    def __init__(self, config: Dict, tokenize: Optional[Callable[[str], List[int]]] = None):
+        """
+        Args:
+            config: User profile configuration with keys:
+                - enabled: bool
+                - path: str, profiles JSON file {"profiles": {name: entry}}
+                  (relative paths are resolved from the project root)
+                - profiles: dict, inline profiles merged over the file
+                - max_prompt_tokens: int, longer prompts are cut (faster-whisper keeps at most 223)
+            tokenize: The model's text to token ids (None keeps text prompts)
+        """
+        self.enabled = config.get("enabled", False)
+        self.max_prompt_tokens = max(1, int(config.get("max_prompt_tokens", 200)))
+
+        entries = {}
+        path = config.get("path")
+        if self.enabled and path:
+            if not os.path.isabs(path):
+                path = os.path.join(PROJECT_ROOT, path)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries.update(json.load(f).get("profiles", {}))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not load user profiles {path}: {e}")
+        entries.update(config.get("profiles", {}))
+
+        self.profiles: Dict[str, UserProfile] = {}
+        if self.enabled:
+            for name, entry in entries.items():
+                if name.startswith("_"):
+                    continue
+                try:
+                    self.profiles[name] = UserProfile(name, entry, tokenize, self.max_prompt_tokens)
+                except (AttributeError, TypeError, ValueError) as e:
+                    logger.error(f"Ignoring invalid user profile '{name}': {e}")
+            if self.profiles:
+                logger.info(f"Loaded {len(self.profiles)} user profile(s): {', '.join(self.profiles)}")
+
+        self._lock = threading.Lock()
+        self._requests = {name: 0 for name in self.profiles}
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.profiles)
+
+    def resolve(self, name: Optional[str]) -> Optional[UserProfile]:
+        """
+        Profile for a request, None when it names none
+
+        Raises:
+            UnknownUserProfileError: name is not a configured profile
+        """
+        if name in (None, ""):
+            return None
+        profile = self.profiles.get(name) if isinstance(name, str) else None
+        if profile is None:
+            raise UnknownUserProfileError(f"Unknown user profile {name!r}")
+        with self._lock:
+            self._requests[name] += 1
+        return profile
+
+    def stats(self) -> Dict:
+        with self._lock:
+            requests = dict(self._requests)
+        tokenized = [name for name, profile in self.profiles.items() if profile.tokens is not None]
+        return {
+            "enabled": self.enabled,
+            "profiles": len(self.profiles),
+            "requests": requests,
+            # Requests whose prompt was served from cached tokens instead of being encoded
+            "encodes_saved": sum(requests[name] for name in tokenized),
+        }